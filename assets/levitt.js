@@ -0,0 +1,125 @@
+/*
+ * Clientside callbacks of the dashboard (enabled with LEVITT_CLIENTSIDE_FIT=1): the regression line of Levitt's
+ * measure is fitted in the browser on the series of the selected region whenever the start date changes, the same
+ * fit as levitt.fit_levitt and the same figure as figures.get_figure_with_regression_line on the server.
+ */
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    levitt: (function () {
+        // value of Levitt's measure H(t) at which the epidemic is considered to be under control, levitt.H_THRESHOLD
+        var H_THRESHOLD = 1.0001;
+
+        // r-squared value at or below which the regression line is not extrapolated, levitt.MIN_R_SQUARED
+        var MIN_R_SQUARED = 0.1;
+
+        // first date accepted as start date of the regression line, main.MIN_START_DATE
+        var MIN_START_DATE = '2020-03-01';
+
+        var DAY_MS = 24 * 60 * 60 * 1000;
+
+        function isNumber(value) {
+            return typeof value === 'number' && isFinite(value);
+        }
+
+        /*
+         * least squares fit of H(t) = slope * day + intercept from the sums of x = day and y = H(t) - 1, like
+         * levitt.fit_sums
+         */
+        function fitLevitt(cumConfirmed) {
+            var levittMeasure = [null];
+            var n = 0, sumX = 0, sumY = 0, sumXY = 0, sumXX = 0, sumYY = 0;
+            for (var i = 1; i < cumConfirmed.length; i++) {
+                var previous = cumConfirmed[i - 1], value = null;
+                if (isNumber(previous) && previous > 0 && isNumber(cumConfirmed[i])) {
+                    value = cumConfirmed[i] / previous;
+                }
+                levittMeasure.push(value);
+                if (value !== null) {
+                    var y = value - 1;
+                    n += 1;
+                    sumX += i;
+                    sumY += y;
+                    sumXY += i * y;
+                    sumXX += i * i;
+                    sumYY += y * y;
+                }
+            }
+            var fit = {levittMeasure: levittMeasure, nPoints: n, slope: NaN, intercept: NaN, rSquared: NaN};
+            if (n >= 2) {
+                var sXX = sumXX - sumX * sumX / n;
+                var sXY = sumXY - sumX * sumY / n;
+                var sYY = sumYY - sumY * sumY / n;
+                fit.slope = sXY / sXX;
+                fit.intercept = (sumY - fit.slope * sumX) / n + 1;
+                var ssRes = Math.max(sYY - fit.slope * sXY, 0);
+                // a constant series is fitted exactly
+                fit.rSquared = sYY <= 0 ? 1 : 1 - ssRes / sYY;
+            }
+            var requiredDay = (H_THRESHOLD - fit.intercept) / fit.slope;
+            fit.extrapolate = isFinite(requiredDay) && requiredDay >= 0 && fit.rSquared > MIN_R_SQUARED;
+            fit.crossingDay = fit.extrapolate ? Math.ceil(requiredDay) : null;
+            return fit;
+        }
+
+        // str(round(value, 2)) of python
+        function formatRSquared(value) {
+            if (!isFinite(value)) {
+                return isNaN(value) ? 'nan' : (value > 0 ? 'inf' : '-inf');
+            }
+            var rounded = Number(value.toFixed(2));
+            return Number.isInteger(rounded) ? rounded.toFixed(1) : String(rounded);
+        }
+
+        // numpy.linspace(0, stop, num) with stop == num
+        function linspace(num) {
+            var values = [];
+            for (var i = 0; i < num; i++) {
+                values.push(num > 1 ? i * num / (num - 1) : 0);
+            }
+            return values;
+        }
+
+        function addDays(date, days) {
+            return new Date(Date.parse(date + 'T00:00:00Z') + days * DAY_MS).toISOString().slice(0, 10);
+        }
+
+        return {
+            /*
+             * figure of the daily Levitt's measure graph with the regression line fitted on the days after the start
+             * date, like levitt.get_data_for_graph_with_regression_line and figures.get_region_figures
+             */
+            regressionFigure: function (series, startDate) {
+                if (!series || !startDate || startDate <= MIN_START_DATE) {
+                    return window.dash_clientside.no_update;
+                }
+                var dates = [], cumConfirmed = [];
+                for (var i = 0; i < series.dates.length; i++) {
+                    if (series.dates[i] > startDate) {
+                        dates.push(series.dates[i]);
+                        cumConfirmed.push(series.cum_confirmed[i]);
+                    }
+                }
+                var fit = fitLevitt(cumConfirmed);
+                var line = linspace(fit.extrapolate ? fit.crossingDay : fit.nPoints);
+                var lineDates = dates.slice();
+                if (fit.extrapolate) {
+                    // dates after the last day till the day the line reaches H_THRESHOLD
+                    for (var day = 1; day <= fit.crossingDay - dates.length; day++) {
+                        lineDates.push(addDays(dates[dates.length - 1], day));
+                    }
+                }
+                return {
+                    data: [
+                        {x: dates, y: fit.levittMeasure, mode: 'markers', name: 'H(t)'},
+                        {x: lineDates, y: line.map(function (x) { return fit.slope * x + fit.intercept; }),
+                         mode: 'line', name: 'Regression Line<br> R² = ' + formatRSquared(fit.rSquared)}
+                    ],
+                    layout: {
+                        title: "Daily Levitt's Measure H(t) " + series.name,
+                        xaxis: {title: 'Date'},
+                        yaxis: {title: "Levitt's Measure H(t)"}
+                    }
+                };
+            }
+        };
+    })()
+});
@@ -0,0 +1,86 @@
+"""
+Benchmark of fetching the three data sets into snapshots from the local stand-in of the api (tools/standin_server.py)
+serving synthetic data (benchmarks/synthetic_data.py), with a simulated latency and bandwidth:
+- sequential: one data set after the other, like the helpers did at startup before,
+- concurrent: all data sets at once through the pooled session (data_source.fetch_snapshots),
+and the concurrent fetch once more against a stand-in failing the first requests of each data set, which the retries
+recover from. The payload sizes are reported with and without gzip compression.
+
+Run from the repository root:
+    python -m benchmarks.fetch_benchmark [--days 365] [--districts 700] [--delay 0.2] [--rate 20000000]
+                                         [--failures 1]
+"""
+import os
+import sys
+import gzip
+import time
+import argparse
+import tempfile
+
+
+def time_fetch(fetch, work_dir, label):
+    """
+    times a fetch of all data sets into a new snapshot directory
+    :param fetch: function taking the snapshot directory
+    :param work_dir: directory in which the snapshot directory is created
+    :param label: name of the snapshot directory
+    :return: seconds
+    """
+    snapshot_dir = os.path.join(work_dir, label)
+    start = time.perf_counter()
+    fetch(snapshot_dir)
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sequential and concurrent fetching of the data sets")
+    parser.add_argument('--days', type=int, default=365, help='number of days of the synthetic data')
+    parser.add_argument('--districts', type=int, default=700, help='number of districts of the synthetic data')
+    parser.add_argument('--delay', type=float, default=0.2, help='latency of the stand-in in seconds')
+    parser.add_argument('--rate', type=float, default=20e6, help='bytes per second sent per response')
+    parser.add_argument('--failures', type=int, default=1,
+                        help='failed requests of each data set in the retry run')
+    args = parser.parse_args(argv)
+
+    from data_source import DATASET_PATHS, get_dataset_location, refresh_snapshot, fetch_snapshots
+    from tools.standin_server import start_standin_server
+    from benchmarks.synthetic_data import write_synthetic_data
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        data_dir = os.path.join(work_dir, 'api')
+        write_synthetic_data(data_dir, args.days, args.districts, 0)
+        print("{:<10} {:>12} {:>12}".format("data set", "size (MB)", "gzip (MB)"))
+        for name in DATASET_PATHS:
+            with open(get_dataset_location(name, data_dir), 'rb') as f:
+                content = f.read()
+            print("{:<10} {:>12.2f} {:>12.2f}".format(name, len(content) / 1e6, len(gzip.compress(content, 6)) / 1e6))
+
+        server = start_standin_server(data_dir, delay=args.delay, rate=args.rate)
+        source = 'http://localhost:%d' % server.server_port
+        # the first request opens the connection pool, it is not part of the timings
+        refresh_snapshot('india', source, os.path.join(work_dir, 'warmup'))
+        sequential = time_fetch(lambda snapshot_dir: [refresh_snapshot(name, source, snapshot_dir)
+                                                      for name in DATASET_PATHS], work_dir, 'sequential')
+        concurrent = time_fetch(lambda snapshot_dir: [future.result() for future in
+                                                      fetch_snapshots(None, source, snapshot_dir).values()],
+                                work_dir, 'concurrent')
+        server.shutdown()
+
+        failing_server = start_standin_server(data_dir, delay=args.delay, rate=args.rate, failures=args.failures)
+        failing_source = 'http://localhost:%d' % failing_server.server_port
+        retried = time_fetch(lambda snapshot_dir: [future.result() for future in
+                                                   fetch_snapshots(None, failing_source, snapshot_dir).values()],
+                             work_dir, 'retried')
+        requests_sent = sum(failing_server.request_counts.values())
+        failing_server.shutdown()
+
+    print("\n{:<34} {:>10}".format("fetch of all data sets", "time (s)"))
+    print("{:<34} {:>10.2f}".format("sequential", sequential))
+    print("{:<34} {:>10.2f}".format("concurrent", concurrent))
+    print("{:<34} {:>10.2f}".format("concurrent, %d failures per data set" % args.failures, retried))
+    print("\nspeedup %.1fx, %d requests in the retry run" % (sequential / concurrent, requests_sent))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
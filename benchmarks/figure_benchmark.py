@@ -0,0 +1,71 @@
+"""
+Payload benchmark of the graph callbacks: size and json encoding time of the three figures of a region in the default
+and in the compact figure mode (compact_figures.py), for synthetic series of growing length.
+
+Run from the repository root:
+    python -m benchmarks.figure_benchmark [--max-points 500]
+"""
+import sys
+import json
+import timeit
+import argparse
+
+from plotly.utils import PlotlyJSONEncoder
+
+from levitt import get_data_for_graph_with_regression_line
+from figures import get_region_figures
+from compact_figures import FIGURE_MAX_POINTS
+from benchmarks.levitt_benchmark import get_synthetic_df
+
+
+def get_synthetic_region_df(n_days, seed=0):
+    """
+    dataframe shaped like the India dataframe
+    :param n_days: number of days in the series
+    :param seed: seed of the random number generator
+    :return: dataframe with date, cum_confirmed, dailyconfirmed and active columns
+    """
+    df = get_synthetic_df(n_days, seed)
+    cum_confirmed = df['cum_confirmed']
+    # cases are active for two weeks
+    return df.assign(dailyconfirmed=cum_confirmed.diff().fillna(cum_confirmed),
+                     active=cum_confirmed - cum_confirmed.shift(14, fill_value=0))
+
+
+def encode(df, fit_data, compact, max_points):
+    """
+    builds and json encodes the three figures of a region
+    :param df: dataframe of the region
+    :param fit_data: result of get_data_for_graph_with_regression_line
+    :param compact: compact figure mode
+    :param max_points: maximum number of points of a trace in compact mode
+    :return: json string
+    """
+    figures = get_region_figures(df, fit_data, "India", 'dailyconfirmed', 'active', compact, max_points)
+    return json.dumps(figures, cls=PlotlyJSONEncoder)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Payload size of the default and the compact figures")
+    parser.add_argument('--max-points', type=int, default=FIGURE_MAX_POINTS,
+                        help='maximum number of points of a trace in compact mode, 0 disables downsampling')
+    args = parser.parse_args(argv)
+    print("{:>8} {:>14} {:>14} {:>7} {:>12} {:>12}".format(
+        "days", "default (kB)", "compact (kB)", "ratio", "default (ms)", "compact (ms)"))
+    for n_days in (60, 250, 1000, 5000):
+        df = get_synthetic_region_df(n_days)
+        # default dashboard view, the regression line is fitted on the last 40 days
+        fit_data = get_data_for_graph_with_regression_line(df, df['date'].iloc[-41])
+        sizes, times = [], []
+        for compact in (False, True):
+            sizes.append(len(encode(df, fit_data, compact, args.max_points).encode()))
+            number = max(1, 500 // n_days)
+            times.append(min(timeit.repeat(lambda: encode(df, fit_data, compact, args.max_points), number=number,
+                                           repeat=3)) / number)
+        print("{:>8} {:>14.1f} {:>14.1f} {:>6.1f}x {:>12.2f} {:>12.2f}".format(
+            n_days, sizes[0] / 1e3, sizes[1] / 1e3, sizes[0] / sizes[1], times[0] * 1e3, times[1] * 1e3))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
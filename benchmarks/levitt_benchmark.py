@@ -0,0 +1,159 @@
+"""
+Microbenchmark comparing the array based Levitt engine (levitt.py) with the original per-row iloc loop, and the fits of
+all start dates of a series from prefix sums (fit_levitt_windows) with one fit_levitt call per start date.
+
+Run from the repository root:
+    python -m benchmarks.levitt_benchmark
+or as a script:
+    python benchmarks/levitt_benchmark.py
+"""
+import os
+import sys
+import math
+import timeit
+import datetime as dt
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# run as a script the directory of the benchmark is on the path instead of the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from sklearn.metrics import r2_score
+except ImportError:
+    from levitt import get_r_squared as r2_score
+
+from levitt import (get_data_for_graph_with_regression_line, get_levitt_measure, fit_levitt, fit_levitt_windows,
+                    get_sums, add_day, fit_sums, LevittSums)
+
+warnings.filterwarnings("ignore")
+
+
+def legacy_get_data_for_graph_with_regression_line(df_levitt, start_date):
+    """
+    original implementation of get_data_for_graph_with_regression_line, kept as the reference for the benchmark
+    :param df_levitt: dataframe of India/States/Districts
+    :param start_date: date from which data is to be considered
+    :return: same as levitt.get_data_for_graph_with_regression_line
+    """
+    df_levitt = df_levitt[df_levitt['date'] > start_date]
+    df_levitt = df_levitt.reset_index(drop=True)
+    df_levitt['LevittMeasure'] = np.nan
+    for i in reversed(range(1, len(df_levitt))):
+        numerator = df_levitt.iloc[i]['cum_confirmed']
+        denominator = df_levitt.iloc[i - 1]['cum_confirmed']
+        if denominator > 0:
+            df_levitt.at[i, 'LevittMeasure'] = numerator / denominator
+    days = range(0, len(df_levitt))
+    df_levitt = df_levitt.assign(day_count=pd.Series(days).values)
+    X_train, y_train = df_levitt['day_count'], df_levitt['LevittMeasure']
+    idx = np.isfinite(X_train) & np.isfinite(y_train)
+    X_train, y_train = X_train[idx], y_train[idx]
+    model = np.poly1d(np.polyfit(X_train, y_train, 1))
+    required_day = (1.0001 - model.coeffs[1]) / model.coeffs[0]
+    dates = []
+    if required_day < 0 or r2_score(y_train, model(X_train)) <= 0.1:
+        line = np.linspace(0, len(X_train), len(X_train))
+    else:
+        line = np.linspace(0, math.ceil(required_day), math.ceil(required_day))
+        more_dates = math.ceil(required_day) - len(days)
+        last_date = df_levitt.iloc[-1]['date']
+        for i in range(more_dates):
+            dates.append(last_date + dt.timedelta(i + 1))
+    return df_levitt, dates, model, line, round(r2_score(y_train, model(X_train)), 2)
+
+
+def get_synthetic_df(n_days, seed=0):
+    """
+    dataframe shaped like the India/States/Districts frames with a slowing epidemic curve
+    :param n_days: number of days in the series
+    :param seed: seed of the random number generator
+    :return: dataframe with date and cum_confirmed columns
+    """
+    rng = np.random.RandomState(seed)
+    growth = 0.2 * np.exp(-np.arange(n_days) / 60) * rng.uniform(0.8, 1.2, n_days)
+    cum_confirmed = np.floor(10 * np.exp(np.cumsum(growth)))
+    return pd.DataFrame({'date': pd.date_range('2020-03-01', periods=n_days, freq='D'),
+                         'cum_confirmed': cum_confirmed.astype(np.int64)})
+
+
+def check_same_result(df, start_date):
+    """
+    asserts that the legacy and the array based implementation give the same numbers
+    :param df: dataframe with date and cum_confirmed columns
+    :param start_date: date from which data is to be considered
+    """
+    old = legacy_get_data_for_graph_with_regression_line(df, start_date)
+    new = get_data_for_graph_with_regression_line(df, start_date)
+    np.testing.assert_array_equal(old[0]['LevittMeasure'].values, new[0]['LevittMeasure'].values)
+    assert old[1] == new[1]
+    np.testing.assert_array_equal(old[3], new[3])
+    # the plotted regression lines are compared: H(t) is close to 1, so the coefficients are only defined up to about
+    # 1e-16 in absolute terms, polyfit on the uncentered values loses relative precision of nearly flat slopes (and
+    # poly1d drops a slope which is exactly 0)
+    np.testing.assert_allclose(old[2](old[3]), new[2](new[3]), rtol=1e-12, atol=1e-15)
+    # a constant H(t) is fitted exactly (r squared 1), the rounding residual of polyfit made it 0
+    levitt_measure = new[0]['LevittMeasure'].dropna().values
+    assert old[4] == new[4] or (np.ptp(levitt_measure) == 0 and new[4] == 1)
+
+
+def fit_all_starts(cum_confirmed):
+    """
+    fits of all start dates of a series (at least two values of H(t) after the start) with one fit_levitt call each
+    :param cum_confirmed: array of cumulative confirmed cases
+    :return: list of LevittFit
+    """
+    return [fit_levitt(cum_confirmed[start:]) for start in range(len(cum_confirmed) - 2)]
+
+
+def check_windows(cum_confirmed):
+    """
+    asserts that the window fits from prefix sums and the day by day updated sums give the same fits as fit_levitt
+    :param cum_confirmed: array of cumulative confirmed cases
+    """
+    n = len(cum_confirmed)
+    start = np.arange(n - 2)
+    windows = fit_levitt_windows(cum_confirmed, start, np.full(n - 2, n))
+    for i, fit in enumerate(fit_all_starts(cum_confirmed)):
+        np.testing.assert_allclose([windows.slope[i], windows.intercept[i], windows.r_squared[i]],
+                                   [fit.slope, fit.intercept, fit.r_squared], rtol=1e-9, atol=1e-12)
+        assert windows.extrapolate[i] == fit.extrapolate and windows.n_points[i] == fit.n_points
+    levitt_measure = get_levitt_measure(cum_confirmed)
+    sums = LevittSums(0, 0.0, 0.0, 0.0, 0.0, 0.0)
+    for day, levitt_value in enumerate(levitt_measure):
+        sums = add_day(sums, day, levitt_value)
+    valid = np.isfinite(levitt_measure)
+    np.testing.assert_allclose(fit_sums(sums), fit_sums(get_sums(np.flatnonzero(valid).astype(np.float64),
+                                                                 levitt_measure[valid])), rtol=1e-9)
+
+
+def main():
+    print("{:>8} {:>12} {:>12} {:>9}".format("days", "loop (ms)", "array (ms)", "speedup"))
+    for n_days in (60, 250, 1000, 5000):
+        df = get_synthetic_df(n_days)
+        # default dashboard view (last 40 days) and the whole series
+        check_same_result(df, df['date'].iloc[-41])
+        start_date = df['date'].iloc[0] - dt.timedelta(1)
+        check_same_result(df, start_date)
+        number = max(1, 2000 // n_days)
+        loop = min(timeit.repeat(lambda: legacy_get_data_for_graph_with_regression_line(df, start_date),
+                                 number=number, repeat=3)) / number
+        array = min(timeit.repeat(lambda: get_data_for_graph_with_regression_line(df, start_date),
+                                  number=number, repeat=3)) / number
+        print("{:>8} {:>12.3f} {:>12.3f} {:>8.1f}x".format(n_days, loop * 1e3, array * 1e3, loop / array))
+
+    print("\nfits of all start dates of a series")
+    print("{:>8} {:>14} {:>14} {:>9}".format("days", "fit_levitt (ms)", "windows (ms)", "speedup"))
+    for n_days in (60, 250, 1000):
+        cum_confirmed = get_synthetic_df(n_days)['cum_confirmed'].values
+        check_windows(cum_confirmed)
+        start, end = np.arange(n_days - 2), np.full(n_days - 2, n_days)
+        loop = min(timeit.repeat(lambda: fit_all_starts(cum_confirmed), number=1, repeat=3))
+        windows = min(timeit.repeat(lambda: fit_levitt_windows(cum_confirmed, start, end), number=10, repeat=3)) / 10
+        print("{:>8} {:>14.3f} {:>14.3f} {:>8.1f}x".format(n_days, loop * 1e3, windows * 1e3, loop / windows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Memory report of loading the districts data: peak and steady state resident memory of
+- read_csv: the whole csv parsed at once with the default pandas types and all columns (the former loader),
+- chunked: the csv parsed in chunks with only the used columns and compact types (data_source.read_csv_chunked),
+- snapshot: a worker loading the stored snapshot (memory mapped columns),
+each followed by building the normalized districts table, and
+- shared: a worker attaching to the shared table of the districts data built beforehand (shared_tables.py),
+on a synthetic districts.csv (benchmarks/synthetic_data.py) or a given file. Every loader runs in a fresh python
+process, the numbers are the growth over the process after its imports. Private memory counts only the anonymous pages
+of the process, memory mapped files are shared with the other processes. Linux only (/proc/self).
+
+Run from the repository root:
+    python -m benchmarks.memory_report [--days 365] [--districts 700] [--csv districts.csv] [--json]
+"""
+import io
+import gc
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+# loaders compared by the report
+loaders = ['read_csv', 'chunked', 'snapshot', 'shared']
+
+
+def get_status(field):
+    """
+    memory number of this process from /proc/self/status
+    :param field: name of the field, e.g. VmRSS (resident memory), VmHWM (peak resident memory) or RssAnon (resident
+    anonymous memory, which is not shared with other processes)
+    :return: bytes
+    """
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def reset_peak():
+    """
+    resets the peak resident memory of this process to the current resident memory, a process started by fork and
+    exec otherwise keeps the peak of its parent
+    """
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+
+
+def run_loader(loader, csv_path):
+    """
+    loads the districts data with a loader, to be run in a fresh process
+    :param loader: one of loaders
+    :param csv_path: path of the districts csv
+    :return: dictionary of memory numbers in bytes and number of rows
+    """
+    import pandas as pd
+    from data_source import CSV_COLUMNS, read_csv_chunked, load_snapshot
+    from districts.helper import build_district_table, load_district_data
+
+    gc.collect()
+    reset_peak()
+    before, private_before = get_status('VmRSS'), get_status('RssAnon')
+    # the payload is held in memory while it is parsed, like in data_source.refresh_snapshot
+    content = b''
+    if loader in ('read_csv', 'chunked'):
+        with open(csv_path, 'rb') as f:
+            content = f.read()
+    if loader == 'read_csv':
+        df = pd.read_csv(io.BytesIO(content))
+    elif loader == 'chunked':
+        df = read_csv_chunked(io.BytesIO(content), CSV_COLUMNS['districts'])
+    elif loader == 'snapshot':
+        df = load_snapshot('districts', categorical=True)
+    if loader == 'shared':
+        raw_bytes = 0
+        df_districts = load_district_data().df
+    else:
+        del content
+        raw_bytes = int(df.memory_usage(deep=True).sum())
+        df_districts = build_district_table(df)[0]
+        del df
+    gc.collect()
+    return {'loader': loader, 'rows': len(df_districts), 'raw_bytes': raw_bytes,
+            'table_bytes': int(df_districts.memory_usage(deep=True).sum()),
+            'peak_bytes': get_status('VmHWM') - before, 'steady_bytes': get_status('VmRSS') - before,
+            'private_bytes': get_status('RssAnon') - private_before}
+
+
+def run_child(loader, csv_path, snapshot_dir):
+    """
+    runs a loader in a fresh python process
+    :param loader: one of loaders
+    :param csv_path: path of the districts csv
+    :param snapshot_dir: snapshot directory holding a snapshot of the csv and its shared table
+    :return: dictionary of memory numbers
+    """
+    # a fixed mmap threshold makes glibc return large freed arrays to the system, otherwise freed intermediate arrays
+    # of the loaders stay resident and blur the steady state numbers
+    env = dict(os.environ, LEVITT_SNAPSHOT_DIR=snapshot_dir, LEVITT_SHARED_TABLES='1' if loader == 'shared' else '0',
+               LEVITT_TABLE_DIR=os.path.join(snapshot_dir, 'tables'), MALLOC_MMAP_THRESHOLD_='131072')
+    output = subprocess.check_output([sys.executable, '-m', 'benchmarks.memory_report', '--child', loader,
+                                      '--csv', csv_path], env=env)
+    return json.loads(output.decode().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Peak and steady state memory of the districts loaders")
+    parser.add_argument('--days', type=int, default=365, help='number of days of the synthetic data')
+    parser.add_argument('--districts', type=int, default=700, help='number of districts of the synthetic data')
+    parser.add_argument('--csv', help='districts csv to use instead of synthetic data')
+    parser.add_argument('--json', action='store_true', help='print the results as json')
+    parser.add_argument('--child', choices=loaders, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_loader(args.child, args.csv)))
+        return 0
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        from data_source import DATASET_PATHS, CSV_COLUMNS, read_csv_chunked, save_snapshot
+        csv_path = args.csv
+        if not csv_path:
+            from benchmarks.synthetic_data import write_districts
+            write_districts(work_dir, args.days, args.districts, 0)
+            csv_path = os.path.join(work_dir, DATASET_PATHS['districts'])
+        size = os.path.getsize(csv_path)
+        # the snapshot loader maps a snapshot stored beforehand, like a worker started after a refresh
+        snapshot_dir = os.path.join(work_dir, 'snapshots')
+        version = save_snapshot('districts', read_csv_chunked(csv_path, CSV_COLUMNS['districts']), csv_path,
+                                snapshot_dir)
+        # the shared loader attaches to a table built beforehand, like every worker but the first one
+        from shared_tables import save_table
+        from districts.helper import build_district_data, get_district_table
+        from data_source import load_snapshot
+        save_table('districts', version, *get_district_table(build_district_data(
+            load_snapshot('districts', snapshot_dir, categorical=True), version)),
+            table_dir=os.path.join(snapshot_dir, 'tables'))
+        results = [run_child(loader, csv_path, snapshot_dir) for loader in loaders]
+
+    if args.json:
+        print(json.dumps({'csv_bytes': size, 'results': results}, indent=2))
+        return 0
+    print("csv: %.1f MB, %d rows" % (size / 1e6, results[0]['rows']))
+    print("{:<10} {:>12} {:>12} {:>12} {:>12} {:>12}".format(
+        "loader", "peak (MB)", "steady (MB)", "private (MB)", "raw (MB)", "table (MB)"))
+    for result in results:
+        print("{:<10} {:>12.1f} {:>12.1f} {:>12.1f} {:>12.1f} {:>12.1f}".format(
+            result['loader'], result['peak_bytes'] / 1e6, result['steady_bytes'] / 1e6, result['private_bytes'] / 1e6,
+            result['raw_bytes'] / 1e6, result['table_bytes'] / 1e6))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+Benchmark of the whole pipeline of the dashboard on synthetic data (benchmarks/synthetic_data.py), without the live
+api: import of main, fetching and storing the snapshots, loading the data sets, extraction of the data of a region,
+the Levitt's measure fit, building the figures and the full callbacks through the flask test client. The results
+cache is disabled so every repetition does the full work. Results are printed and written as json, --compare prints
+the change against the json of an earlier run (e.g. of another commit).
+
+Run from the repository root:
+    python -m benchmarks.pipeline_benchmark [--days 365] [--districts 700] [--repeat 5] [--output results.json]
+                                            [--compare old_results.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+
+def time_stage(stages, name, function, repeat=1):
+    """
+    times a stage and records the result
+    :param stages: list of stage results to append to
+    :param name: name of the stage
+    :param function: function without arguments running the stage
+    :param repeat: number of runs
+    :return: return value of the last run
+    """
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = function()
+        seconds.append(time.perf_counter() - start)
+    stages.append({'name': name, 'runs': repeat, 'median_ms': statistics.median(seconds) * 1e3,
+                   'min_ms': min(seconds) * 1e3, 'max_ms': max(seconds) * 1e3})
+    return value
+
+
+def time_import(env):
+    """
+    time of importing main (creating the app) in a fresh python process
+    :param env: environment of the process
+    :return: seconds
+    """
+    code = "import time; start = time.perf_counter(); import main; print(time.perf_counter() - start)"
+    return float(subprocess.check_output([sys.executable, '-c', code], env=env).decode().split()[-1])
+
+
+def get_commit():
+    """
+    commit of the working tree, to compare results between commits
+    :return: commit hash, None outside of a git repository
+    """
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_stages(repeat):
+    """
+    runs the stages, the data source, snapshot directory and cache settings have to be set in the environment before
+    :param repeat: number of runs of the repeated stages
+    :return: list of stage results
+    """
+    from plotly.utils import PlotlyJSONEncoder
+
+    from data_source import DATASET_PATHS, refresh_snapshot, fetch_snapshots, get_dataset_frame, loaded_versions
+    from levitt import get_data_for_graph_with_regression_line
+    from figures import get_region_figures
+    from india.helper import load_in_data
+    from states.helper import load_state_data, get_state_df, state_codes
+    from districts.helper import build_district_data, get_district_df, get_districts
+    from forecast import forecast_all
+    from benchmarks.startup_benchmark import callbacks, get_callback_body
+
+    stages = []
+    for name in DATASET_PATHS:
+        time_stage(stages, 'fetch and store %s' % name, lambda: refresh_snapshot(name))
+    time_stage(stages, 'fetch and store all (concurrent)',
+               lambda: [future.result() for future in fetch_snapshots().values()])
+
+    in_data = time_stage(stages, 'load india', load_in_data, repeat)
+    state_data = time_stage(stages, 'load states', load_state_data, repeat)
+    district_data = time_stage(stages, 'load districts', lambda: build_district_data(
+        get_dataset_frame('districts', categorical=True), loaded_versions['districts']), repeat)
+
+    codes = [state_code for state_code in state_codes if state_code != 'tt']
+    districts = get_districts(district_data)
+    sample = districts[::max(1, len(districts) // 100)]
+    time_stage(stages, 'extract state (per state)', lambda: [get_state_df(code, state_data) for code in codes],
+               repeat)
+    stages[-1].update((key, stages[-1][key] / len(codes)) for key in ('median_ms', 'min_ms', 'max_ms'))
+    time_stage(stages, 'extract district (per district)',
+               lambda: [get_district_df(district, district_data) for district in sample], repeat)
+    stages[-1].update((key, stages[-1][key] / len(sample)) for key in ('median_ms', 'min_ms', 'max_ms'))
+
+    # default view of the dashboard, the regression line is fitted on the last 40 days
+    df_in = in_data.df
+    start_date = df_in['date'].iloc[-41].to_pydatetime()
+    df_state = get_state_df('mh', state_data)
+    df_district = get_district_df('Mumbai', district_data).rename({'Date': 'date', 'Confirmed': 'cum_confirmed'},
+                                                                   axis=1)
+    for region, df in (('india', df_in), ('state', df_state), ('district', df_district)):
+        time_stage(stages, 'fit %s' % region, lambda: get_data_for_graph_with_regression_line(df, start_date), repeat)
+    fit_data = get_data_for_graph_with_regression_line(df_in, start_date)
+    for compact in (False, True):
+        time_stage(stages, 'build figures india%s' % (' (compact)' if compact else ''), lambda: json.dumps(
+            get_region_figures(df_in, fit_data, "India", 'dailyconfirmed', 'active', compact),
+            cls=PlotlyJSONEncoder), repeat)
+
+    import main
+    client = main.server.test_client()
+    time_stage(stages, 'page load', lambda: [client.get(path) for path in ('/', '/_dash-layout')], repeat)
+    for region, output_ids, inputs, date_id in callbacks:
+        body = get_callback_body(output_ids, inputs + [(date_id, start_date.strftime('%Y-%m-%d'))])
+        response = time_stage(stages, 'callback %s' % region,
+                              lambda: client.post('/_dash-update-component', json=body), repeat)
+        stages[-1]['bytes'] = len(response.data)
+        assert response.status_code == 200, response.data
+    forecast = time_stage(stages, 'forecast all regions', lambda: forecast_all(start_date), repeat)
+    stages[-1]['regions'] = len(forecast)
+    # snapshots and manifests exist by now, like for a restart of the dashboard
+    seconds = [time_import(dict(os.environ)) for _ in range(repeat)]
+    stages.append({'name': 'import main (fresh process)', 'runs': repeat, 'median_ms': statistics.median(seconds) * 1e3,
+                   'min_ms': min(seconds) * 1e3, 'max_ms': max(seconds) * 1e3})
+    return stages
+
+
+def print_stages(stages, baseline=None):
+    """
+    prints the stage results
+    :param stages: list of stage results
+    :param baseline: stage results of an earlier run to compare with
+    """
+    baseline = {stage['name']: stage for stage in baseline or []}
+    print("{:<36} {:>12} {:>12} {:>12}".format("stage", "median (ms)", "min (ms)", "change" if baseline else ""))
+    for stage in stages:
+        change = ''
+        if stage['name'] in baseline:
+            change = "{:+.1f}%".format((stage['median_ms'] / baseline[stage['name']]['median_ms'] - 1) * 100)
+        print("{:<36} {:>12.3f} {:>12.3f} {:>12}".format(stage['name'], stage['median_ms'], stage['min_ms'], change))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark of the dashboard pipeline on synthetic data")
+    parser.add_argument('--days', type=int, default=365, help='number of days of the synthetic data')
+    parser.add_argument('--districts', type=int, default=700, help='number of districts of the synthetic data')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic data')
+    parser.add_argument('--repeat', type=int, default=5, help='number of runs of each stage')
+    parser.add_argument('--data', help='directory with the api layout to use instead of generating synthetic data')
+    parser.add_argument('--output', help='write the results as json to this file')
+    parser.add_argument('--compare', help='json results of an earlier run to compare with')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        data_dir = args.data or os.path.join(work_dir, 'data')
+        # the settings are read when the modules of the dashboard are imported, which happens only after this
+        os.environ.update(LEVITT_DATA_SOURCE=data_dir, LEVITT_SNAPSHOT_DIR=os.path.join(work_dir, 'snapshots'),
+                          LEVITT_CACHE_SIZE='0', LEVITT_REFRESH_INTERVAL='0')
+        if not args.data:
+            from benchmarks.synthetic_data import write_synthetic_data
+            start = time.perf_counter()
+            write_synthetic_data(data_dir, args.days, args.districts, args.seed)
+            print("synthetic data written in %.1f s" % (time.perf_counter() - start))
+        stages = run_stages(args.repeat)
+
+    results = {
+        'commit': get_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'data': {'days': args.days, 'districts': args.districts, 'seed': args.seed, 'directory': args.data},
+        'repeat': args.repeat,
+        'stages': stages,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['stages']
+    print_stages(stages, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Startup benchmark of the dashboard. Every run starts a fresh python process with an empty results cache and reports
+how long each phase takes: importing the dash stack, creating the app (import main), the first page load, the first
+callback of India, a state and a district (the data set is loaded on first use) and the same callbacks again.
+
+Run from the repository root (LEVITT_DATA_SOURCE and LEVITT_SNAPSHOT_DIR are passed on to the runs):
+    python -m benchmarks.startup_benchmark [--repeat 5] [--start-date YYYY-MM-DD] [--json results.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+import datetime as dt
+
+# callbacks requested in each run: region, output ids and input ids with values (the start date is appended)
+callbacks = [
+    ('india', ['in-levitt', 'in-daily-new', 'in-daily-active'], [], 'in-start-date'),
+    ('state', ['state-levitt', 'state-daily-new', 'state-daily-active'], [('state-dropdown', 'mh')],
+     'state-start-date'),
+    ('district', ['district-levitt', 'district-daily-new', 'district-daily-active'],
+     [('district-dropdown', 'Mumbai')], 'district-start-date'),
+]
+
+
+def get_callback_body(output_ids, inputs):
+    """
+    request body of a dash callback updating the children of the output components
+    :param output_ids: ids of the output components
+    :param inputs: list of input component id and value
+    :return: dictionary to post to /_dash-update-component
+    """
+    return {
+        'output': '..' + '...'.join(output_id + '.children' for output_id in output_ids) + '..',
+        'outputs': [{'id': output_id, 'property': 'children'} for output_id in output_ids],
+        'inputs': [{'id': input_id, 'property': 'value', 'value': value} for input_id, value in inputs],
+        'changedPropIds': [inputs[-1][0] + '.value'],
+    }
+
+
+def run_phases(start_date):
+    """
+    runs the phases of the startup in this process, which must not have imported dash or main yet
+    :param start_date: start date sent to the callbacks (YYYY-MM-DD)
+    :return: list of phase name, seconds and details
+    """
+    phases = []
+    start = time.perf_counter()
+    import dash
+    import dash_core_components
+    import dash_html_components
+    import dash_bootstrap_components
+    import plotly.utils
+    phases.append(('import dash', time.perf_counter() - start, ''))
+
+    start = time.perf_counter()
+    import main
+    phases.append(('create app (import main)', time.perf_counter() - start,
+                   'pandas imported' if 'pandas' in sys.modules else 'pandas not imported'))
+
+    client = main.server.test_client()
+    start = time.perf_counter()
+    status = [client.get(path).status_code for path in ('/', '/_dash-layout', '/_dash-dependencies')]
+    phases.append(('first page load', time.perf_counter() - start, 'status %s' % status))
+
+    for attempt in ('first', 'repeat'):
+        for region, output_ids, inputs, date_id in callbacks:
+            body = get_callback_body(output_ids, inputs + [(date_id, start_date)])
+            start = time.perf_counter()
+            response = client.post('/_dash-update-component', json=body)
+            phases.append(('%s callback %s' % (attempt, region), time.perf_counter() - start,
+                           'status %d, %d bytes' % (response.status_code, len(response.data))))
+    return phases
+
+
+def run_child(start_date):
+    """
+    runs the phases in a fresh python process with an empty results cache
+    :param start_date: start date sent to the callbacks (YYYY-MM-DD)
+    :return: list of phase name, seconds and details
+    """
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = dict(os.environ, LEVITT_CACHE_PATH=os.path.join(cache_dir, 'cache.sqlite3'), LEVITT_REFRESH_INTERVAL='0')
+        output = subprocess.check_output([sys.executable, '-m', 'benchmarks.startup_benchmark', '--child',
+                                          '--start-date', start_date], env=env)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Startup benchmark of the dashboard")
+    parser.add_argument('--repeat', type=int, default=5, help='number of runs, the median of each phase is reported')
+    parser.add_argument('--start-date', default=str(dt.date.today() - dt.timedelta(days=40)),
+                        help='start date sent to the callbacks (YYYY-MM-DD), defaults to 40 days before today')
+    parser.add_argument('--json', help='also write the seconds of each phase of all runs to this file')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        print(json.dumps(run_phases(args.start_date)))
+        return 0
+
+    runs = [run_child(args.start_date) for _ in range(args.repeat)]
+    print("{:<30} {:>12} {:>12}  {}".format("phase", "median (ms)", "max (ms)", "details of the last run"))
+    for i, (phase, _, details) in enumerate(runs[-1]):
+        seconds = [run[i][1] for run in runs]
+        print("{:<30} {:>12.1f} {:>12.1f}  {}".format(phase, statistics.median(seconds) * 1e3, max(seconds) * 1e3,
+                                                        details))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'start_date': args.start_date, 'runs': runs}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+Deterministic synthetic data sets with the layout of the covid19india api: data.json (cases_time_series),
+states_daily.json (states_daily) and csv/latest/districts.csv. The same seed always gives the same files, the size
+scales to many years and tens of thousands of districts (districts.csv is generated and written in chunks of days).
+Every region follows a slowing epidemic curve with random daily growth, cases are recovered (or deceased) after
+RECOVERY_DAYS.
+
+Run from the repository root:
+    python -m benchmarks.synthetic_data DIRECTORY [--days 365] [--districts 700] [--seed 0]
+and point the dashboard to it with LEVITT_DATA_SOURCE=DIRECTORY
+"""
+import os
+import sys
+import json
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from data_source import DATASET_PATHS
+from states.helper import state_codes, reverse_state_code_dict
+
+# first day of the data
+START_DATE = '2020-01-30'
+
+# days after which confirmed cases are recovered or deceased
+RECOVERY_DAYS = 14
+
+# share of the cases which are deceased
+DEATH_RATE = 0.015
+
+# districts generated before the numbered ones: the default of the dropdown menu and the districts left out of it
+named_districts = [('Maharashtra', 'Mumbai'), ('Maharashtra', 'Pune'), ('Delhi', 'Unknown'), ('Goa', 'Others')]
+
+# number of days of districts.csv generated and written at once
+CHUNK_DAYS = 32
+
+
+def get_growth(rng, n_regions, days):
+    """
+    daily growth of the logarithm of cumulative confirmed cases, a decaying first wave and slow background growth
+    :param rng: random number generator
+    :param n_regions: number of regions
+    :param days: array of day numbers
+    :return: array (regions x days)
+    """
+    return (0.2 * np.exp(-days / 80) + 0.002) * rng.uniform(0.5, 1.5, (n_regions, len(days)))
+
+
+def iter_counts(n_regions, n_days, seed, chunk_days=None):
+    """
+    cumulative confirmed, recovered and deceased cases of regions, in chunks of days
+    :param n_regions: number of regions
+    :param n_days: number of days
+    :param seed: seed of the random number generator
+    :param chunk_days: number of days of each chunk, all days at once by default
+    :return: iterator of first day of the chunk and cumulative confirmed, recovered and deceased cases as int64 arrays
+    (regions x days of the chunk)
+    """
+    rng = np.random.RandomState(seed)
+    chunk_days = chunk_days or n_days
+    log_confirmed = np.log(rng.uniform(1, 20, n_regions))
+    # cumulative confirmed cases of the last RECOVERY_DAYS days
+    history = np.zeros((n_regions, RECOVERY_DAYS))
+    for first_day in range(0, n_days, chunk_days):
+        days = np.arange(first_day, min(first_day + chunk_days, n_days))
+        log_cumulative = log_confirmed[:, None] + np.cumsum(get_growth(rng, n_regions, days), axis=1)
+        log_confirmed = log_cumulative[:, -1]
+        confirmed = np.floor(np.exp(log_cumulative))
+        history = np.concatenate([history, confirmed], axis=1)
+        closed = history[:, :len(days)]
+        history = history[:, -RECOVERY_DAYS:]
+        deceased = np.floor(DEATH_RATE * closed)
+        yield first_day, confirmed.astype(np.int64), (closed - deceased).astype(np.int64), deceased.astype(np.int64)
+
+
+def get_daily(cumulative):
+    """
+    daily cases from cumulative cases
+    :param cumulative: array (regions x days)
+    :return: array (regions x days)
+    """
+    return np.diff(cumulative, axis=1, prepend=0)
+
+
+def write_india(directory, n_days, seed):
+    """
+    writes data.json
+    :param directory: output directory
+    :param n_days: number of days
+    :param seed: seed of the random number generator
+    """
+    dates = pd.date_range(START_DATE, periods=n_days)
+    _, confirmed, recovered, deceased = next(iter_counts(1, n_days, seed))
+    confirmed, recovered, deceased = confirmed[0] * 1000, recovered[0] * 1000, deceased[0] * 1000
+    columns = {
+        'date': dates.strftime('%d %B '), 'dateymd': dates.strftime('%Y-%m-%d'),
+        'dailyconfirmed': get_daily(confirmed[None])[0], 'dailydeceased': get_daily(deceased[None])[0],
+        'dailyrecovered': get_daily(recovered[None])[0], 'totalconfirmed': confirmed, 'totaldeceased': deceased,
+        'totalrecovered': recovered,
+    }
+    records = [dict(zip(columns, values)) for values in zip(*[np.asarray(column).astype(str).tolist()
+                                                             for column in columns.values()])]
+    with open(os.path.join(directory, DATASET_PATHS['india']), 'w') as f:
+        json.dump({'cases_time_series': records}, f)
+
+
+def write_states(directory, n_days, seed):
+    """
+    writes states_daily.json, daily cases of each state code and their total (tt) in three rows per day
+    :param directory: output directory
+    :param n_days: number of days
+    :param seed: seed of the random number generator
+    """
+    dates = pd.date_range(START_DATE, periods=n_days)
+    codes = [state_code for state_code in state_codes if state_code != 'tt']
+    _, confirmed, recovered, deceased = next(iter_counts(len(codes), n_days, seed + 1))
+    rows = []
+    for status, cumulative in (('Confirmed', confirmed), ('Recovered', recovered), ('Deceased', deceased)):
+        daily = get_daily(cumulative * 100)
+        values = dict(zip(codes, daily.astype(str).tolist()), tt=daily.sum(axis=0).astype(str).tolist())
+        for i, (date, dateymd) in enumerate(zip(dates.strftime('%d-%b-%y'), dates.strftime('%Y-%m-%d'))):
+            row = {'date': date, 'dateymd': dateymd, 'status': status}
+            row.update((state_code, values[state_code][i]) for state_code in state_codes)
+            rows.append((i, row))
+    # the api lists the confirmed, recovered and deceased rows of a day one after the other
+    rows.sort(key=lambda item: item[0])
+    with open(os.path.join(directory, DATASET_PATHS['states']), 'w') as f:
+        json.dump({'states_daily': [row for _, row in rows]}, f)
+
+
+def get_district_names(n_districts):
+    """
+    state and district names of the generated districts
+    :param n_districts: number of districts, at least the number of named districts
+    :return: list of state and district name
+    """
+    state_names = [reverse_state_code_dict[state_code] for state_code in state_codes
+                   if state_code in reverse_state_code_dict]
+    numbered = [(state_names[i % len(state_names)], 'District %05d' % i)
+                for i in range(max(0, n_districts - len(named_districts)))]
+    return named_districts[:n_districts] + numbered
+
+
+def write_districts(directory, n_days, n_districts, seed):
+    """
+    writes csv/latest/districts.csv, one row per day and district ordered by date like the api
+    :param directory: output directory
+    :param n_days: number of days
+    :param n_districts: number of districts
+    :param seed: seed of the random number generator
+    """
+    dates = pd.date_range(START_DATE, periods=n_days).strftime('%Y-%m-%d')
+    states, districts = map(np.array, zip(*get_district_names(n_districts)))
+    path = os.path.join(directory, DATASET_PATHS['districts'])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        for first_day, confirmed, recovered, deceased in iter_counts(n_districts, n_days, seed + 2, CHUNK_DAYS):
+            n_chunk_days = confirmed.shape[1]
+            pd.DataFrame({
+                'Date': np.repeat(dates[first_day:first_day + n_chunk_days], n_districts),
+                'State': np.tile(states, n_chunk_days),
+                'District': np.tile(districts, n_chunk_days),
+                # day major order, all districts of a day follow each other
+                'Confirmed': confirmed.T.ravel(),
+                'Recovered': recovered.T.ravel(),
+                'Deceased': deceased.T.ravel(),
+                'Other': 0,
+                'Tested': '',
+            }).to_csv(f, header=first_day == 0, index=False)
+
+
+def write_synthetic_data(directory, n_days=365, n_districts=700, seed=0):
+    """
+    writes all three data sets in the layout of the api
+    :param directory: output directory
+    :param n_days: number of days of each data set
+    :param n_districts: number of districts
+    :param seed: seed of the random number generator
+    """
+    os.makedirs(directory, exist_ok=True)
+    write_india(directory, n_days, seed)
+    write_states(directory, n_days, seed)
+    write_districts(directory, n_days, n_districts, seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write synthetic data sets in the layout of the covid19india api")
+    parser.add_argument('directory', help='output directory')
+    parser.add_argument('--days', type=int, default=365, help='number of days')
+    parser.add_argument('--districts', type=int, default=700, help='number of districts')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random number generator')
+    args = parser.parse_args(argv)
+    write_synthetic_data(args.directory, args.days, args.districts, args.seed)
+    print("%d days, %d districts written to %s" % (args.days, args.districts, args.directory))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+Bounded LRU cache of computed results (Levitt's measure fits, figure dicts) stored in a SQLite database, so that all
+worker processes of the dashboard share it. Keys contain the version of the loaded data, a data refresh therefore
+never returns stale results, the old entries are evicted once they become least recently used.
+
+Lookups only read the database: the hit and miss counters are kept per process (served by metrics.py) and the last use
+of an entry is written only when it is older than TOUCH_INTERVAL. The number of entries is tracked by each process and
+counted again on eviction. If the database cannot be used (locked for too long, corrupt) results are computed without
+the cache.
+"""
+import os
+import time
+import pickle
+import sqlite3
+import logging
+import threading
+
+from config import SNAPSHOT_DIR
+
+# path of the SQLite database holding the cache
+CACHE_PATH = os.environ.get('LEVITT_CACHE_PATH', os.path.join(SNAPSHOT_DIR, 'results_cache.sqlite3'))
+
+# maximum number of cached results, 0 disables the cache
+CACHE_SIZE = int(os.environ.get('LEVITT_CACHE_SIZE', 1024))
+
+# seconds to wait for a lock of the database held by another process
+BUSY_TIMEOUT = 10
+
+# seconds after which the last use of an entry is written again on a hit, the LRU order is kept at that resolution
+TOUCH_INTERVAL = 60
+
+# number of results a process stores before it counts the entries again, bounds how far the entries stored by other
+# processes can exceed CACHE_SIZE
+COUNT_INTERVAL = 64
+
+# connections are opened per process and thread
+_local = threading.local()
+
+# hit, miss and eviction counters and the tracked number of entries of this process, reset in forked processes
+_state = {'pid': None}
+
+# guards _state
+_state_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+def get_connection():
+    """
+    connection to the cache database of the current process and thread, the tables are created if needed
+    :return: sqlite3 connection
+    """
+    connection = getattr(_local, 'connection', None)
+    if connection is None or _local.pid != os.getpid():
+        os.makedirs(os.path.dirname(os.path.abspath(CACHE_PATH)), exist_ok=True)
+        connection = sqlite3.connect(CACHE_PATH, timeout=BUSY_TIMEOUT, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value BLOB, last_used REAL)')
+        connection.execute('CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)')
+        _local.connection, _local.pid = connection, os.getpid()
+    return connection
+
+
+def get_state():
+    """
+    counters of the current process, created on first use and after a fork. Callers hold _state_lock
+    :return: dictionary with hits, misses, evictions, entries (None until counted) and stores since the last count
+    """
+    if _state['pid'] != os.getpid():
+        _state.update(pid=os.getpid(), hits=0, misses=0, evictions=0, entries=None, stores=0)
+    return _state
+
+
+def increment_counter(name, amount=1):
+    """
+    increments a counter of the current process
+    :param name: hits, misses or evictions
+    :param amount: amount to add to the counter
+    """
+    with _state_lock:
+        get_state()[name] += amount
+
+
+def make_key(*parts):
+    """
+    cache key from its parts, e.g. kind of result, region id, start date and data version
+    :param parts: parts of the key
+    :return: key string
+    """
+    return '|'.join(str(part) for part in parts)
+
+
+def cache_get(key):
+    """
+    looks up a result in the cache and marks it as recently used if its last use is older than TOUCH_INTERVAL
+    :param key: cache key
+    :return: cached result, None if the key is not cached
+    """
+    connection = get_connection()
+    row = connection.execute('SELECT value, last_used FROM results WHERE key = ?', (key,)).fetchone()
+    if row is None:
+        increment_counter('misses')
+        return None
+    now = time.time()
+    if now - row[1] > TOUCH_INTERVAL:
+        # marking the entry is left out rather than waiting for a writer, the next hit marks it
+        connection.execute('PRAGMA busy_timeout = 0')
+        try:
+            connection.execute('UPDATE results SET last_used = ? WHERE key = ?', (now, key))
+        except sqlite3.OperationalError:
+            pass
+        finally:
+            connection.execute('PRAGMA busy_timeout = %d' % (BUSY_TIMEOUT * 1000))
+    increment_counter('hits')
+    return pickle.loads(row[0])
+
+
+def cache_set(key, value):
+    """
+    stores a result in the cache, least recently used results are evicted when there are more than CACHE_SIZE
+    :param key: cache key
+    :param value: picklable result
+    """
+    connection = get_connection()
+    added = connection.execute('INSERT OR REPLACE INTO results (key, value, last_used) VALUES (?, ?, ?)',
+                               (key, sqlite3.Binary(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)), time.time()))
+    with _state_lock:
+        state = get_state()
+        state['stores'] += 1
+        if state['entries'] is not None:
+            state['entries'] += added.rowcount
+        # other processes add and evict entries too, the tracked number is corrected by counting now and then
+        count = state['entries'] is None or state['entries'] > CACHE_SIZE or state['stores'] >= COUNT_INTERVAL
+    if not count:
+        return
+    n_entries = connection.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+    if n_entries > CACHE_SIZE:
+        connection.execute('DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY last_used LIMIT ?)',
+                           (n_entries - CACHE_SIZE,))
+        increment_counter('evictions', n_entries - CACHE_SIZE)
+        n_entries = CACHE_SIZE
+    with _state_lock:
+        get_state().update(entries=n_entries, stores=0)
+
+
+def cached(key, compute):
+    """
+    result for a key taken from the cache, computed and stored if it is not cached. Errors of the cache database are
+    logged and the result is computed without the cache
+    :param key: cache key
+    :param compute: function without arguments computing the result
+    :return: result
+    """
+    if CACHE_SIZE <= 0:
+        return compute()
+    try:
+        value = cache_get(key)
+    except sqlite3.Error as error:
+        logger.warning("results cache lookup failed: %s", error)
+        return compute()
+    if value is None:
+        value = compute()
+        try:
+            cache_set(key, value)
+        except sqlite3.Error as error:
+            logger.warning("results cache store failed: %s", error)
+    return value
+
+
+def get_cache_stats():
+    """
+    hit, miss and eviction counters of the current process and the number of cached results of all processes
+    :return: dictionary of counters
+    """
+    with _state_lock:
+        state = get_state()
+        stats = {name: state[name] for name in ('hits', 'misses', 'evictions')}
+    stats['entries'] = get_connection().execute('SELECT COUNT(*) FROM results').fetchone()[0]
+    return stats
+
+
+def clear_cache():
+    """
+    removes all cached results and resets the counters of the current process
+    """
+    get_connection().execute('DELETE FROM results')
+    with _state_lock:
+        get_state().update(hits=0, misses=0, evictions=0, entries=0, stores=0)
@@ -0,0 +1,134 @@
+"""
+Compact figure mode: the traces of the figure dicts are rewritten before they are serialized, so the callback
+responses get smaller and faster to encode.
+- dates are sent as short yyyy-mm-dd strings, or not at all for evenly spaced daily series (x0 and dx instead of x),
+- counts are sent as integers, other values rounded to 7 significant digits (about the precision of float32),
+- series longer than FIGURE_MAX_POINTS are downsampled with largest triangle three buckets (LTTB), which keeps the
+  shape of the series (peaks and dips) while dropping points of the flat stretches.
+The values stay JSON lists of numbers, they are not sent as base64 encoded typed arrays: plotly.js decodes typed
+arrays in figures only from version 2.28 on, later than the plotly.js bundled with the dash version the dashboard uses.
+Enabled with LEVITT_COMPACT_FIGURES=1.
+"""
+import json
+
+import numpy as np
+
+from config import FIGURE_MAX_POINTS
+
+# significant digits of values which are not counts
+SIGNIFICANT_DIGITS = 7
+
+# step of daily dates in milliseconds, the unit of dx on date axes
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+def lttb(x, y, n_out):
+    """
+    largest triangle three buckets downsampling: the first and last point are kept, the points in between are split
+    into n_out - 2 buckets and from each bucket the point forming the largest triangle with the point kept from the
+    previous bucket and the average of the next bucket is kept
+    :param x: float array of x values, increasing
+    :param y: float array of y values, without NaN
+    :param n_out: number of points to keep
+    :return: indices of the kept points
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    # bucket i holds the points bounds[i]:bounds[i + 1], the last point forms the last bucket
+    bounds = (np.arange(n_out - 1) * ((n - 2) / (n_out - 2))).astype(np.int64) + 1
+    bounds[-1] = n - 1
+    counts = np.diff(np.append(bounds, n))
+    avg_x = np.add.reduceat(x, bounds) / counts
+    avg_y = np.add.reduceat(y, bounds) / counts
+    # average of the next bucket for each point of the buckets in between
+    next_x = np.repeat(avg_x[1:], counts[:-1])
+    next_y = np.repeat(avg_y[1:], counts[:-1])
+    # the doubled triangle area of point j with the kept point a is abs(x[a] * p[j] + y[a] * q[j] + r[j])
+    inner_x, inner_y = x[1:n - 1], y[1:n - 1]
+    p = (inner_y - next_y).tolist()
+    q = (next_x - inner_x).tolist()
+    r = (inner_x * next_y - next_x * inner_y).tolist()
+    kept = [0]
+    x_a, y_a = x[0], y[0]
+    for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        a = max(range(start - 1, end - 1), key=lambda j: abs(x_a * p[j] + y_a * q[j] + r[j])) + 1
+        kept.append(a)
+        x_a, y_a = x[a], y[a]
+    kept.append(n - 1)
+    return np.array(kept)
+
+
+def get_compact_values(values):
+    """
+    values of a trace as json ready list, integers for counts, other values rounded to SIGNIFICANT_DIGITS
+    :param values: float array
+    :return: list of numbers, None for missing values
+    """
+    finite = np.isfinite(values)
+    if np.array_equal(values[finite], np.round(values[finite])) and np.all(np.abs(values[finite]) < 2 ** 53):
+        rounded = np.where(finite, values, 0).astype(np.int64)
+    else:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            magnitude = np.floor(np.log10(np.abs(values)))
+            decimals = np.where(finite & (values != 0), SIGNIFICANT_DIGITS - 1 - magnitude, 0).clip(0, 22)
+        scale = 10.0 ** decimals
+        rounded = np.round(np.where(finite, values, 0) * scale) / scale
+    return [value if ok else None for value, ok in zip(rounded.tolist(), finite.tolist())]
+
+
+def compact_trace(trace, max_points=None):
+    """
+    compact version of a trace with date x values
+    :param trace: trace dict with x (dates) and y (numbers) values
+    :param max_points: maximum number of points, defaults to FIGURE_MAX_POINTS
+    :return: new trace dict
+    """
+    max_points = FIGURE_MAX_POINTS if max_points is None else max_points
+    x = np.asarray(trace['x'], dtype='datetime64[D]')
+    y = np.asarray(trace['y'], dtype=np.float64)
+    # plotly draws as many points as the shorter of x and y has
+    n = min(len(x), len(y))
+    x, y = x[:n], y[:n]
+    if max_points and n > max_points:
+        keep = np.flatnonzero(np.isfinite(y))
+        keep = keep[lttb(x[keep].astype(np.float64), y[keep], max_points)]
+        x, y = x[keep], y[keep]
+    trace = {key: value for key, value in trace.items() if key not in ('x', 'y')}
+    steps = np.diff(x).astype(np.int64)
+    if len(x) > 1 and np.all(steps == 1):
+        trace['x0'], trace['dx'] = str(x[0]), DAY_MS
+    else:
+        trace['x'] = np.datetime_as_string(x).tolist()
+    trace['y'] = get_compact_values(y)
+    return trace
+
+
+def get_line_dates(dates, extra_dates):
+    """
+    dates of the regression line, the dates of the data followed by the dates it is extrapolated to
+    :param dates: datetime64 array of the dates of the data
+    :param extra_dates: list of dates after the last date of the data
+    :return: datetime64 array
+    """
+    return np.concatenate([np.asarray(dates, dtype='datetime64[D]'), np.asarray(extra_dates, dtype='datetime64[D]')])
+
+
+def compact_figure(figure, max_points=None):
+    """
+    compact version of a figure
+    :param figure: figure dict, traces with date x values
+    :param max_points: maximum number of points of each trace, defaults to FIGURE_MAX_POINTS
+    :return: new figure dict
+    """
+    return dict(figure, data=[compact_trace(trace, max_points) for trace in figure['data']])
+
+
+def get_payload_size(figures, cls=None):
+    """
+    size of the json encoded figures
+    :param figures: list of figure dicts
+    :param cls: json encoder class
+    :return: number of bytes
+    """
+    return len(json.dumps(figures, cls=cls).encode())
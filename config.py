@@ -0,0 +1,27 @@
+"""
+Settings read from the environment that are needed before the data sets are loaded. This module has no heavy imports,
+so the dashboard can read them at startup without pulling in pandas and the data source layer.
+"""
+import os
+
+# directory in which snapshots of the data sets are stored
+SNAPSHOT_DIR = os.environ.get('LEVITT_SNAPSHOT_DIR',
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snapshots'))
+
+# seconds between two refreshes, 0 disables the background refresher
+REFRESH_INTERVAL = float(os.environ.get('LEVITT_REFRESH_INTERVAL', 0))
+
+# whether the dashboard sends compact figures (see compact_figures.py)
+COMPACT_FIGURES = os.environ.get('LEVITT_COMPACT_FIGURES', '0') not in ('', '0', 'false', 'False')
+
+# maximum number of points of a trace of a compact figure, longer series are downsampled, 0 disables downsampling
+FIGURE_MAX_POINTS = int(os.environ.get('LEVITT_FIGURE_MAX_POINTS', 500))
+
+# method of fitting the regression line on H(t), least_squares or theil_sen (see levitt.FIT_METHODS)
+FIT_METHOD = os.environ.get('LEVITT_FIT_METHOD', 'least_squares')
+
+# whether the bulk export routes (see export.py) are registered on the dashboard server
+EXPORT_ENABLED = os.environ.get('LEVITT_EXPORT', '0') not in ('', '0', 'false', 'False')
+
+# whether the regression line is fitted in the browser when the start date changes (see assets/levitt.js)
+CLIENTSIDE_FIT = os.environ.get('LEVITT_CLIENTSIDE_FIT', '0') not in ('', '0', 'false', 'False')
@@ -4,8 +4,7 @@ import dash_core_components as dcc
 import dash_html_components as html
 import dash_bootstrap_components as dbc
 
-from states.helper import state_code_dict
-from districts.helper import districts
+from manifest import read_manifest
 
 
 def get_dropdown_for_row(dropdown_text, dropdown_id, dropdown_options, default_value):
@@ -47,14 +46,36 @@ def get_date_input_for_row(date_id, n_past_days=40):
     ]
 
 
-def get_graphs_for_row(levitt_graph_id, daily_new_graph_id, daily_active_graph_id):
+def get_dropdown_options(name):
+    """
+    options of the dropdown menu of a data set, taken from its manifest. If there is no manifest (snapshots stored
+    before manifests were written) the data set helper gives the options, the districts data is loaded for it
+    :param name: name of the data set, states or districts
+    :return: list of label and value dictionaries
+    """
+    manifest = read_manifest(name)
+    if manifest is not None:
+        return manifest['options']
+    if name == 'states':
+        from states.helper import get_state_options
+        return get_state_options()
+    from districts.helper import get_district_options
+    return get_district_options()
+
+
+def get_graphs_for_row(levitt_graph_id, daily_new_graph_id, daily_active_graph_id, clientside=False):
     """
     three graphs (levitt's measure graph, daily new cases graph, daily active cases graph) for bootstrap row
     :param levitt_graph_id: id of levitt's measure graph used for prediction
     :param daily_new_graph_id: id of daily new cases graph
     :param daily_active_graph_id: id of daily active cases graph
+    :param clientside: whether the regression line is fitted in the browser, then the graphs are part of the layout
+    with ids suffixed by -graph and only their figures are updated by the callbacks
     :return: list of three bootstrap columns that will contain the three graphs
     """
+    if clientside:
+        return [dbc.Col(dbc.Card(dcc.Graph(id=graph_id + "-graph")), md=4)
+                for graph_id in (levitt_graph_id, daily_new_graph_id, daily_active_graph_id)]
     return [
         dbc.Col(dbc.Card(html.Div(id=levitt_graph_id)), md=4),
         dbc.Col(dbc.Card(html.Div(id=daily_new_graph_id)), md=4),
@@ -62,71 +83,92 @@ def get_graphs_for_row(levitt_graph_id, daily_new_graph_id, daily_active_graph_i
     ]
 
 
-dashboard_layout = dbc.Container(
-    [
-        html.H1("Analyzing COVID-19 trends in India via Levitt's Measure"),
-        html.P(children=["Levitt's measure H(t) for day t for COVID-19 is a very simple measure, it is defined as H("
-                         "t)=X(t)/X(t-1), where X(t) is the cumulative number of COVID-19 cases on day t. When the "
-                         "value of H(t) approximately equals 1 (we have taken 1.0001) then the situation will be "
-                         "better and the number of new cases per day will become considerably low.", html.Br(),
-                         "More information about Levitt's measure is given here: ",
-                         html.A("Conceptual basis of the Levitt's measure",
-                                href="https://drive.google.com/file/d/1bnZ1tLP1hOJJ2GeQFEMTK5cPjEdHvyf2/view?usp"
-                                     "=sharing"),
-                         ]
-               ),
-        html.P(children=["Three graphs are plotted for each:", html.Br(),
-                         html.B("1) H(t) for India as t varies,"), html.Br(),
-                         html.B("2) H(t) for States/Union Territories of India as t varies,"), html.Br(),
-                         html.B("3) H(t) for Districts of India as t varies."), html.Br(),
-                         "For each of the above, the first graph shows daily H(t). The regression line is fitted on "
-                         "last 40 days daily H(t). However, user can specify the start date explicitly to manually "
-                         "adjust how many past days H(t) to be used for fitting, the line is then extrapolated till "
-                         "H(t) reaches 1.0001. R-squared value is shown which measures the goodness of the fit. "
-                         "R-squared normally takes a value between 0 and 1, generally higher the value, better is the "
-                         "fit. The line is not extrapolated if it's slope is positive or r-squared value is less than "
-                         "0.1, as it will be meaningless. Choice of states/union territories, and of districts can be "
-                         "made using the corresponding drop-down menu. The second and third graphs show the daily new "
-                         "cases, and the daily active cases, respectively. "
-                         ]
-               ),
-        html.P(children=[html.B("Disclaimer: "), "It must be understood that the prediction shown here is based on a "
-                                                 "certain trend in the current data, therefore, if certain "
-                                                 "circumstances arise in future that alter the current trend, "
-                                                 "then the prediction will not hold. "
-                         ]
-               ),
-        html.Hr(),
-        # for India
-        dbc.Row(get_date_input_for_row("in-start-date"), align="center"),
-        html.P(html.B("Plots for India"), style={'text-align': 'center'}),
-        dbc.Row(get_graphs_for_row("in-levitt", "in-daily-new", "in-daily-active"), align="center"),
-        html.Hr(),
-        # for states
-        dbc.Row(get_dropdown_for_row("Choose State:", "state-dropdown",
-                                     [{'label': state, 'value': state_code} for state, state_code in
-                                      state_code_dict.items()], "mh") + get_date_input_for_row("state-start-date"),
-                align="center"),
-        html.P(html.B("Plots for a State"), style={'text-align': 'center'}),
-        dbc.Row(get_graphs_for_row("state-levitt", "state-daily-new", "state-daily-active"), align="center"),
-        html.Hr(),
-        # for districts
-        dbc.Row(get_dropdown_for_row("Choose District:", "district-dropdown",
-                                     [{'label': district, 'value': district} for district in districts],
-                                     "Mumbai") + get_date_input_for_row("district-start-date"), align="center"),
-        html.P(html.B("Plots for a District"), style={'text-align': 'center'}),
-        dbc.Row(get_graphs_for_row("district-levitt", "district-daily-new", "district-daily-active"), align="center"),
-        html.Hr(),
-        # footer
-        html.Footer(children=
+def get_series_stores(clientside=False):
+    """
+    stores of the series the browser fits the regression lines on (see assets/levitt.js), filled by the callbacks when
+    the region changes. India has no dropdown, its store is filled when the store holding its region id is loaded
+    :param clientside: whether the regression line is fitted in the browser
+    :return: list of dash core component stores, empty if not clientside
+    """
+    if not clientside:
+        return []
+    return [dcc.Store(id="in-region", data="in"), dcc.Store(id="in-series"), dcc.Store(id="state-series"),
+            dcc.Store(id="district-series")]
+
+
+def get_dashboard_layout(clientside=False):
+    """
+    layout of the dashboard, built on each page load with the dropdown options of the manifests
+    :param clientside: whether the regression line is fitted in the browser when the start date changes
+    :return: bootstrap container with the whole dashboard
+    """
+    return dbc.Container(
         [
-            html.P(children=[
-                "Data Source: ",
-                html.A("Covid19 India", href="https://github.com/covid19india/api"),
+            html.H1("Analyzing COVID-19 trends in India via Levitt's Measure"),
+            html.P(children=["Levitt's measure H(t) for day t for COVID-19 is a very simple measure, it is defined as "
+                             "H(t)=X(t)/X(t-1), where X(t) is the cumulative number of COVID-19 cases on day t. When "
+                             "the value of H(t) approximately equals 1 (we have taken 1.0001) then the situation will "
+                             "be better and the number of new cases per day will become considerably low.", html.Br(),
+                             "More information about Levitt's measure is given here: ",
+                             html.A("Conceptual basis of the Levitt's measure",
+                                    href="https://drive.google.com/file/d/1bnZ1tLP1hOJJ2GeQFEMTK5cPjEdHvyf2/view?usp"
+                                         "=sharing"),
+                             ]
+                   ),
+            html.P(children=["Three graphs are plotted for each:", html.Br(),
+                             html.B("1) H(t) for India as t varies,"), html.Br(),
+                             html.B("2) H(t) for States/Union Territories of India as t varies,"), html.Br(),
+                             html.B("3) H(t) for Districts of India as t varies."), html.Br(),
+                             "For each of the above, the first graph shows daily H(t). The regression line is fitted "
+                             "on last 40 days daily H(t). However, user can specify the start date explicitly to "
+                             "manually adjust how many past days H(t) to be used for fitting, the line is then "
+                             "extrapolated till H(t) reaches 1.0001. R-squared value is shown which measures the "
+                             "goodness of the fit. R-squared normally takes a value between 0 and 1, generally higher "
+                             "the value, better is the fit. The line is not extrapolated if it's slope is positive or "
+                             "r-squared value is less than 0.1, as it will be meaningless. Choice of states/union "
+                             "territories, and of districts can be made using the corresponding drop-down menu. The "
+                             "second and third graphs show the daily new cases, and the daily active cases, "
+                             "respectively. "
+                             ]
+                   ),
+            html.P(children=[html.B("Disclaimer: "), "It must be understood that the prediction shown here is based "
+                                                     "on a certain trend in the current data, therefore, if certain "
+                                                     "circumstances arise in future that alter the current trend, "
+                                                     "then the prediction will not hold. "
+                             ]
+                   ),
+            html.Hr(),
+            # for India
+            dbc.Row(get_date_input_for_row("in-start-date"), align="center"),
+            html.P(html.B("Plots for India"), style={'text-align': 'center'}),
+            dbc.Row(get_graphs_for_row("in-levitt", "in-daily-new", "in-daily-active", clientside), align="center"),
+            html.Hr(),
+            # for states
+            dbc.Row(get_dropdown_for_row("Choose State:", "state-dropdown", get_dropdown_options('states'), "mh") +
+                    get_date_input_for_row("state-start-date"), align="center"),
+            html.P(html.B("Plots for a State"), style={'text-align': 'center'}),
+            dbc.Row(get_graphs_for_row("state-levitt", "state-daily-new", "state-daily-active",
+                                       clientside), align="center"),
+            html.Hr(),
+            # for districts
+            dbc.Row(get_dropdown_for_row("Choose District:", "district-dropdown", get_dropdown_options('districts'),
+                                         "Mumbai") + get_date_input_for_row("district-start-date"), align="center"),
+            html.P(html.B("Plots for a District"), style={'text-align': 'center'}),
+            dbc.Row(get_graphs_for_row("district-levitt", "district-daily-new", "district-daily-active",
+                                       clientside),
+                    align="center"),
+            html.Hr(),
+        ] + get_series_stores(clientside) + [
+            # footer
+            html.Footer(children=
+            [
+                html.P(children=[
+                    "Data Source: ",
+                    html.A("Covid19 India", href="https://github.com/covid19india/api"),
+                ]
+                ),
             ]
             ),
-        ]
-        ),
-    ],
-    fluid=True,
-)
+        ],
+        fluid=True,
+    )
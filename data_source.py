@@ -0,0 +1,557 @@
+"""
+Data source layer for the India, states and districts data sets.
+
+The raw tables are read either from the covid19india api or from a local directory containing the same files, and the
+last fetched tables are kept as columnar snapshots (one .npy file per column) in a local snapshot directory. At
+startup the snapshots are memory mapped, the source is only contacted when no snapshot exists or when a refresh is
+asked for:
+    python data_source.py refresh [--source URL_OR_DIRECTORY]
+
+Data sets without a snapshot are fetched concurrently, each in a worker thread that parses and stores its payload while
+the others are still downloading. Urls are fetched through one pooled session (connections are kept alive between
+requests) with gzip compression, bounded connect and read timeouts, and retries with exponential backoff on connection
+errors and on 429 and 5xx responses.
+"""
+import io
+import os
+import sys
+import json
+import shutil
+import argparse
+import threading
+import datetime as dt
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from config import SNAPSHOT_DIR
+from manifest import write_snapshot_manifest
+
+# url of the covid19india api, used as the default data source
+REMOTE_SOURCE = 'https://api.covid19india.org'
+
+# data source, either a base url or a local directory with the same layout as the api
+DATA_SOURCE = os.environ.get('LEVITT_DATA_SOURCE', REMOTE_SOURCE)
+
+# seconds to wait for a response of a remote data source (between two received bytes of the response)
+REQUEST_TIMEOUT = float(os.environ.get('LEVITT_REQUEST_TIMEOUT', 60))
+
+# seconds to wait for the connection to a remote data source
+CONNECT_TIMEOUT = float(os.environ.get('LEVITT_CONNECT_TIMEOUT', 10))
+
+# number of retries of a failed request, the waits between them double starting at RETRY_BACKOFF seconds
+REQUEST_RETRIES = int(os.environ.get('LEVITT_REQUEST_RETRIES', 3))
+RETRY_BACKOFF = float(os.environ.get('LEVITT_RETRY_BACKOFF', 0.5))
+
+# response statuses after which a request is retried
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# path of each data set relative to the data source
+DATASET_PATHS = {'india': 'data.json', 'states': 'states_daily.json', 'districts': 'csv/latest/districts.csv'}
+
+# file in a snapshot directory holding the name of the current snapshot version
+CURRENT_FILE = 'CURRENT'
+
+# columns kept of csv data sets: count columns are stored as int32 (float64 if values are missing), all other columns
+# are dictionary encoded, columns not listed are dropped while reading
+CSV_COLUMNS = {'districts': {'Date': 'text', 'State': 'text', 'District': 'text', 'Confirmed': 'count',
+                             'Recovered': 'count', 'Deceased': 'count'}}
+
+# number of rows of a csv payload parsed at once, bounds the memory of the object columns of a chunk
+CSV_CHUNK_ROWS = int(os.environ.get('LEVITT_CSV_CHUNK_ROWS', 50000))
+
+# dictionary to map data set names to the snapshot version loaded by this process
+loaded_versions = {}
+
+# pooled http session of the process, created on first use
+session = None
+
+# thread pool fetching data sets concurrently, created on first use
+fetch_executor = None
+
+# dictionary to map snapshot directory and data set name to the future of a fetch in progress
+pending_fetches = {}
+
+# guards the creation of the session and the thread pool and the pending fetches
+fetch_lock = threading.Lock()
+
+
+def is_remote(source):
+    """
+    checks whether a data source is a url or a local directory
+    :param source: base url or local directory
+    :return: True if the source is a url
+    """
+    return source.startswith('http://') or source.startswith('https://')
+
+
+def get_dataset_location(name, source=None):
+    """
+    location of a data set in a data source
+    :param name: name of the data set, one of DATASET_PATHS
+    :param source: base url or local directory, defaults to DATA_SOURCE
+    :return: url or file path of the data set
+    """
+    source = source or DATA_SOURCE
+    if is_remote(source):
+        return source.rstrip('/') + '/' + DATASET_PATHS[name]
+    return os.path.join(source, *DATASET_PATHS[name].split('/'))
+
+
+def get_session():
+    """
+    http session shared by all fetches of the process, its connection pool keeps connections to the data source
+    alive and its adapter retries failed requests with exponential backoff
+    :return: requests session
+    """
+    global session
+    if session is None:
+        with fetch_lock:
+            if session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                from urllib3.util.retry import Retry
+                retry = Retry(total=REQUEST_RETRIES, backoff_factor=RETRY_BACKOFF, status_forcelist=RETRY_STATUSES,
+                              raise_on_status=False)
+                adapter = HTTPAdapter(pool_connections=len(DATASET_PATHS), pool_maxsize=len(DATASET_PATHS),
+                                      max_retries=retry)
+                new_session = requests.Session()
+                new_session.mount('http://', adapter)
+                new_session.mount('https://', adapter)
+                session = new_session
+    return session
+
+
+def fetch_payload(name, source=None, validators=None, offset=0):
+    """
+    fetches the payload of a data set from a data source. With the validators of an earlier fetch the request is
+    conditional (ETag and Last-Modified headers for urls, modification time and size for files), with an offset only
+    the bytes from that offset on are requested
+    :param name: name of the data set, one of DATASET_PATHS
+    :param source: base url or local directory, defaults to DATA_SOURCE
+    :param validators: validators returned by an earlier fetch
+    :param offset: byte offset from which the payload is requested
+    :return: payload bytes (None if the payload did not change since the validators), validators of the payload, and
+    whether the payload starts at offset (True) or is complete (False)
+    """
+    location = get_dataset_location(name, source)
+    validators = validators or {}
+    if is_remote(location):
+        headers = {'Accept-Encoding': 'gzip, deflate'}
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        if offset:
+            headers['Range'] = 'bytes=%d-' % offset
+            headers['Accept-Encoding'] = 'identity'
+        req = get_session().get(location, headers=headers, timeout=(CONNECT_TIMEOUT, REQUEST_TIMEOUT))
+        if req.status_code == 304:
+            return None, validators, False
+        if req.status_code == 416:
+            # the payload is shorter than the offset, it was not appended to
+            return fetch_payload(name, source)
+        req.raise_for_status()
+        new_validators = {'etag': req.headers.get('ETag'), 'last_modified': req.headers.get('Last-Modified')}
+        return req.content, new_validators, req.status_code == 206
+    stat = os.stat(location)
+    new_validators = {'mtime': stat.st_mtime, 'size': stat.st_size}
+    if validators == new_validators:
+        return None, validators, False
+    with open(location, 'rb') as f:
+        if 0 < offset < stat.st_size:
+            f.seek(offset)
+            return f.read(), new_validators, True
+        return f.read(), new_validators, False
+
+
+def parse_payload(name, content):
+    """
+    parses the payload of a data set
+    :param name: name of the data set, one of DATASET_PATHS
+    :param content: payload bytes
+    :return: raw dataframe of the data set
+    """
+    if name == 'india':
+        return pd.DataFrame(json.loads(content.decode('utf-8'))['cases_time_series'])
+    if name == 'states':
+        return pd.DataFrame(json.loads(content.decode('utf-8'))['states_daily'])
+    return read_csv_chunked(io.BytesIO(content), CSV_COLUMNS[name])
+
+
+def get_count_values(values):
+    """
+    compact array of counts
+    :param values: numeric array
+    :return: int32 array if all values are whole numbers in the range of int32, otherwise the values as they are
+    (float64 for non integer arrays)
+    """
+    values = np.asarray(values)
+    if values.dtype.kind not in 'iu':
+        values = values.astype(np.float64, copy=False)
+        if not (np.all(np.isfinite(values)) and np.array_equal(values, np.round(values))):
+            return values
+    if len(values) and (values.min() < np.iinfo(np.int32).min or values.max() > np.iinfo(np.int32).max):
+        return values
+    return values.astype(np.int32, copy=False)
+
+
+def encode_values(values, dictionary):
+    """
+    dictionary encodes a chunk of a text column, values not seen in earlier chunks are added to the dictionary
+    :param values: array like of the values of the chunk
+    :param dictionary: dictionary to map values to codes, in order of first appearance, updated in place
+    :return: int32 array of codes, -1 for missing values
+    """
+    codes, uniques = pd.factorize(values)
+    mapping = np.array([dictionary.setdefault(value, len(dictionary)) for value in uniques] + [-1], dtype=np.int32)
+    # code -1 of missing values takes the last entry of mapping
+    return mapping.take(codes)
+
+
+def read_csv_chunked(buffer, columns, chunk_rows=None):
+    """
+    reads a csv table in chunks of rows, only the given columns are read, text columns are dictionary encoded chunk by
+    chunk so that the object strings of only one chunk are held at a time
+    :param buffer: file path or file like object of the csv table
+    :param columns: dictionary to map the columns to read to their kind (see CSV_COLUMNS)
+    :param chunk_rows: number of rows per chunk, defaults to CSV_CHUNK_ROWS
+    :return: dataframe with the given columns (in the order of the csv table), text columns as categoricals with the
+    categories in order of first appearance, count columns as int32 if possible
+    """
+    dictionaries = {column: {} for column, kind in columns.items() if kind == 'text'}
+    chunks = {column: [] for column in columns}
+    dtype = {column: str if kind == 'text' else np.float64 for column, kind in columns.items()}
+    header = []
+    for df_chunk in pd.read_csv(buffer, usecols=lambda column: column in columns, dtype=dtype,
+                                chunksize=chunk_rows or CSV_CHUNK_ROWS):
+        header = list(df_chunk.columns)
+        for column in header:
+            if column in dictionaries:
+                chunks[column].append(encode_values(df_chunk[column].values, dictionaries[column]))
+            else:
+                chunks[column].append(get_count_values(df_chunk[column].values))
+    data = {}
+    for column in header:
+        values = np.concatenate(chunks.pop(column))
+        if column in dictionaries:
+            data[column] = pd.Categorical.from_codes(values, list(dictionaries[column]))
+        else:
+            data[column] = get_count_values(values)
+    return pd.DataFrame(data, columns=header)
+
+
+def get_payload_info(name, content, validators):
+    """
+    information about a fetched payload stored with its snapshot, for csv payloads the header line, the last line
+    and the size are kept so that rows appended later can be fetched on their own
+    :param name: name of the data set
+    :param content: payload bytes
+    :param validators: validators of the payload
+    :return: dictionary of payload information
+    """
+    info = {'validators': validators}
+    if DATASET_PATHS[name].endswith('.csv') and content:
+        info['size'] = len(content)
+        info['header'] = content.split(b'\n', 1)[0].decode('latin-1') + '\n'
+        info['tail'] = content.splitlines(True)[-1].decode('latin-1')
+    return info
+
+
+def read_source(name, source=None):
+    """
+    reads the raw table of a data set from a data source
+    :param name: name of the data set, one of DATASET_PATHS
+    :param source: base url or local directory, defaults to DATA_SOURCE
+    :return: raw dataframe of the data set
+    """
+    return parse_payload(name, fetch_payload(name, source)[0])
+
+
+def get_snapshot_path(name, snapshot_dir=None):
+    """
+    directory holding the snapshots of a data set
+    :param name: name of the data set
+    :param snapshot_dir: snapshot directory, defaults to SNAPSHOT_DIR
+    :return: path of the directory
+    """
+    return os.path.join(snapshot_dir or SNAPSHOT_DIR, name)
+
+
+def get_snapshot_version(name, snapshot_dir=None):
+    """
+    version of the current snapshot of a data set
+    :param name: name of the data set
+    :param snapshot_dir: snapshot directory, defaults to SNAPSHOT_DIR
+    :return: version string, None if there is no snapshot
+    """
+    try:
+        with open(os.path.join(get_snapshot_path(name, snapshot_dir), CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def get_snapshot_meta(name, snapshot_dir=None, version=None):
+    """
+    metadata of a snapshot of a data set
+    :param name: name of the data set
+    :param snapshot_dir: snapshot directory, defaults to SNAPSHOT_DIR
+    :param version: snapshot version, defaults to the current version
+    :return: dictionary of metadata, None if there is no snapshot
+    """
+    version = version or get_snapshot_version(name, snapshot_dir)
+    if version is None:
+        return None
+    with open(os.path.join(get_snapshot_path(name, snapshot_dir), version, 'meta.json')) as f:
+        return json.load(f)
+
+
+def write_snapshot_meta(name, meta, snapshot_dir=None):
+    """
+    atomically writes the metadata of a snapshot of a data set
+    :param name: name of the data set
+    :param meta: dictionary of metadata, contains the version of the snapshot
+    :param snapshot_dir: snapshot directory, defaults to SNAPSHOT_DIR
+    """
+    meta_path = os.path.join(get_snapshot_path(name, snapshot_dir), meta['version'], 'meta.json')
+    with open(meta_path + '.tmp', 'w') as f:
+        json.dump(meta, f)
+    os.replace(meta_path + '.tmp', meta_path)
+
+
+def save_snapshot(name, df, source=None, snapshot_dir=None, payload=None):
+    """
+    writes a dataframe as a new snapshot version of a data set and makes it the current one, numeric columns are
+    stored as they are, other columns are stored as int32 codes and an array of unique values. The manifest of the
+    data set is written for the new version
+    :param name: name of the data set
+    :param df: raw dataframe of the data set
+    :param source: data source the dataframe was read from, stored in the snapshot metadata
+    :param snapshot_dir: snapshot directory, defaults to SNAPSHOT_DIR
+    :param payload: information about the fetched payload (see get_payload_info), stored in the snapshot metadata
+    :return: version of the new snapshot
+    """
+    path = get_snapshot_path(name, snapshot_dir)
+    version = dt.datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+    version_path = os.path.join(path, version)
+    os.makedirs(version_path)
+    columns = []
+    for i, column in enumerate(df.columns):
+        values = df[column]
+        if values.dtype.kind in 'biuf':
+            np.save(os.path.join(version_path, '%d.npy' % i), values.values)
+            columns.append({'name': column, 'encoding': 'plain'})
+        else:
+            codes, uniques = pd.factorize(values)
+            np.save(os.path.join(version_path, '%d.codes.npy' % i), codes.astype(np.int32))
+            np.save(os.path.join(version_path, '%d.uniques.npy' % i), np.asarray(uniques.astype(str), dtype=str))
+            columns.append({'name': column, 'encoding': 'dictionary'})
+    write_snapshot_meta(name, {'version': version, 'source': source or DATA_SOURCE, 'rows': len(df),
+                               'columns': columns, 'payload': payload or {}}, snapshot_dir)
+    # switch the current version atomically, readers either see the old or the new version
+    current_tmp = os.path.join(path, CURRENT_FILE + '.tmp')
+    with open(current_tmp, 'w') as f:
+        f.write(version)
+    os.replace(current_tmp, os.path.join(path, CURRENT_FILE))
+    write_snapshot_manifest(name, version, df, snapshot_dir)
+    remove_old_snapshots(name, snapshot_dir)
+    return version
+
+
+def remove_old_snapshots(name, snapshot_dir=None, keep=2):
+    """
+    deletes all but the most recent snapshot versions of a data set
+    :param name: name of the data set
+    :param snapshot_dir: snapshot directory, defaults to SNAPSHOT_DIR
+    :param keep: number of versions to keep, the current version is always kept
+    """
+    path = get_snapshot_path(name, snapshot_dir)
+    current = get_snapshot_version(name, snapshot_dir)
+    versions = sorted(entry for entry in os.listdir(path) if os.path.isdir(os.path.join(path, entry)))
+    for version in versions[:-keep]:
+        if version != current:
+            shutil.rmtree(os.path.join(path, version), ignore_errors=True)
+
+
+def load_snapshot(name, snapshot_dir=None, categorical=False, version=None):
+    """
+    loads a snapshot of a data set, the column files are memory mapped
+    :param name: name of the data set
+    :param snapshot_dir: snapshot directory, defaults to SNAPSHOT_DIR
+    :param categorical: return dictionary encoded columns as pandas categoricals instead of object columns
+    :param version: snapshot version to load, defaults to the current version
+    :return: raw dataframe of the data set, None if there is no snapshot
+    """
+    meta = get_snapshot_meta(name, snapshot_dir, version)
+    if meta is None:
+        return None
+    version_path = os.path.join(get_snapshot_path(name, snapshot_dir), meta['version'])
+    data = {}
+    for i, column in enumerate(meta['columns']):
+        if column['encoding'] == 'plain':
+            data[column['name']] = np.load(os.path.join(version_path, '%d.npy' % i), mmap_mode='r')
+        else:
+            codes = np.load(os.path.join(version_path, '%d.codes.npy' % i), mmap_mode='r')
+            uniques = np.load(os.path.join(version_path, '%d.uniques.npy' % i))
+            values = pd.Categorical.from_codes(codes, uniques)
+            data[column['name']] = values if categorical else np.asarray(values, dtype=object)
+    return pd.DataFrame(data, columns=[column['name'] for column in meta['columns']])
+
+
+def append_frame(df, df_new):
+    """
+    appends rows to a table, categorical columns stay categorical (the categories of the new rows are added after the
+    existing ones) so the existing rows are never converted to object strings
+    :param df: dataframe, categorical text columns
+    :param df_new: dataframe of the rows to append
+    :return: new dataframe
+    """
+    if list(df.columns) != list(df_new.columns):
+        return pd.concat([df, df_new], ignore_index=True)
+    data = {}
+    for column in df.columns:
+        values, new_values = df[column].values, df_new[column].values
+        if isinstance(values, pd.Categorical):
+            data[column] = union_categoricals([values, pd.Categorical(new_values)])
+        else:
+            data[column] = np.concatenate([values, np.asarray(new_values)])
+    return pd.DataFrame(data, columns=df.columns)
+
+
+def refresh_snapshot(name, source=None, snapshot_dir=None):
+    """
+    reads a data set from the data source and stores it as the current snapshot
+    :param name: name of the data set
+    :param source: base url or local directory, defaults to DATA_SOURCE
+    :param snapshot_dir: snapshot directory, defaults to SNAPSHOT_DIR
+    :return: raw dataframe of the data set and version of the new snapshot
+    """
+    content, validators, _ = fetch_payload(name, source)
+    df = parse_payload(name, content)
+    return df, save_snapshot(name, df, source, snapshot_dir, get_payload_info(name, content, validators))
+
+
+def fetch_snapshots(names=None, source=None, snapshot_dir=None):
+    """
+    refreshes the snapshots of data sets concurrently, each data set is fetched, parsed and stored in a worker thread
+    so that payloads are parsed while the others are still downloading. A data set already being fetched by this
+    process is not fetched again, its fetch in progress is returned
+    :param names: names of the data sets, defaults to all data sets
+    :param source: base url or local directory, defaults to DATA_SOURCE
+    :param snapshot_dir: snapshot directory, defaults to SNAPSHOT_DIR
+    :return: dictionary to map the names to futures of the raw dataframe and the version of the new snapshot
+    """
+    global fetch_executor
+    futures = {}
+    with fetch_lock:
+        if fetch_executor is None:
+            fetch_executor = ThreadPoolExecutor(len(DATASET_PATHS), thread_name_prefix='levitt-fetch')
+        for name in names or list(DATASET_PATHS):
+            key = (snapshot_dir or SNAPSHOT_DIR, name)
+            future = pending_fetches.get(key)
+            if future is None:
+                future = fetch_executor.submit(refresh_snapshot, name, source, snapshot_dir)
+                pending_fetches[key] = future
+                # failed fetches are forgotten as well, the next caller tries again
+                future.add_done_callback(lambda done, key=key: pending_fetches.pop(key, None))
+            futures[name] = future
+    return futures
+
+
+def update_snapshot(name, source=None, snapshot_dir=None):
+    """
+    conditionally fetches a data set and stores a new snapshot if it changed. For csv data sets only the bytes after
+    the last known row are requested, if the data was appended to only the new rows are parsed and added to the
+    current snapshot, any other change replaces the snapshot
+    :param name: name of the data set
+    :param source: base url or local directory, defaults to DATA_SOURCE
+    :param snapshot_dir: snapshot directory, defaults to SNAPSHOT_DIR
+    :return: None if the data set did not change, otherwise version of the new snapshot and dataframe of the appended
+    rows (None if the snapshot was replaced)
+    """
+    meta = get_snapshot_meta(name, snapshot_dir)
+    if meta is None:
+        return refresh_snapshot(name, source, snapshot_dir)[1], None
+    payload = meta.get('payload', {})
+    tail = payload.get('tail', '').encode('latin-1')
+    # the last known row is requested again to check that the data was only appended to
+    offset = payload['size'] - len(tail) if tail else 0
+    content, validators, partial = fetch_payload(name, source, payload.get('validators'), offset)
+    if content is None:
+        return None
+    if partial and content.startswith(tail):
+        new_content = content[len(tail):]
+        if not new_content.strip():
+            # nothing was appended, keep the snapshot but remember the new validators
+            meta['payload']['validators'] = validators
+            write_snapshot_meta(name, meta, snapshot_dir)
+            return None
+        df_new = parse_payload(name, payload['header'].encode('latin-1') + new_content)
+        df = append_frame(load_snapshot(name, snapshot_dir, categorical=True, version=meta['version']), df_new)
+        payload = {'validators': validators, 'size': offset + len(content), 'header': payload['header'],
+                   'tail': content.splitlines(True)[-1].decode('latin-1')}
+        return save_snapshot(name, df, source, snapshot_dir, payload), df_new
+    if partial:
+        content, validators, _ = fetch_payload(name, source)
+    df = parse_payload(name, content)
+    return save_snapshot(name, df, source, snapshot_dir, get_payload_info(name, content, validators)), None
+
+
+def get_dataset_frame(name, source=None, snapshot_dir=None, categorical=False):
+    """
+    raw table of a data set, taken from the current snapshot, the data source is only read if there is no snapshot
+    :param name: name of the data set
+    :param source: base url or local directory, defaults to DATA_SOURCE
+    :param snapshot_dir: snapshot directory, defaults to SNAPSHOT_DIR
+    :param categorical: return dictionary encoded snapshot columns as pandas categoricals
+    :return: raw dataframe of the data set
+    """
+    version = get_snapshot_version(name, snapshot_dir)
+    if version is None:
+        # the other data sets without a snapshot are fetched at the same time, the dashboard needs all of them
+        missing = [other for other in DATASET_PATHS
+                   if other == name or get_snapshot_version(other, snapshot_dir) is None]
+        df, version = fetch_snapshots(missing, source, snapshot_dir)[name].result()
+    else:
+        df = load_snapshot(name, snapshot_dir, categorical, version)
+    loaded_versions[name] = version
+    return df
+
+
+def get_data_version(*names):
+    """
+    version of the data loaded by this process, changes whenever a new snapshot of one of the data sets is loaded
+    :param names: names of the data sets, all loaded data sets if none given
+    :return: version string
+    """
+    return '-'.join(str(loaded_versions.get(name)) for name in (names or sorted(loaded_versions)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage local snapshots of the Levitt's measure data sets")
+    subparsers = parser.add_subparsers(dest='command')
+    refresh_parser = subparsers.add_parser('refresh', help='read the data sets from the source and store snapshots')
+    refresh_parser.add_argument('names', nargs='*', help='data sets to refresh (%s), all if none given' %
+                                                          ', '.join(DATASET_PATHS))
+    refresh_parser.add_argument('--source', default=DATA_SOURCE, help='base url or local directory')
+    refresh_parser.add_argument('--snapshot-dir', default=SNAPSHOT_DIR, help='snapshot directory')
+    args = parser.parse_args(argv)
+    if args.command != 'refresh':
+        parser.print_help()
+        return 1
+    unknown = set(args.names) - set(DATASET_PATHS)
+    if unknown:
+        parser.error('unknown data sets: %s' % ', '.join(sorted(unknown)))
+    futures = fetch_snapshots(args.names, args.source, args.snapshot_dir)
+    names = {future: name for name, future in futures.items()}
+    for future in as_completed(names):
+        df, version = future.result()
+        print("%s: %d rows, version %s" % (names[future], len(df), version))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
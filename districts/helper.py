@@ -1,28 +1,212 @@
+import threading
+from collections import namedtuple
+
+import numpy as np
 import pandas as pd
 
-# get data from csv and store it in a dataframe
-df_all_districts = pd.read_csv('https://api.covid19india.org/csv/latest/districts.csv')
+from data_source import get_dataset_frame, load_snapshot, loaded_versions, get_count_values
+from metrics import timed
+from shared_tables import load_shared
+
+# columns of the districts data containing counts of cases
+count_columns = ['Confirmed', 'Recovered', 'Deceased']
+
+# normalized data of all districts: snapshot version, normalized dataframe, district names, group offsets and
+# dictionary to map district names to their position in the group offsets
+DistrictData = namedtuple('DistrictData', ['version', 'df', 'names', 'offsets', 'code_dict'])
+
+
+def parse_dates(values):
+    """
+    parses dates, each distinct date string is parsed only once
+    :param values: array like of date strings
+    :return: datetime64 array
+    """
+    codes, uniques = pd.factorize(values)
+    dates = pd.to_datetime(np.asarray(uniques, dtype=object), format='%Y-%m-%d').values
+    return np.where(codes >= 0, dates.take(codes), np.datetime64('NaT'))
+
+
+def build_district_table(df):
+    """
+    normalizes the districts data once: dates parsed, counts converted to int32 (float64 if values are missing),
+    District stored as categorical, rows grouped by district (keeping the original order within a district) and Active
+    and New cases computed for all districts at once
+    :param df: raw dataframe of the districts data
+    :return: normalized dataframe, district names in order of first appearance, and group offsets such that the rows
+    of the i-th district are offsets[i]:offsets[i + 1]
+    """
+    codes, names = pd.factorize(df['District'])
+    names = np.asarray(names, dtype=object)
+    # stable sort to group rows by district, rows without district name are dropped
+    order = np.argsort(codes, kind='mergesort')
+    order = order[codes[order] >= 0]
+    codes = codes[order]
+    counts = np.bincount(codes, minlength=len(names))
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    data = {}
+    for column in df.columns:
+        if column == 'District':
+            data[column] = pd.Categorical.from_codes(codes, names)
+        elif column == 'Date':
+            data[column] = parse_dates(df[column])[order]
+        elif column in count_columns:
+            data[column] = get_count_values(pd.to_numeric(df[column]).values[order])
+        else:
+            data[column] = df[column].values[order]
+    df_districts = pd.DataFrame(data, columns=df.columns)
+    confirmed = df_districts['Confirmed'].values
+    df_districts['Active'] = confirmed - (df_districts['Recovered'].values + df_districts['Deceased'].values)
+    # daily new cases, the first day of each district has its cumulative count as new cases
+    new = np.full(len(confirmed), np.nan)
+    new[1:] = confirmed[1:] - confirmed[:-1]
+    new[offsets[:-1][counts > 0]] = np.nan
+    missing = np.isnan(new)
+    new[missing] = confirmed[missing]
+    df_districts['New'] = new.astype(confirmed.dtype) if confirmed.dtype.kind in 'iu' else new
+    return df_districts, list(names), offsets
+
+
+def build_district_data(df, version):
+    """
+    normalizes and indexes the districts data
+    :param df: raw dataframe of the districts data
+    :param version: snapshot version of the data
+    :return: DistrictData
+    """
+    df_districts, names, offsets = build_district_table(df)
+    return DistrictData(version, df_districts, names, offsets, {district: i for i, district in enumerate(names)})
+
+
+def read_district_data(version=None):
+    """
+    loads a snapshot of the districts data and normalizes it
+    :param version: snapshot version to load, defaults to the current snapshot (fetched from the data source if there
+    is none)
+    :return: DistrictData of the snapshot
+    """
+    if version is None:
+        df = get_dataset_frame('districts', categorical=True)
+        version = loaded_versions['districts']
+    else:
+        df = load_snapshot('districts', categorical=True, version=version)
+    return build_district_data(df, version)
+
+
+def get_district_table(data):
+    """
+    arrays and dataframe of the districts data stored in its shared table
+    :param data: DistrictData
+    :return: dictionary of arrays (district names and group offsets) and dictionary of dataframes
+    """
+    return {'names': np.array(data.names, dtype=str), 'offsets': data.offsets}, {'df': data.df}
+
+
+def get_table_district_data(version, arrays, frames):
+    """
+    districts data of a shared table
+    :param version: snapshot version of the table
+    :param arrays: dictionary of arrays of the table
+    :param frames: dictionary of dataframes of the table
+    :return: DistrictData
+    """
+    names = arrays['names'].tolist()
+    return DistrictData(version, frames['df'], names, arrays['offsets'],
+                        {district: i for i, district in enumerate(names)})
+
 
+def load_district_data(version=None, build=read_district_data, shared=None):
+    """
+    districts data of a snapshot, built in the process or attached from the shared table (see shared_tables.py)
+    :param version: snapshot version to load, defaults to the current snapshot
+    :param build: function building the DistrictData of a snapshot version if it is not shared yet
+    :param shared: whether the data is shared through a table, defaults to LEVITT_SHARED_TABLES
+    :return: DistrictData of the snapshot
+    """
+    return load_shared('districts', version, build, get_district_table, get_table_district_data, shared)
+
+
+# districts left out of the dropdown menu
+excluded_districts = ["Unknown", "Others"]
+
+# normalized data of the loaded snapshot, loaded on first use
+district_data = None
+
+# guards the loading of the districts data
+load_lock = threading.Lock()
+
+
+def set_district_data(data):
+    """
+    swaps in new districts data
+    :param data: DistrictData
+    """
+    global district_data
+    district_data = data
+
+
+def get_district_data():
+    """
+    districts data currently in use, callbacks take it once so that they work on one consistent version
+    :return: DistrictData of the current snapshot version
+    """
+    if district_data is None:
+        with load_lock, timed('load_districts'):
+            if district_data is None:
+                set_district_data(load_district_data())
+    return district_data
 
-def get_district_df(district):
+
+def update_district_data(version, df_new=None):
+    """
+    swaps in a new snapshot version of the districts data, rows appended to the previous version are merged into the
+    normalized data without reading the snapshot again
+    :param version: snapshot version
+    :param df_new: raw dataframe of the rows appended to the previous version, None to load the snapshot completely
+    """
+    with load_lock, timed('update_districts'):
+        if df_new is None or district_data is None or not set(df_new.columns) <= set(district_data.df.columns):
+            set_district_data(load_district_data(version))
+        else:
+            df_old, df_new = district_data.df, df_new.assign(Date=parse_dates(df_new['Date']))
+            # merged only if no other process has shared the new version yet
+            set_district_data(load_district_data(version, lambda version: build_district_data(
+                pd.concat([df_old[df_new.columns], df_new], ignore_index=True), version)))
+
+
+def get_districts(data=None):
+    """
+    names of the districts of the dropdown menu
+    :param data: DistrictData to use, defaults to the data currently in use
+    :return: list of district names
+    """
+    data = data or get_district_data()
+    return [district for district in data.names if district not in excluded_districts]
+
+
+def get_district_options(data=None):
     """
-    creates dataframe for a district containing required parameters
+    options of the dropdown menu of districts
+    :param data: DistrictData to use, defaults to the data currently in use
+    :return: list of label and value (both district name) dictionaries
+    """
+    return [{'label': district, 'value': district} for district in get_districts(data)]
+
+
+def get_district_df(district, data=None):
+    """
+    creates dataframe for a district containing required parameters, the dataframe is a view on the normalized
+    districts data
     :param district: District name
+    :param data: DistrictData to use, defaults to the data currently in use
     :return: structured dataframe for a district
     """
-    df_district = df_all_districts[df_all_districts['District'] == district]
-    df_district['Confirmed'] = pd.to_numeric(df_district['Confirmed'])
-    df_district['Recovered'] = pd.to_numeric(df_district['Recovered'])
-    df_district['Deceased'] = pd.to_numeric(df_district['Deceased'])
-    df_district['Active'] = df_district['Confirmed'] - (df_district['Recovered'] + df_district['Deceased'])
-    df_district = df_district.assign(New=df_district['Confirmed'].diff().fillna(df_district['Confirmed']).values)
-    df_district['New'] = pd.to_numeric(df_district['New'])
-    df_district['Date'] = pd.to_datetime(df_district['Date'])
-    df_district = df_district[1:-1]
-    df_district = df_district.reset_index(drop=True)
+    data = data or get_district_data()
+    i = data.code_dict.get(district)
+    if i is None:
+        return data.df.iloc[0:0]
+    # first and last day of each district are left out
+    df_district = data.df.iloc[data.offsets[i] + 1:data.offsets[i + 1] - 1]
+    df_district.index = pd.RangeIndex(len(df_district))
     return df_district
 
-
-districts = list(df_all_districts['District'].unique())
-districts.remove("Unknown")
-districts.remove("Others")
@@ -0,0 +1,314 @@
+"""
+Bulk export of the Levitt's measure data of any set of regions, for analysis outside the dashboard:
+- series: one row per region and day with cumulative confirmed and active cases, H(t) and the value of the regression
+  line fitted on the exported days,
+- forecasts: one row per region with the regression line, R-squared and the date H(t) reaches 1.0001 (see forecast.py),
+as csv, Parquet or Arrow IPC (Parquet and Arrow need pyarrow). Regions are computed and written in chunks, so the
+memory does not grow with the number of regions. Exports are written once per data version to the export directory
+and served from there, with an ETag (a repeated pull with If-None-Match gets 304) and byte ranges (an interrupted
+pull resumes with Range).
+
+Enabled on the dashboard server with LEVITT_EXPORT=1 (see config.py):
+    /export/series.csv?kind=states&regions=mh,dl&start=2020-06-01&end=2020-10-01
+    /export/forecasts.parquet?kind=districts
+and from the command line:
+    python export.py series --kind states [--regions mh dl] [--start YYYY-MM-DD] [--end YYYY-MM-DD] --output out.csv
+"""
+import os
+import sys
+import hashlib
+import argparse
+import tempfile
+import datetime as dt
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    # only csv exports
+    pyarrow = None
+
+from config import SNAPSHOT_DIR, FIT_METHOD
+
+# directory in which the exports are written
+EXPORT_DIR = os.environ.get('LEVITT_EXPORT_DIR', os.path.join(SNAPSHOT_DIR, 'exports'))
+
+# number of export files kept in the export directory, the least recently written are deleted
+EXPORT_KEEP = int(os.environ.get('LEVITT_EXPORT_KEEP', 64))
+
+# number of regions computed and written at once
+EXPORT_CHUNK_REGIONS = int(os.environ.get('LEVITT_EXPORT_CHUNK_REGIONS', 100))
+
+# version of the layout of the exports, part of their ETag
+EXPORT_FORMAT = 1
+
+# kinds of exports
+export_kinds = ['series', 'forecasts']
+
+# kinds of regions
+region_kinds = ['india', 'states', 'districts']
+
+# dictionary to map export formats to their mime type
+export_mimetypes = {'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet',
+                    'arrow': 'application/vnd.apache.arrow.file'}
+
+# columns of the series export
+series_columns = ['region_kind', 'region_id', 'date', 'cum_confirmed', 'active', 'levitt_measure', 'fitted']
+
+
+def get_chunk(export_kind, region_kind, region_ids, data, start_date=None, end_date=None):
+    """
+    series or forecasts of a chunk of regions, all regions are fitted at once on their days after the start date up
+    to the end date
+    :param export_kind: series or forecasts
+    :param region_kind: india, states or districts
+    :param region_ids: ids of the regions
+    :param data: data of the kind of regions
+    :param start_date: the days after this date are exported, all days if None
+    :param end_date: last day exported, all days if None
+    :return: series dataframe or forecast dataframe
+    """
+    import numpy as np
+    import pandas as pd
+    from forecast import get_forecast_table
+    from levitt import fit_levitt_stacked
+    from precompute import get_region_args
+
+    names, frames = [], []
+    for region_id in region_ids:
+        region_name, get_df, _, active_column = get_region_args(region_kind, region_id, data)
+        df = get_df()
+        dates = df['date'].values
+        selected = np.ones(len(df), dtype=bool)
+        if start_date is not None:
+            selected &= dates > np.datetime64(start_date)
+        if end_date is not None:
+            selected &= dates <= np.datetime64(end_date)
+        names.append(region_name)
+        frames.append(pd.DataFrame({'date': dates[selected],
+                                    'cum_confirmed': df['cum_confirmed'].values[selected].astype(np.float64),
+                                    'active': df[active_column].values[selected].astype(np.float64)}))
+    n_days = np.array([len(frame) for frame in frames], dtype=np.int64)
+    cum_confirmed = np.full((len(frames), n_days.max() if len(frames) else 0), np.nan)
+    # the days of the regions, row by row
+    used = np.arange(cum_confirmed.shape[1]) < n_days[:, None]
+    if len(frames):
+        cum_confirmed[used] = np.concatenate([frame['cum_confirmed'].values for frame in frames])
+    if export_kind == 'forecasts':
+        last_dates = [frame['date'].values[-1] if len(frame) else np.datetime64('NaT', 'ns') for frame in frames]
+        return get_forecast_table(region_kind, region_ids, names, cum_confirmed, n_days, last_dates)
+    fit = fit_levitt_stacked(cum_confirmed)
+    fitted = fit.intercept[:, None] + fit.slope[:, None] * fit.day_count
+    return pd.DataFrame({
+        'region_kind': region_kind,
+        'region_id': np.repeat(np.asarray(region_ids, dtype=object), n_days),
+        'date': np.concatenate([frame['date'].values for frame in frames]).astype('datetime64[ns]')
+        if len(frames) else np.array([], dtype='datetime64[ns]'),
+        'cum_confirmed': cum_confirmed[used],
+        'active': np.concatenate([frame['active'].values for frame in frames]) if len(frames) else [],
+        'levitt_measure': fit.levitt_measure[used],
+        'fitted': fitted[used],
+    }, columns=series_columns)
+
+
+def iter_export(export_kind, region_kind, region_ids=None, start_date=None, end_date=None, data=None,
+                chunk_regions=None):
+    """
+    dataframes of an export, one per chunk of regions
+    :param export_kind: series or forecasts
+    :param region_kind: india, states or districts
+    :param region_ids: ids of the regions, defaults to all regions of the kind
+    :param start_date: the days after this date are exported, all days if None
+    :param end_date: last day exported, all days if None
+    :param data: data of the kind of regions, defaults to the data currently in use
+    :param chunk_regions: number of regions per chunk, defaults to EXPORT_CHUNK_REGIONS
+    :return: iterator of dataframes, at least one (possibly empty) dataframe
+    """
+    from precompute import get_data, get_region_ids
+    data = data or get_data(region_kind)
+    all_region_ids = get_region_ids(region_kind, data)
+    if region_ids is None:
+        region_ids = all_region_ids
+    else:
+        region_ids = list(region_ids)
+        unknown = set(region_ids) - set(all_region_ids)
+        if unknown:
+            raise ValueError("unknown %s: %s" % (region_kind, ', '.join(sorted(unknown))))
+    chunk_regions = chunk_regions or EXPORT_CHUNK_REGIONS
+    for i in range(0, max(len(region_ids), 1), chunk_regions):
+        yield get_chunk(export_kind, region_kind, region_ids[i:i + chunk_regions], data, start_date, end_date)
+
+
+def write_export(chunks, export_format, path):
+    """
+    writes the dataframes of an export to a file chunk by chunk: csv rows are appended, each chunk is a row group of a
+    Parquet file or a record batch of an Arrow IPC file
+    :param chunks: iterator of dataframes with the same columns and types
+    :param export_format: csv, parquet or arrow
+    :param path: path of the file
+    """
+    if export_format == 'csv':
+        with open(path, 'w', newline='') as f:
+            for i, df in enumerate(chunks):
+                df.to_csv(f, header=i == 0, index=False)
+        return
+    if pyarrow is None:
+        raise ValueError("%s exports need pyarrow" % export_format)
+    writer = schema = None
+    try:
+        for df in chunks:
+            table = pyarrow.Table.from_pandas(df, preserve_index=False)
+            if writer is None:
+                # the schema of the first chunk is used for all chunks
+                schema = table.schema
+                if export_format == 'parquet':
+                    writer = pyarrow.parquet.ParquetWriter(path, schema)
+                else:
+                    writer = pyarrow.ipc.new_file(path, schema)
+            else:
+                table = table.cast(schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def get_export_etag(export_kind, region_kind, region_ids, start_date, end_date, export_format, version):
+    """
+    entity tag of an export, changes with the data version and the fit settings
+    :param export_kind: series or forecasts
+    :param region_kind: india, states or districts
+    :param region_ids: ids of the regions, None for all regions of the kind
+    :param start_date: start date of the export
+    :param end_date: end date of the export
+    :param export_format: csv, parquet or arrow
+    :param version: snapshot version of the data of the regions
+    :return: hex string
+    """
+    key = '|'.join(str(part) for part in (EXPORT_FORMAT, export_kind, region_kind, ','.join(region_ids or []),
+                                         start_date, end_date, export_format, version, FIT_METHOD))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def get_export_file(export_kind, region_kind, region_ids=None, start_date=None, end_date=None, export_format='csv',
+                    export_dir=None):
+    """
+    file of an export, written to the export directory unless it exists already for the current data version
+    :param export_kind: series or forecasts
+    :param region_kind: india, states or districts
+    :param region_ids: ids of the regions, defaults to all regions of the kind
+    :param start_date: the days after this date are exported, all days if None
+    :param end_date: last day exported, all days if None
+    :param export_format: csv, parquet or arrow
+    :param export_dir: export directory, defaults to EXPORT_DIR
+    :return: path of the file and its entity tag
+    """
+    from precompute import get_data
+    data = get_data(region_kind)
+    etag = get_export_etag(export_kind, region_kind, region_ids, start_date, end_date, export_format, data.version)
+    export_dir = export_dir or EXPORT_DIR
+    path = os.path.join(export_dir, '%s.%s' % (etag, export_format))
+    if not os.path.exists(path):
+        os.makedirs(export_dir, exist_ok=True)
+        # each writer, process or thread, writes its own file, the first complete one is kept
+        fd, tmp_path = tempfile.mkstemp(dir=export_dir, prefix=etag + '.', suffix='.tmp')
+        os.close(fd)
+        try:
+            write_export(iter_export(export_kind, region_kind, region_ids, start_date, end_date, data),
+                         export_format, tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        remove_old_exports(export_dir)
+    return path, etag
+
+
+def remove_old_exports(export_dir=None, keep=None):
+    """
+    deletes all but the most recently written exports
+    :param export_dir: export directory, defaults to EXPORT_DIR
+    :param keep: number of exports to keep, defaults to EXPORT_KEEP
+    """
+    export_dir = export_dir or EXPORT_DIR
+    paths = [os.path.join(export_dir, entry) for entry in os.listdir(export_dir) if not entry.endswith('.tmp')]
+    paths.sort(key=lambda path: os.path.getmtime(path))
+    for path in paths[:-(keep or EXPORT_KEEP)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def parse_date(value):
+    """
+    parses a date argument
+    :param value: date as YYYY-MM-DD, or empty
+    :return: datetime, None for an empty value
+    """
+    return dt.datetime.strptime(value, "%Y-%m-%d") if value else None
+
+
+def register_export_routes(server):
+    """
+    adds the export routes to a flask server: /export/<series|forecasts>.<csv|parquet|arrow> with the query arguments
+    kind (india, states or districts, default india), regions (comma separated ids, default all), start and end
+    (YYYY-MM-DD)
+    :param server: flask server of the dashboard
+    """
+    from flask import Response, abort, request
+    from werkzeug.wsgi import wrap_file
+
+    @server.route('/export/<export_kind>.<export_format>')
+    def export(export_kind, export_format):
+        if export_kind not in export_kinds or export_format not in export_mimetypes:
+            abort(404)
+        if export_format != 'csv' and pyarrow is None:
+            abort(501, description="%s exports need pyarrow" % export_format)
+        region_kind = request.args.get('kind', 'india')
+        if region_kind not in region_kinds:
+            abort(400, description="kind must be one of %s" % ', '.join(region_kinds))
+        try:
+            start_date, end_date = parse_date(request.args.get('start')), parse_date(request.args.get('end'))
+        except ValueError:
+            abort(400, description="start and end must be dates as YYYY-MM-DD")
+        regions = request.args.get('regions')
+        region_ids = regions.split(',') if regions else None
+        try:
+            path, etag = get_export_file(export_kind, region_kind, region_ids, start_date, end_date, export_format)
+        except ValueError as e:
+            abort(400, description=str(e))
+        response = Response(wrap_file(request.environ, open(path, 'rb')), mimetype=export_mimetypes[export_format],
+                            direct_passthrough=True)
+        response.headers['Content-Disposition'] = 'attachment; filename=%s_%s.%s' % (export_kind, region_kind,
+                                                                                    export_format)
+        response.content_length = os.path.getsize(path)
+        response.set_etag(etag)
+        response.headers['Accept-Ranges'] = 'bytes'
+        return response.make_conditional(request, accept_ranges=True, complete_length=response.content_length)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export Levitt's measure series and forecasts of regions")
+    parser.add_argument('export_kind', choices=export_kinds, help='kind of export')
+    parser.add_argument('--kind', choices=region_kinds, default='india', help='kind of regions')
+    parser.add_argument('--regions', nargs='+', help='ids of the regions (state codes, district names), default all')
+    parser.add_argument('--start', type=parse_date, help='export the days after this date (YYYY-MM-DD)')
+    parser.add_argument('--end', type=parse_date, help='last day exported (YYYY-MM-DD)')
+    parser.add_argument('--output', required=True, help='output file, .csv, .parquet or .arrow')
+    args = parser.parse_args(argv)
+    export_format = os.path.splitext(args.output)[1].lstrip('.')
+    if export_format not in export_mimetypes:
+        parser.error("the output must end with .csv, .parquet or .arrow")
+    try:
+        write_export(iter_export(args.export_kind, args.kind, args.regions, args.start, args.end), export_format,
+                     args.output)
+    except ValueError as e:
+        parser.error(str(e))
+    print("%s of %s written to %s" % (args.export_kind, args.kind, args.output))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Figure dicts of the three graphs of a region, the callbacks serialize them with the plotly json encoder.
+"""
+
+
+def get_figure(x_values, y_values, title, label_x, label_y):
+    """
+    creates a figure with the passed parameters
+    :param x_values: x axis values
+    :param y_values: y axis values
+    :param title: title of the graph
+    :param label_x: x axis label
+    :param label_y: y axis label
+    :return: figure dict created with the passed parameters
+    """
+    return {
+        'data': [
+            {'x': x_values, 'y': y_values, 'mode': 'lines+markers'},
+        ],
+        'layout': {
+            'title': title,
+            'xaxis': {
+                'title': label_x
+            },
+            'yaxis': {
+                'title': label_y
+            }
+        }
+    }
+
+
+def get_figure_with_regression_line(x1_values, y1_values, x2_values, y2_values, r_squared, title):
+    """
+    creates two plots on the same figure (Regression line plot and scatter plot of daily Levitt's Measure H(t)) with
+    the passed parameters
+    :param x1_values: x axis values for the first plot (scatter plot of daily H(t))
+    :param y1_values: y axis values for the first plot
+    :param x2_values: x axis values for the second plot (regression line plot)
+    :param y2_values: y axis values for the second plot
+    :param r_squared: r-squared value of regression line
+    :param title: title of the graph
+    :return: figure dict with two plots (Regression line plot and scatter plot of daily H(t))
+    """
+    return {
+        'data': [
+            {'x': x1_values, 'y': y1_values, 'mode': 'markers', 'name': 'H(t)'},
+            {'x': x2_values, 'y': y2_values, 'mode': 'line',
+             'name': "Regression Line<br> R² = " + str(r_squared)},
+        ],
+        'layout': {
+            'title': title,
+            'xaxis': {
+                'title': "Date",
+            },
+            'yaxis': {
+                'title': "Levitt's Measure H(t)"
+            }
+        }
+    }
+
+
+def get_daily_figures(df_daily, region_name, new_column, active_column):
+    """
+    creates the figures of the daily new cases graph and the daily active cases graph of a region, which do not depend
+    on the start date of the regression line
+    :param df_daily: dataframe of the region
+    :param region_name: name of the region used in the graph titles
+    :param new_column: column of the dataframe containing daily new cases
+    :param active_column: column of the dataframe containing daily active cases
+    :return: list of two figure dicts
+    """
+    return [
+        get_figure(df_daily['date'], df_daily[new_column], "Daily New Cases " + region_name, "Date", "New Cases"),
+        get_figure(df_daily['date'], df_daily[active_column], "Daily Active Cases " + region_name, "Date",
+                   "Active Cases"),
+    ]
+
+
+def get_series_data(df_daily, region_name):
+    """
+    data the browser fits the regression line on in the clientside mode (see assets/levitt.js): name of the region,
+    dates and cumulative confirmed cases of the whole series
+    :param df_daily: dataframe of the region with date and cum_confirmed columns
+    :param region_name: name of the region used in the graph title
+    :return: dictionary
+    """
+    import numpy as np
+    dates = np.asarray(df_daily['date'].values, dtype='datetime64[D]')
+    return {'name': region_name, 'dates': np.datetime_as_string(dates, unit='D').tolist(),
+            'cum_confirmed': df_daily['cum_confirmed'].values}
+
+
+def get_region_figures(df_daily, fit_data, region_name, new_column, active_column, compact=False, max_points=None):
+    """
+    creates the figures of the three graphs of a region: daily Levitt's measure graph with fitted regression line,
+    daily new cases graph, daily active cases graph
+    :param df_daily: dataframe of the region
+    :param fit_data: result of get_data_for_graph_with_regression_line for the region
+    :param region_name: name of the region used in the graph titles
+    :param new_column: column of the dataframe containing daily new cases
+    :param active_column: column of the dataframe containing daily active cases
+    :param compact: make the figures compact (see compact_figures.py)
+    :param max_points: maximum number of points of a trace in compact mode, defaults to FIGURE_MAX_POINTS
+    :return: list of three figure dicts
+    """
+    df_levitt, dates, model, line, r_squared = fit_data
+    if compact:
+        from compact_figures import get_line_dates
+        line_dates = get_line_dates(df_levitt['date'].values, dates)
+    else:
+        line_dates = list(df_levitt['date']) + dates
+    figures = [
+        get_figure_with_regression_line(df_levitt['date'], df_levitt['LevittMeasure'], line_dates, model(line),
+                                        r_squared, "Daily Levitt's Measure H(t) " + region_name),
+    ] + get_daily_figures(df_daily, region_name, new_column, active_column)
+    if compact:
+        from compact_figures import compact_figure
+        figures = [compact_figure(figure, max_points) for figure in figures]
+    return figures
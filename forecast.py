@@ -0,0 +1,228 @@
+"""
+Batch Levitt's measure forecast for India, every state of state_code_dict and every district of the dropdown.
+
+All regions of a kind are fitted in one vectorized pass (fit_levitt_stacked on a NaN padded regions x days array), the
+result is a single table with slope, intercept, r squared value, the date H(t) reaches 1.0001 and whether the line is
+extrapolated (same rule as the dashboard) for each region.
+
+With --drift the predicted end date of one region is instead tabulated for every day after the start date, fitted on
+the days up to it (or on a rolling window of days), to show how the prediction moved as data came in.
+
+Run from the repository root:
+    python forecast.py [--start-date YYYY-MM-DD] [--output forecasts.csv]
+    python forecast.py --drift states mh [--window 21] [--output drift.csv]
+"""
+import sys
+import argparse
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+from levitt import fit_levitt_stacked, get_end_date_drift
+from precompute import get_default_start_date
+from india.helper import get_in_data
+from states.helper import get_state_data, get_state_df, state_code_dict, state_code_index
+from districts.helper import get_district_data, get_district_df, get_districts
+
+# kinds of regions, in the order they appear in the forecast table
+region_kinds = ['india', 'states', 'districts']
+
+# number of districts fitted together, bounds the size of the padded array
+DISTRICT_CHUNK_SIZE = 2048
+
+
+def get_forecast_table(region_kind, region_ids, region_names, cum_confirmed, n_days, last_dates):
+    """
+    fits all regions of a kind and tabulates the results
+    :param region_kind: kind of the regions, india, states or districts
+    :param region_ids: ids of the regions
+    :param region_names: names of the regions
+    :param cum_confirmed: 2-D array (regions x days) of cumulative confirmed cases after the start date, NaN padded
+    :param n_days: number of days of each region after the start date
+    :param last_dates: last date of each region
+    :return: dataframe with one row per region
+    """
+    fit = fit_levitt_stacked(cum_confirmed)
+    last_dates = pd.to_datetime(np.asarray(last_dates, dtype='datetime64[ns]'))
+    # the regression line is extrapolated till the crossing day, counted from the first day after the start date
+    crossing_dates = last_dates + pd.to_timedelta(fit.crossing_day - np.asarray(n_days), unit='D')
+    return pd.DataFrame({
+        'region_kind': region_kind,
+        'region_id': list(region_ids),
+        'region_name': list(region_names),
+        'n_days': np.asarray(n_days),
+        'n_points': fit.n_points,
+        'slope': fit.slope,
+        'intercept': fit.intercept,
+        'r_squared': fit.r_squared,
+        'required_day': fit.required_day,
+        'extrapolate': fit.extrapolate,
+        'crossing_day': fit.crossing_day,
+        'last_date': last_dates,
+        'crossing_date': crossing_dates.where(fit.extrapolate),
+    })
+
+
+def forecast_india(start_date, data=None):
+    """
+    forecast for India
+    :param start_date: date from which data is to be considered
+    :param data: InData to use, defaults to the data currently in use
+    :return: forecast dataframe
+    """
+    df = (data or get_in_data()).df
+    df = df[df['date'] > start_date]
+    return get_forecast_table('india', ['in'], ["India"], df['cum_confirmed'].values[None, :], [len(df)],
+                              df['date'].values[-1:] if len(df) else [np.datetime64('NaT', 'ns')])
+
+
+def forecast_states(start_date, state_names=None, data=None):
+    """
+    forecast for states, all states share the dates of the states data
+    :param start_date: date from which data is to be considered
+    :param state_names: names of the states, defaults to all states of state_code_dict
+    :param data: StateData to use, defaults to the data currently in use
+    :return: forecast dataframe
+    """
+    data = data or get_state_data()
+    state_names = list(state_code_dict) if state_names is None else list(state_names)
+    codes = [state_code_dict[state_name] for state_name in state_names]
+    selected = data.dates > np.datetime64(start_date)
+    cum_confirmed = data.cum_confirmed[selected][:, [state_code_index[code] for code in codes]].T
+    last_date = data.dates[selected][-1] if selected.any() else np.datetime64('NaT', 'ns')
+    return get_forecast_table('states', codes, state_names, cum_confirmed, [selected.sum()] * len(codes),
+                              [last_date] * len(codes))
+
+
+def get_district_arrays(data, district_names, start_date):
+    """
+    NaN padded cumulative confirmed cases of districts after the start date, the same rows as get_district_df gives
+    :param data: DistrictData
+    :param district_names: names of the districts
+    :param start_date: date from which data is to be considered
+    :return: 2-D array (districts x days) of cumulative confirmed cases, number of days and last date of each district
+    """
+    counts = np.diff(data.offsets)
+    group = np.repeat(np.arange(len(counts)), counts)
+    position = np.arange(len(group)) - data.offsets[group]
+    # row of each selected district in the result, -1 for the other districts
+    result_row = np.full(len(counts), -1)
+    result_row[[data.code_dict[district] for district in district_names]] = np.arange(len(district_names))
+    dates = data.df['Date'].values
+    # first and last day of each district are left out like in get_district_df
+    idx = np.flatnonzero((result_row[group] >= 0) & (position >= 1) & (position <= counts[group] - 2) &
+                         (dates > np.datetime64(start_date)))
+    rows = result_row[group[idx]]
+    # the table is grouped by district, the kept rows of a district are consecutive in idx
+    day = np.arange(len(idx)) - np.searchsorted(group[idx], group[idx])
+    n_days = np.bincount(rows, minlength=len(district_names))
+    cum_confirmed = np.full((len(district_names), n_days.max() if len(idx) else 0), np.nan)
+    cum_confirmed[rows, day] = data.df['Confirmed'].values[idx]
+    last_dates = np.full(len(district_names), np.datetime64('NaT', 'ns'))
+    is_last = day == n_days[rows] - 1
+    last_dates[rows[is_last]] = dates[idx[is_last]]
+    return cum_confirmed, n_days, last_dates
+
+
+def forecast_districts(start_date, district_names=None, chunk_size=DISTRICT_CHUNK_SIZE, data=None):
+    """
+    forecast for districts, fitted in chunks of districts
+    :param start_date: date from which data is to be considered
+    :param district_names: names of the districts, defaults to all districts of the dropdown
+    :param chunk_size: number of districts fitted together
+    :param data: DistrictData to use, defaults to the data currently in use
+    :return: forecast dataframe
+    """
+    data = data or get_district_data()
+    district_names = get_districts(data) if district_names is None else list(district_names)
+    chunks = [district_names[i:i + chunk_size] for i in range(0, len(district_names), chunk_size)] or [[]]
+    return pd.concat([get_forecast_table('districts', names, names, *get_district_arrays(data, names, start_date))
+                      for names in chunks], ignore_index=True)
+
+
+def forecast_all(start_date=None, kinds=None):
+    """
+    forecast for all regions
+    :param start_date: date from which data is to be considered, defaults to the default start date of the dashboard
+    :param kinds: kinds of regions to forecast, defaults to region_kinds
+    :return: forecast dataframe with one row per region
+    """
+    start_date = start_date or get_default_start_date()
+    forecasts = {'india': forecast_india, 'states': forecast_states, 'districts': forecast_districts}
+    return pd.concat([forecasts[kind](start_date) for kind in (kinds or region_kinds)], ignore_index=True)
+
+
+def get_region_drift(region_kind, region_id, start_date=None, window=None):
+    """
+    drift of the predicted end date of one region (see levitt.get_end_date_drift)
+    :param region_kind: kind of the region, india, states or districts
+    :param region_id: id of the region: in, a state code or a district name
+    :param start_date: date from which data is to be considered, defaults to the default start date of the dashboard
+    :param window: number of days of a rolling window, None for all days after the start date
+    :return: dataframe with one row per day
+    """
+    start_date = start_date or get_default_start_date()
+    if region_kind == 'india':
+        df = get_in_data().df
+    elif region_kind == 'states':
+        df = get_state_df(region_id)
+    else:
+        df = get_district_df(region_id).rename({'Date': 'date', 'Confirmed': 'cum_confirmed'}, axis=1)
+    return get_end_date_drift(df, start_date, window)
+
+
+def is_region(region_kind, region_id):
+    """
+    whether a region exists in the data currently in use
+    :param region_kind: kind of the region, india, states or districts
+    :param region_id: id of the region: in, a state code or a district name
+    :return: bool
+    """
+    if region_kind == 'india':
+        return region_id == 'in'
+    if region_kind == 'states':
+        return region_id in state_code_index
+    return region_id in get_district_data().code_dict
+
+
+def write_table(df, output):
+    """
+    writes a table as csv, or as parquet if the output ends with .parquet (needs pyarrow)
+    :param df: dataframe
+    :param output: output path
+    """
+    if output.endswith('.parquet'):
+        df.to_parquet(output, index=False)
+    else:
+        df.to_csv(output, index=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Levitt's measure forecast for all regions")
+    parser.add_argument('--start-date', type=lambda value: dt.datetime.strptime(value, "%Y-%m-%d"),
+                        default=get_default_start_date(), help='date from which data is considered (YYYY-MM-DD), '
+                                                               'defaults to 40 days before today')
+    parser.add_argument('--kinds', nargs='+', choices=region_kinds, default=region_kinds, help='kinds of regions')
+    parser.add_argument('--output', default='forecasts.csv', help='output file, .csv or .parquet')
+    parser.add_argument('--drift', nargs=2, metavar=('KIND', 'ID'),
+                        help='tabulate the drift of the predicted end date of one region instead, e.g. states mh')
+    parser.add_argument('--window', type=int, help='with --drift, fit rolling windows of that many days')
+    args = parser.parse_args(argv)
+    if args.drift:
+        if args.drift[0] not in region_kinds:
+            parser.error("KIND must be one of %s" % ', '.join(region_kinds))
+        if not is_region(*args.drift):
+            parser.error("unknown region %s of %s" % (args.drift[1], args.drift[0]))
+        df = get_region_drift(args.drift[0], args.drift[1], args.start_date, args.window)
+        write_table(df, args.output)
+        print("%d days, %d extrapolated, written to %s" % (len(df), df['extrapolate'].sum(), args.output))
+        return 0
+    df = forecast_all(args.start_date, args.kinds)
+    write_table(df, args.output)
+    print("%d regions, %d extrapolated, written to %s" % (len(df), df['extrapolate'].sum(), args.output))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
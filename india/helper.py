@@ -1,24 +1,129 @@
-import requests
+import threading
+from collections import namedtuple
+
+import numpy as np
 import pandas as pd
 
-# get data from api and store it in a dataframe
-url = 'https://api.covid19india.org/data.json'
-req = requests.get(url)
-dict_req = req.json()
-df_in_daily = pd.DataFrame(dict_req['cases_time_series'])
+from data_source import get_dataset_frame, load_snapshot, loaded_versions
+from metrics import timed
+from shared_tables import load_shared
+
+# India data in use: snapshot version and structured dataframe
+InData = namedtuple('InData', ['version', 'df'])
+
+# columns of the India time series holding dates, all other columns hold counts
+date_columns = ['date', 'dateymd']
+
+
+def parse_in_dates(df):
+    """
+    parses the dates of the India time series. The dates are given as day and month ("30 January ") starting in
+    2020, the year is incremented whenever the month goes back (December to January). The yyyy-mm-dd dates of newer
+    versions of the api are used when present
+    :param df: raw dataframe of the India time series
+    :return: datetime64 array
+    """
+    if 'dateymd' in df.columns:
+        return pd.to_datetime(df['dateymd'], format='%Y-%m-%d').values
+    day_month = pd.to_datetime(df['date'].astype(str).str.strip() + ' 2020', format='%d %B %Y')
+    months = day_month.dt.month.values
+    years = 2020 + np.concatenate([[0], np.cumsum(months[1:] < months[:-1])])
+    return pd.to_datetime(pd.DataFrame({'year': years, 'month': months, 'day': day_month.dt.day.values})).values
+
+
+def set_read_only(df):
+    """
+    marks the arrays holding the data of a dataframe as read-only, so that views of it cannot modify it. The numpy
+    array of a column without missing values is a view of the array holding the column (and the other columns of its
+    dtype), that array is found as the base of the view
+    :param df: dataframe with numeric and datetime columns
+    :return: the dataframe
+    """
+    for column in df.columns:
+        values = np.asarray(df[column])
+        while isinstance(values.base, np.ndarray):
+            values = values.base
+        values.flags.writeable = False
+    return df
+
+
+def build_in_df(df):
+    """
+    creates dataframe for India containing required parameters, all columns typed
+    :param df: raw dataframe of the India time series
+    :return: structured read-only dataframe for India
+    """
+    data = {'date': parse_in_dates(df)}
+    for column in df.columns:
+        if column not in date_columns:
+            data[column] = pd.to_numeric(df[column]).values
+    df_in = pd.DataFrame(data)
+    df_in['cum_confirmed'] = df_in['dailyconfirmed'].cumsum()
+    df_in['active'] = df_in['cum_confirmed'] - (df_in['dailyrecovered'].cumsum() + df_in['dailydeceased'].cumsum())
+    return set_read_only(df_in)
+
+
+def build_in_data(version=None):
+    """
+    loads a snapshot of the India data and builds its structured dataframe
+    :param version: snapshot version to load, defaults to the current snapshot (fetched from the data source if there
+    is none)
+    :return: InData of the snapshot
+    """
+    if version is None:
+        df_in_daily = get_dataset_frame('india')
+        version = loaded_versions['india']
+    else:
+        df_in_daily = load_snapshot('india', version=version)
+    return InData(version, build_in_df(df_in_daily))
+
+
+def load_in_data(version=None, shared=None):
+    """
+    India data of a snapshot, built in the process or attached from the shared table (see shared_tables.py)
+    :param version: snapshot version to load, defaults to the current snapshot
+    :param shared: whether the data is shared through a table, defaults to LEVITT_SHARED_TABLES
+    :return: InData of the snapshot
+    """
+    with timed('load_india'):
+        return load_shared('india', version, build_in_data, lambda data: ({}, {'df': data.df}),
+                           lambda version, arrays, frames: InData(version, frames['df']), shared)
+
+
+# structured India data of the loaded snapshot, loaded on first use and built once per version
+in_data = None
+
+# guards the loading of the India data
+load_lock = threading.Lock()
+
+
+def get_in_data():
+    """
+    India data currently in use, callbacks take it once so that they work on one consistent version
+    :return: InData of the current snapshot version
+    """
+    global in_data
+    if in_data is None:
+        with load_lock:
+            if in_data is None:
+                in_data = load_in_data()
+    return in_data
 
 
 def get_in_df():
     """
-    creates dataframe for India containing require parameters
+    dataframe for India containing required parameters, a view sharing the read-only data built at load
     :return: structured dataframe for India
     """
-    df_in_daily['date'] = df_in_daily['date'] + '2020'
-    df_in_daily['date'] = pd.to_datetime(df_in_daily['date'])
-    df_in_daily['dailyconfirmed'] = pd.to_numeric(df_in_daily['dailyconfirmed'])
-    df_in_daily['dailyrecovered'] = pd.to_numeric(df_in_daily['dailyrecovered'])
-    df_in_daily['dailydeceased'] = pd.to_numeric(df_in_daily['dailydeceased'])
-    df_in_daily['cum_confirmed'] = df_in_daily['dailyconfirmed'].cumsum()
-    df_in_daily['active'] = df_in_daily['cum_confirmed'] - (
-            df_in_daily['dailyrecovered'].cumsum() + df_in_daily['dailydeceased'].cumsum())
-    return df_in_daily
+    return get_in_data().df.copy(deep=False)
+
+
+def update_in_data(version, df_new=None):
+    """
+    swaps in a new snapshot version of the India data
+    :param version: snapshot version to load
+    :param df_new: rows appended to the previous version, unused as the India data is always loaded completely
+    """
+    global in_data
+    with load_lock:
+        in_data = load_in_data(version)
@@ -0,0 +1,323 @@
+import datetime as dt
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from config import FIT_METHOD
+
+# value of Levitt's measure H(t) at which the epidemic is considered to be under control
+H_THRESHOLD = 1.0001
+
+# r-squared value at or below which the regression line is not extrapolated
+MIN_R_SQUARED = 0.1
+
+# methods of fitting the regression line: least squares, or Theil-Sen (median of the slopes between all pairs of days)
+# which is robust against single outlying days, e.g. a batch of late reported cases
+FIT_METHODS = ['least_squares', 'theil_sen']
+
+# result of fitting a regression line to daily Levitt's measure H(t)
+LevittFit = namedtuple('LevittFit', ['levitt_measure', 'day_count', 'slope', 'intercept', 'r_squared', 'n_points',
+                                     'required_day', 'extrapolate', 'crossing_day'])
+
+# sufficient statistics of the least squares fit of a set of days: number of values of H(t) and sums of x, y, x * y,
+# x * x and y * y, with x the day number and y = H(t) - 1 (values of H(t) are close to 1, subtracting it keeps the
+# sums precise). Fields are scalars for one set of days or arrays for many
+LevittSums = namedtuple('LevittSums', ['n', 'sum_x', 'sum_y', 'sum_xy', 'sum_xx', 'sum_yy'])
+
+
+def get_levitt_measure(cum_confirmed):
+    """
+    computes daily Levitt's measure H(t) = X(t) / X(t-1) for a series of cumulative confirmed cases
+    :param cum_confirmed: array like of cumulative confirmed cases, one value per day
+    :return: float array of H(t), NaN on the first day and wherever X(t-1) is not positive
+    """
+    cum_confirmed = np.ascontiguousarray(cum_confirmed, dtype=np.float64)
+    levitt_measure = np.full(len(cum_confirmed), np.nan)
+    if len(cum_confirmed) > 1:
+        np.divide(cum_confirmed[1:], cum_confirmed[:-1], out=levitt_measure[1:], where=cum_confirmed[:-1] > 0)
+    return levitt_measure
+
+
+def get_r_squared(y_true, y_pred):
+    """
+    coefficient of determination of a prediction, same definition as sklearn.metrics.r2_score
+    :param y_true: array of observed values
+    :param y_pred: array of predicted values
+    :return: r squared value
+    """
+    numerator = np.sum((y_true - y_pred) ** 2)
+    denominator = np.sum((y_true - np.mean(y_true)) ** 2)
+    if denominator == 0:
+        return 1.0 if numerator == 0 else 0.0
+    return 1 - numerator / denominator
+
+
+def get_sums(x, y):
+    """
+    sufficient statistics of the least squares fit of a set of days
+    :param x: float array of day numbers
+    :param y: float array of H(t), finite values only
+    :return: LevittSums of scalars
+    """
+    y = y - 1
+    return LevittSums(len(x), x.sum(), y.sum(), (x * y).sum(), (x * x).sum(), (y * y).sum())
+
+
+def add_day(sums, x, levitt_value):
+    """
+    sufficient statistics after adding one day, so a fit is updated in O(1) when a day is appended
+    :param sums: LevittSums of scalars of the days so far
+    :param x: day number of the new day
+    :param levitt_value: H(t) of the new day, NaN values are not added
+    :return: new LevittSums
+    """
+    if not np.isfinite(levitt_value):
+        return sums
+    y = levitt_value - 1
+    return LevittSums(sums.n + 1, sums.sum_x + x, sums.sum_y + y, sums.sum_xy + x * y, sums.sum_xx + x * x,
+                      sums.sum_yy + y * y)
+
+
+def get_prefix_sums(levitt_measure):
+    """
+    prefix sums of the sufficient statistics of a series of H(t), element k holds the sums of the days before day k
+    with x the day number in the series, so the sums of any range of days are a difference of two elements. Each prefix
+    sum is kept as a high part and a low part holding the rounding errors of the cumulative sum (computed exactly with
+    the two-sum algorithm), so that the sums of a short window late in a long series keep their precision
+    :param levitt_measure: float array of H(t), NaN values are left out
+    :return: LevittSums of the high parts and LevittSums of the low parts, arrays of length len(levitt_measure) + 1
+    """
+    valid = np.isfinite(levitt_measure)
+    x = np.where(valid, np.arange(len(levitt_measure), dtype=np.float64), 0)
+    y = np.where(valid, levitt_measure - 1, 0)
+    high, low = [], []
+    for values in (valid.astype(np.float64), x, y, x * y, x * x, y * y):
+        total = np.concatenate([[0], np.cumsum(values)])
+        # two-sum: exact rounding error of each addition of the cumulative sum
+        added = total[1:] - total[:-1]
+        error = (total[:-1] - (total[1:] - added)) + (values - added)
+        high.append(total)
+        low.append(np.concatenate([[0], np.cumsum(error)]))
+    return LevittSums(*high), LevittSums(*low)
+
+
+def get_window_sums(prefix, start, end):
+    """
+    sufficient statistics of windows of rows of a series, each window fitted as if it was the whole series like
+    fit_levitt(cum_confirmed[start:end]) does: the first row of a window has no H(t) (its previous day is not part of
+    the window) and the day numbers count from the first row of the window
+    :param prefix: high and low parts of the prefix sums of the series (get_prefix_sums)
+    :param start: first row of each window, int or int array
+    :param end: row after the last row of each window, int or int array
+    :return: LevittSums, scalars or arrays like start and end, in O(1) per window
+    """
+    start, end = np.asarray(start), np.asarray(end)
+    first = np.minimum(start + 1, end)
+    n, sum_x, sum_y, sum_xy, sum_xx, sum_yy = ((high[end] - high[first]) + (low[end] - low[first])
+                                               for high, low in zip(*prefix))
+    # day numbers shifted to count from the start of the window
+    return LevittSums(n, sum_x - start * n, sum_y, sum_xy - start * sum_y,
+                      sum_xx - 2 * start * sum_x + start * start * n, sum_yy)
+
+
+def fit_sums(sums):
+    """
+    least squares regression line from sufficient statistics
+    :param sums: LevittSums, scalars or arrays
+    :return: slope, intercept and r squared value (same definition as get_r_squared), NaN with less than two values
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        n = np.asarray(sums.n, dtype=np.float64)
+        s_xx = sums.sum_xx - sums.sum_x * sums.sum_x / n
+        s_xy = sums.sum_xy - sums.sum_x * sums.sum_y / n
+        s_yy = sums.sum_yy - sums.sum_y * sums.sum_y / n
+        slope = s_xy / s_xx
+        intercept = (sums.sum_y - slope * sums.sum_x) / n + 1
+        ss_res = np.maximum(s_yy - slope * s_xy, 0)
+        # a constant series is fitted exactly
+        r_squared = np.where(s_yy <= 0, 1.0, 1 - ss_res / s_yy)
+    slope, intercept, r_squared = (np.where(n < 2, np.nan, values) for values in (slope, intercept, r_squared))
+    return slope[()], intercept[()], r_squared[()]
+
+
+def fit_theil_sen(x, y):
+    """
+    Theil-Sen regression line: the slope is the median of the slopes between all pairs of days, the intercept the
+    median of y - slope * x. O(n^2) in the number of days
+    :param x: float array of day numbers
+    :param y: float array of H(t), finite values only
+    :return: slope, intercept and r squared value of the line, NaN with less than two values
+    """
+    if len(x) < 2:
+        return np.float64(np.nan), np.float64(np.nan), np.float64(np.nan)
+    i, j = np.triu_indices(len(x), 1)
+    slope = np.median((y[j] - y[i]) / (x[j] - x[i]))
+    intercept = np.median(y - slope * x)
+    return slope, intercept, np.float64(get_r_squared(y, slope * x + intercept))
+
+
+def get_crossing(slope, intercept, r_squared):
+    """
+    day on which regression lines reach H_THRESHOLD and whether they are extrapolated till then
+    :param slope: slopes of the lines, array
+    :param intercept: intercepts of the lines, array
+    :param r_squared: r squared values of the lines, array
+    :return: (fractional) required day, whether the line is extrapolated, and the (integer) day till which it is
+    extrapolated, NaN where it is not
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        required_day = (H_THRESHOLD - intercept) / slope
+        # if slope is positive or r-squared value is less than equal to MIN_R_SQUARED then do not extrapolate
+        extrapolate = np.isfinite(required_day) & (required_day >= 0) & (r_squared > MIN_R_SQUARED)
+    # required day can have decimal, use ceil to get integer
+    crossing_day = np.where(extrapolate, np.ceil(np.where(extrapolate, required_day, 0)), np.nan)
+    return required_day, extrapolate, crossing_day
+
+
+def fit_levitt(cum_confirmed, method=None):
+    """
+    computes daily Levitt's measure H(t), fits a regression line on it and finds the day H(t) reaches H_THRESHOLD
+    :param cum_confirmed: array like of cumulative confirmed cases, one value per day, first day is day 0
+    :param method: one of FIT_METHODS, defaults to FIT_METHOD
+    :return: LevittFit containing H(t), day numbers, slope, intercept and r squared value of the regression line,
+    number of points used for fitting, (fractional) day on which the line reaches H_THRESHOLD, whether the line is
+    to be extrapolated and the (integer) day till which it is extrapolated
+    """
+    levitt_measure = get_levitt_measure(cum_confirmed)
+    day_count = np.arange(len(levitt_measure))
+    idx = np.isfinite(levitt_measure)
+    x, y = day_count[idx].astype(np.float64), levitt_measure[idx]
+    if (method or FIT_METHOD) == 'theil_sen':
+        slope, intercept, r_squared = fit_theil_sen(x, y)
+    else:
+        slope, intercept, r_squared = fit_sums(get_sums(x, y))
+    required_day, extrapolate, crossing_day = get_crossing(slope, intercept, r_squared)
+    extrapolate = bool(extrapolate)
+    return LevittFit(levitt_measure, day_count, slope, intercept, r_squared, len(x), float(required_day), extrapolate,
+                     int(crossing_day) if extrapolate else None)
+
+
+def fit_levitt_windows(cum_confirmed, start, end, method=None):
+    """
+    fits regression lines on many windows of rows of one series at once, each window gives the same fit as
+    fit_levitt(cum_confirmed[start:end]) (up to floating point rounding). Least squares fits take O(1) per window from
+    the prefix sums of the series, Theil-Sen fits are computed window by window
+    :param cum_confirmed: array like of cumulative confirmed cases, one value per day
+    :param start: int array of the first row of each window
+    :param end: int array of the row after the last row of each window
+    :param method: one of FIT_METHODS, defaults to FIT_METHOD
+    :return: LevittFit with H(t) and day numbers of the whole series and one value per window in the other fields,
+    crossing_day is NaN where the line is not extrapolated
+    """
+    levitt_measure = get_levitt_measure(cum_confirmed)
+    start, end = np.asarray(start, dtype=np.int64), np.asarray(end, dtype=np.int64)
+    sums = get_window_sums(get_prefix_sums(levitt_measure), start, end)
+    if (method or FIT_METHOD) == 'theil_sen':
+        slope, intercept, r_squared = np.full((3, len(start)), np.nan)
+        day_count = np.arange(len(levitt_measure), dtype=np.float64)
+        for i, (first, last) in enumerate(zip(start + 1, end)):
+            idx = np.flatnonzero(np.isfinite(levitt_measure[first:last])) + first
+            slope[i], intercept[i], r_squared[i] = fit_theil_sen(day_count[idx] - (first - 1), levitt_measure[idx])
+    else:
+        slope, intercept, r_squared = (np.asarray(values, dtype=np.float64) for values in fit_sums(sums))
+    required_day, extrapolate, crossing_day = get_crossing(slope, intercept, r_squared)
+    return LevittFit(levitt_measure, np.arange(len(levitt_measure)), slope, intercept, r_squared,
+                     np.asarray(sums.n, dtype=np.int64), required_day, extrapolate, crossing_day)
+
+
+def get_end_date_drift(df_levitt, start_date, window=None, method=None):
+    """
+    how the predicted end date moves as days are added: for each day after the start date the regression line is
+    fitted on the days up to it, on all days after the start date or on the last window days only
+    :param df_levitt: dataframe of India/States/Districts with date and cum_confirmed columns
+    :param start_date: date from which data is to be considered
+    :param window: number of days of a rolling window, None for all days after the start date
+    :param method: one of FIT_METHODS, defaults to FIT_METHOD
+    :return: dataframe with one row per day (with at least two values of H(t) before it): date, first date of the
+    window, number of points, slope, intercept, r squared value, whether the line is extrapolated and the date H(t)
+    reaches H_THRESHOLD (NaT where it is not extrapolated)
+    """
+    df_levitt = df_levitt[df_levitt['date'] > start_date].reset_index(drop=True)
+    dates = pd.to_datetime(df_levitt['date']).values
+    end = np.arange(3, len(df_levitt) + 1)
+    start = np.zeros(len(end), dtype=np.int64) if window is None else np.maximum(end - window, 0)
+    fit = fit_levitt_windows(df_levitt['cum_confirmed'].values, start, end, method)
+    # the line is extrapolated till the crossing day, counted from the first day of the window
+    crossing_dates = pd.to_datetime(dates[end - 1]) + pd.to_timedelta(fit.crossing_day - (end - start), unit='D')
+    return pd.DataFrame({
+        'date': dates[end - 1],
+        'window_start': dates[start],
+        'n_points': fit.n_points,
+        'slope': fit.slope,
+        'intercept': fit.intercept,
+        'r_squared': fit.r_squared,
+        'extrapolate': fit.extrapolate,
+        'crossing_date': crossing_dates.where(fit.extrapolate),
+    })
+
+
+def get_data_for_graph_with_regression_line(df_levitt, start_date, method=None):
+    """
+    relevant data to plot regression line
+    :param df_levitt: dataframe of India/States/Districts
+    :param start_date: date from which data is to be considered
+    :param method: one of FIT_METHODS, defaults to FIT_METHOD
+    :return: dataframe containing Levitt Measure H(t) for each day, dates corresponding to each H(t) and predicted
+    H(t), regression model, regression line, r squared value of regression line
+    """
+    df_levitt = df_levitt[df_levitt['date'] > start_date].reset_index(drop=True)
+    fit = fit_levitt(df_levitt['cum_confirmed'].values, method)
+    df_levitt = df_levitt.assign(LevittMeasure=fit.levitt_measure, day_count=fit.day_count)
+    model = np.poly1d([fit.slope, fit.intercept])
+    # get dates corresponding to day number
+    dates = []
+    if not fit.extrapolate:
+        line = np.linspace(0, fit.n_points, fit.n_points)
+    else:
+        line = np.linspace(0, fit.crossing_day, fit.crossing_day)
+        # find more dates needed for plotting
+        last_date = df_levitt['date'].iloc[-1]
+        dates = [last_date + dt.timedelta(i + 1) for i in range(fit.crossing_day - len(df_levitt))]
+    return df_levitt, dates, model, line, round(fit.r_squared, 2)
+
+
+def fit_levitt_stacked(cum_confirmed, method=None):
+    """
+    computes daily Levitt's measure H(t) and fits regression lines for many regions at once, gives the same results as
+    fit_levitt applied to each region (up to floating point rounding). Theil-Sen fits are computed region by region
+    :param cum_confirmed: 2-D array like (regions x days) of cumulative confirmed cases, each row starts with day 0 of
+    its region and is padded with NaN after its last day
+    :param method: one of FIT_METHODS, defaults to FIT_METHOD
+    :return: LevittFit with one value per region in each field, levitt_measure is 2-D (regions x days), crossing_day
+    is NaN where the line is not extrapolated, regions with less than two values of H(t) get NaN fits
+    """
+    cum_confirmed = np.asarray(cum_confirmed, dtype=np.float64)
+    levitt_measure = np.full(cum_confirmed.shape, np.nan)
+    with np.errstate(invalid='ignore'):
+        np.divide(cum_confirmed[:, 1:], cum_confirmed[:, :-1], out=levitt_measure[:, 1:],
+                  where=cum_confirmed[:, :-1] > 0)
+    day_count = np.arange(cum_confirmed.shape[1])
+    valid = np.isfinite(levitt_measure)
+    n_points = valid.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # least squares on centered values, masked entries contribute nothing to the sums
+        x_mean = np.where(valid, day_count, 0).sum(axis=1) / n_points
+        y_mean = np.where(valid, levitt_measure, 0).sum(axis=1) / n_points
+        dx = np.where(valid, day_count - x_mean[:, None], 0)
+        dy = np.where(valid, levitt_measure - y_mean[:, None], 0)
+        slope = (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1)
+        intercept = y_mean - slope * x_mean
+        residual = np.where(valid, levitt_measure - (slope[:, None] * day_count + intercept[:, None]), 0)
+        ss_res, ss_tot = (residual ** 2).sum(axis=1), (dy ** 2).sum(axis=1)
+        r_squared = np.where(ss_tot == 0, np.where(ss_res == 0, 1.0, 0.0), 1 - ss_res / ss_tot)
+    if (method or FIT_METHOD) == 'theil_sen':
+        for i in range(len(cum_confirmed)):
+            x = np.flatnonzero(valid[i])
+            slope[i], intercept[i], r_squared[i] = fit_theil_sen(x.astype(np.float64), levitt_measure[i, x])
+    # regions with less than two values of H(t) cannot be fitted
+    for values in (slope, intercept, r_squared):
+        values[n_points < 2] = np.nan
+    required_day, extrapolate, crossing_day = get_crossing(slope, intercept, r_squared)
+    return LevittFit(levitt_measure, day_count, slope, intercept, r_squared, n_points, required_day, extrapolate,
+                     crossing_day)
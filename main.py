@@ -1,171 +1,141 @@
-import math
+import os
+import json
 import datetime as dt
 import warnings
-import pandas as pd
-import numpy as np
-
-from sklearn.metrics import r2_score
+import functools
 
 import dash
 import dash_core_components as dcc
 import dash_bootstrap_components as dbc
 
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, ClientsideFunction
+from plotly.utils import PlotlyJSONEncoder
 
-from states.helper import get_state_df, reverse_state_code_dict
-from districts.helper import get_district_df
-from india.helper import get_in_df
+from config import REFRESH_INTERVAL, COMPACT_FIGURES, FIGURE_MAX_POINTS, FIT_METHOD, EXPORT_ENABLED, CLIENTSIDE_FIT
+from cache import cached, make_key
+from figures import get_region_figures, get_daily_figures, get_series_data
+from metrics import METRICS_ENABLED, timed, instrumented, register_metrics_route
+from precompute import PRECOMPUTE, get_precomputed_figures, schedule_precompute
 
-from dashboard_layout import dashboard_layout
+from dashboard_layout import get_dashboard_layout
 
 warnings.filterwarnings("ignore")
 
-app = dash.Dash(external_stylesheets=[dbc.themes.BOOTSTRAP])
-app.title = "Levitt's Measure"
-server = app.server
+# first date accepted as start date of the regression line
+MIN_START_DATE = dt.datetime(2020, 3, 1)
 
+# whether the regression line is fitted in the browser (see assets/levitt.js), which only has the least squares fit
+CLIENTSIDE = CLIENTSIDE_FIT and FIT_METHOD == 'least_squares'
 
-def get_graph(graph_id, x_values, y_values, title, label_x, label_y):
-    """
-    creates a dash core component graph with the passed parameters
-    :param graph_id: id of the graph
-    :param x_values: x axis values
-    :param y_values: y axis values
-    :param title: title of the graph
-    :param label_x: x axis label
-    :param label_y: y axis label
-    :return: dash core component graph created with the passed parameters
-    """
-    return dcc.Graph(id=graph_id,
-                     figure={
-                         'data': [
-                             {'x': x_values, 'y': y_values, 'mode': 'lines+markers'},
-                         ],
-                         'layout': {
-                             'title': title,
-                             'xaxis': {
-                                 'title': label_x
-                             },
-                             'yaxis': {
-                                 'title': label_y
-                             }
-                         }
-                     }),
-
-
-def get_graph_with_regression_line(graph_id, x1_values, y1_values, x2_values, y2_values, r_squared, title):
-    """
-    creates two plots on the same graph (Regression line plot and scatter plot of daily Levitt's Measure H(t)) with the
-    passed parameters
-    :param graph_id: id of the graph
-    :param x1_values: x axis values for the first plot (scatter plot of daily H(t))
-    :param y1_values: y axis values for the first plot
-    :param x2_values: x axis values for the second plot (regression line plot)
-    :param y2_values: y axis values for the second plot
-    :param r_squared: r-squared value of regression line
-    :param title: title of the graph
-    :return: dash core component graph with two plots (Regression line plot and scatter plot of daily H(t))
-    """
-    return dcc.Graph(id=graph_id,
-                     figure={
-                         'data': [
-                             {'x': x1_values, 'y': y1_values, 'mode': 'markers', 'name': 'H(t)'},
-                             {'x': x2_values, 'y': y2_values, 'mode': 'line',
-                              'name': "Regression Line<br> R² = " + str(r_squared)},
-                         ],
-                         'layout': {
-                             'title': title,
-                             'xaxis': {
-                                 'title': "Date",
-                             },
-                             'yaxis': {
-                                 'title': "Levitt's Measure H(t)"
-                             }
-                         }
-                     })
-
-
-def get_data_for_graph_with_regression_line(df_levitt, start_date):
-    """
-    relevant data to plot regression line
-    :param df_levitt: dataframe of India/States/Districts
-    :param start_date: date from which data is to be considered
-    :return: dataframe containing Levitt Measure H(t) for each day, dates corresponding to each H(t) and predicted
-    H(t), regression model, regression line, r squared value of regression line
-    """
-    df_levitt = df_levitt[df_levitt['date'] > start_date]
-    df_levitt = df_levitt.reset_index(drop=True)
-    df_levitt['LevittMeasure'] = np.NaN
-    # Levitt Measure Calculation
-    for i in reversed(range(1, len(df_levitt))):
-        numerator = df_levitt.iloc[i]['cum_confirmed']
-        denominator = df_levitt.iloc[i - 1]['cum_confirmed']
-        if denominator > 0:
-            df_levitt.at[i, 'LevittMeasure'] = numerator / denominator
-    # line fit code
-    days = range(0, len(df_levitt))
-    df_levitt = df_levitt.assign(day_count=pd.Series(days).values)
-    X_train, y_train = df_levitt['day_count'], df_levitt['LevittMeasure']
-    idx = np.isfinite(X_train) & np.isfinite(y_train)
-    X_train, y_train = X_train[idx], y_train[idx]
-    model = np.poly1d(np.polyfit(X_train, y_train, 1))
-    # day till which fitted regression line needs to be extrapolated
-    required_day = (1.0001 - model.coeffs[1]) / model.coeffs[0]
-    # get dates corresponding to day number
-    dates = []
-    # if slope is positive or r-squared value is less than equal to 0.1 then do not extrapolate
-    if required_day < 0 or r2_score(y_train, model(X_train)) <= 0.1:
-        line = np.linspace(0, len(X_train), len(X_train))
-    else:
-        # required day can have decimal, use ceil to get integer
-        line = np.linspace(0, math.ceil(required_day), math.ceil(required_day))
-        # find more dates needed for plotting
-        more_dates = math.ceil(required_day) - len(days)
-        last_date = df_levitt.iloc[-1]['date']
-        for i in range(more_dates):
-            dates.append(last_date + dt.timedelta(i + 1))
-    return df_levitt, dates, model, line, round(r2_score(y_train, model(X_train)), 2)
+# directory of the scripts served to the browser
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
 
 
-# get india dataframe containing required parameters
-df_in_daily = get_in_df()
+def get_figures(region_kind, region_id, region_name, start_date, version, get_df, new_column, active_column):
+    """
+    figures of the three graphs of a region, taken from the precomputed table for the default start date (see
+    precompute.py), otherwise the figures and the regression line fit are cached by region, start date and version of
+    the loaded data, figures are made compact if COMPACT_FIGURES is set
+    :param region_kind: data set of the region, india, states or districts
+    :param region_id: id of the region in its data set
+    :param region_name: name of the region used in the graph titles
+    :param start_date: date from which data is to be considered for the regression line
+    :param version: snapshot version of the data of the region
+    :param get_df: function without arguments returning the dataframe of the region
+    :param new_column: column of the dataframe containing daily new cases
+    :param active_column: column of the dataframe containing daily active cases
+    :return: list of three figure dicts
+    """
+
+    def compute_fit(df_daily):
+        from levitt import get_data_for_graph_with_regression_line
+        with timed('fit'):
+            return get_data_for_graph_with_regression_line(df_daily, start_date)
 
-# set app layout to dashboard layout
-app.layout = dashboard_layout
+    def compute_figures():
+        with timed('extract'):
+            df_daily = get_df()
+        fit_data = cached(make_key('fit', region_kind, region_id, start_date.date(), version, FIT_METHOD),
+                          lambda: compute_fit(df_daily))
+        with timed('figures'):
+            figures = get_region_figures(df_daily, fit_data, region_name, new_column, active_column, COMPACT_FIGURES)
+        with timed('serialize'):
+            return json.dumps(figures, cls=PlotlyJSONEncoder)
 
+    figures_json = get_precomputed_figures(region_kind, region_id, start_date, version)
+    if figures_json is None:
+        figures_json = cached(make_key('figures', region_kind, region_id, start_date.date(), version, FIT_METHOD,
+                                       COMPACT_FIGURES, FIGURE_MAX_POINTS), compute_figures)
+    with timed('deserialize'):
+        return json.loads(figures_json)
 
-@app.callback(
-    [Output('in-levitt', 'children'), Output('in-daily-new', 'children'), Output('in-daily-active', 'children')],
-    [Input(component_id='in-start-date', component_property='value')]
-)
-def update_graph(in_start_date):
+
+def get_region_series(region_kind, region_id, region_name, version, get_df, new_column, active_column):
+    """
+    series of a region the browser fits the regression line on and the figures of its daily graphs, which do not depend
+    on the start date, cached by region and version of the loaded data. The daily figures are made compact if
+    COMPACT_FIGURES is set
+    :param region_kind: data set of the region, india, states or districts
+    :param region_id: id of the region in its data set
+    :param region_name: name of the region used in the graph titles
+    :param version: snapshot version of the data of the region
+    :param get_df: function without arguments returning the dataframe of the region
+    :param new_column: column of the dataframe containing daily new cases
+    :param active_column: column of the dataframe containing daily active cases
+    :return: list of series data, daily new cases figure and daily active cases figure
+    """
+
+    def compute_series():
+        with timed('extract'):
+            df_daily = get_df()
+        with timed('figures'):
+            figures = get_daily_figures(df_daily, region_name, new_column, active_column)
+            if COMPACT_FIGURES:
+                from compact_figures import compact_figure
+                figures = [compact_figure(figure, FIGURE_MAX_POINTS) for figure in figures]
+        with timed('serialize'):
+            return json.dumps([get_series_data(df_daily, region_name)] + figures, cls=PlotlyJSONEncoder)
+
+    series_json = cached(make_key('series', region_kind, region_id, version, COMPACT_FIGURES, FIGURE_MAX_POINTS),
+                         compute_series)
+    with timed('deserialize'):
+        return json.loads(series_json)
+
+
+def update_series(region_kind, region_id):
+    """
+    fills the series store and the daily graphs of a region when it is chosen, the regression line is then fitted in
+    the browser whenever the start date changes
+    :param region_kind: data set of the region, india, states or districts
+    :param region_id: id of the region: in, a state code or a district name
+    :return: list of series data, daily new cases figure and daily active cases figure
+    """
+    from precompute import get_data, get_region_args
+    data = get_data(region_kind)
+    region_name, get_df, new_column, active_column = get_region_args(region_kind, region_id, data)
+    return get_region_series(region_kind, region_id, region_name, data.version, get_df, new_column, active_column)
+
+
+def update_in_graph(in_start_date):
     """
     creates three graphs using India data: daily Levitt's measure graph with fitted regression line, daily new cases
     graph, daily active cases graph to be placed in a bootstrap row
     :param in_start_date: date from which data is to be considered
     :return: list of three dash core component graphs
     """
-    if dt.datetime.strptime(in_start_date, "%Y-%m-%d") > pd.to_datetime("2020-03-01"):
+    if dt.datetime.strptime(in_start_date, "%Y-%m-%d") > MIN_START_DATE:
         start_date = dt.datetime.strptime(in_start_date, "%Y-%m-%d")
-        daily_new_graph = get_graph("in-daily-new-graph", df_in_daily['date'], df_in_daily['dailyconfirmed'],
-                                    "Daily New Cases India", "Date", "New Cases")
-        daily_active_graph = get_graph("in-daily-active-graph", df_in_daily['date'], df_in_daily['active'],
-                                       "Daily Active Cases India", "Date", "Active Cases")
-        df_in_levitt, dates, model, line, r_squared = get_data_for_graph_with_regression_line(df_in_daily, start_date)
-        regression_graph = get_graph_with_regression_line("in-levitt-graph", df_in_levitt['date'],
-                                                          df_in_levitt['LevittMeasure'],
-                                                          list(df_in_levitt['date']) + dates, model(line), r_squared,
-                                                          "Daily Levitt's Measure H(t) India")
-        return [regression_graph, daily_new_graph, daily_active_graph]
-
-
-@app.callback(
-    [Output('state-levitt', 'children'), Output('state-daily-new', 'children'),
-     Output('state-daily-active', 'children')],
-    [Input(component_id='state-dropdown', component_property='value'),
-     Input(component_id='state-start-date', component_property='value')]
-)
-def update_graph(state_dropdown_code, state_start_date):
+        from india.helper import get_in_data
+        in_data = get_in_data()
+        schedule_precompute('india', in_data)
+        regression_figure, daily_new_figure, daily_active_figure = get_figures(
+            'india', 'in', "India", start_date, in_data.version, lambda: in_data.df, 'dailyconfirmed', 'active')
+        return [dcc.Graph(id="in-levitt-graph", figure=regression_figure),
+                dcc.Graph(id="in-daily-new-graph", figure=daily_new_figure),
+                dcc.Graph(id="in-daily-active-graph", figure=daily_active_figure)]
+
+
+def update_state_graph(state_dropdown_code, state_start_date):
     """
     creates three graphs using Indian states data: daily Levitt's measure graph with fitted regression line, daily new
     cases graph, daily active cases graph to be placed in a bootstrap row
@@ -173,32 +143,20 @@ def update_graph(state_dropdown_code, state_start_date):
     :param state_start_date: date from which data is to be considered
     :return: list of three dash core component graphs
     """
-    if dt.datetime.strptime(state_start_date, "%Y-%m-%d") > pd.to_datetime("2020-03-01"):
+    if dt.datetime.strptime(state_start_date, "%Y-%m-%d") > MIN_START_DATE:
         start_date = dt.datetime.strptime(state_start_date, "%Y-%m-%d")
-        df_state_daily = get_state_df(state_dropdown_code)
-        daily_new_graph = get_graph("state-daily-new-graph", df_state_daily['date'], df_state_daily['confirmed'],
-                                    "Daily New Cases " + reverse_state_code_dict[state_dropdown_code],
-                                    "Date", "New Cases")
-        daily_active_graph = get_graph("state-daily-active-graph", df_state_daily['date'], df_state_daily['active'],
-                                       "Daily Active Cases " + reverse_state_code_dict[state_dropdown_code], "Date",
-                                       "Active Cases")
-        df_state_levitt, dates, model, line, r_squared = get_data_for_graph_with_regression_line(df_state_daily,
-                                                                                                 start_date)
-        regression_graph = get_graph_with_regression_line("state-levitt-graph", df_state_levitt['date'],
-                                                          df_state_levitt['LevittMeasure'],
-                                                          list(df_state_levitt['date']) + dates, model(line), r_squared,
-                                                          "Daily Levitt's Measure H(t) " + reverse_state_code_dict[
-                                                              state_dropdown_code])
-        return [regression_graph, daily_new_graph, daily_active_graph]
-
-
-@app.callback(
-    [Output('district-levitt', 'children'), Output('district-daily-new', 'children'),
-     Output('district-daily-active', 'children')],
-    [Input(component_id='district-dropdown', component_property='value'),
-     Input(component_id='district-start-date', component_property='value')]
-)
-def update_graph(district_dropdown, district_start_date):
+        from states.helper import get_state_df, get_state_data, reverse_state_code_dict
+        state_data = get_state_data()
+        schedule_precompute('states', state_data)
+        regression_figure, daily_new_figure, daily_active_figure = get_figures(
+            'states', state_dropdown_code, reverse_state_code_dict[state_dropdown_code], start_date,
+            state_data.version, lambda: get_state_df(state_dropdown_code, state_data), 'confirmed', 'active')
+        return [dcc.Graph(id="state-levitt-graph", figure=regression_figure),
+                dcc.Graph(id="state-daily-new-graph", figure=daily_new_figure),
+                dcc.Graph(id="state-daily-active-graph", figure=daily_active_figure)]
+
+
+def update_district_graph(district_dropdown, district_start_date):
     """
     creates three graphs using Indian districts data: daily Levitt's measure graph with fitted regression line, daily
     new cases graph, daily active cases graph to be placed in a bootstrap row
@@ -206,23 +164,111 @@ def update_graph(district_dropdown, district_start_date):
     :param district_start_date: date from which data is to be considered
     :return: list of three dash core component graphs
     """
-    if dt.datetime.strptime(district_start_date, "%Y-%m-%d") > pd.to_datetime("2020-03-01"):
+    if dt.datetime.strptime(district_start_date, "%Y-%m-%d") > MIN_START_DATE:
         start_date = dt.datetime.strptime(district_start_date, "%Y-%m-%d")
-        df_district_daily = get_district_df(district_dropdown)
-        df_district_daily.rename({'Date': 'date'}, axis=1, inplace=True)
-        df_district_daily.rename({'Confirmed': 'cum_confirmed'}, axis=1, inplace=True)
-        daily_new_graph = get_graph("district-daily-new-graph", df_district_daily['date'], df_district_daily['New'],
-                                    "Daily New Cases " + district_dropdown, "Date", "New Cases")
-        daily_active_graph = get_graph("district-daily-active-graph", df_district_daily['date'],
-                                       df_district_daily['Active'], "Daily Active Cases " + district_dropdown, "Date",
-                                       "Active Cases")
-        df_district_levitt, dates, model, line, r_squared = get_data_for_graph_with_regression_line(df_district_daily,
-                                                                                                    start_date)
-        regression_graph = get_graph_with_regression_line("district-levitt-graph", df_district_levitt['date'],
-                                                          df_district_levitt['LevittMeasure'],
-                                                          list(df_district_levitt['date']) + dates, model(line),
-                                                          r_squared, "Daily Levitt's Measure H(t) " + district_dropdown)
-        return [regression_graph, daily_new_graph, daily_active_graph]
+        from districts.helper import get_district_df, get_district_data
+        district_data = get_district_data()
+        schedule_precompute('districts', district_data)
+        regression_figure, daily_new_figure, daily_active_figure = get_figures(
+            'districts', district_dropdown, district_dropdown, start_date, district_data.version,
+            lambda: get_district_df(district_dropdown, district_data).rename(
+                {'Date': 'date', 'Confirmed': 'cum_confirmed'}, axis=1), 'New', 'Active')
+        return [dcc.Graph(id="district-levitt-graph", figure=regression_figure),
+                dcc.Graph(id="district-daily-new-graph", figure=daily_new_figure),
+                dcc.Graph(id="district-daily-active-graph", figure=daily_active_figure)]
+
+
+def start_background_refresher(interval):
+    """
+    starts the background refresher, which swaps in new snapshot versions of the data sets loaded by this process
+    :param interval: seconds between two refreshes
+    """
+    from refresher import add_listener, start_refresher
+    from india.helper import update_in_data
+    from states.helper import update_state_data
+    from districts.helper import update_district_data
+    add_listener('india', update_in_data)
+    add_listener('states', update_state_data)
+    add_listener('districts', update_district_data)
+    if PRECOMPUTE:
+        from precompute import get_data
+        # the new data is swapped in by the listeners above, the default views of it are precomputed right away
+        for name in ('india', 'states', 'districts'):
+            add_listener(name, lambda version, df_new, name=name: schedule_precompute(name, get_data(name)))
+    start_refresher(interval)
+
+
+def register_callbacks(app):
+    """
+    callbacks of the dashboard computing the three graphs of a region on the server when the region or the start date
+    changes
+    :param app: dash app
+    """
+    app.callback(
+        [Output('in-levitt', 'children'), Output('in-daily-new', 'children'), Output('in-daily-active', 'children')],
+        [Input(component_id='in-start-date', component_property='value')]
+    )(instrumented('callback_india', update_in_graph))
+    app.callback(
+        [Output('state-levitt', 'children'), Output('state-daily-new', 'children'),
+         Output('state-daily-active', 'children')],
+        [Input(component_id='state-dropdown', component_property='value'),
+         Input(component_id='state-start-date', component_property='value')]
+    )(instrumented('callback_state', update_state_graph))
+    app.callback(
+        [Output('district-levitt', 'children'), Output('district-daily-new', 'children'),
+         Output('district-daily-active', 'children')],
+        [Input(component_id='district-dropdown', component_property='value'),
+         Input(component_id='district-start-date', component_property='value')]
+    )(instrumented('callback_district', update_district_graph))
+
+
+def register_clientside_callbacks(app):
+    """
+    callbacks of the dashboard when the regression line is fitted in the browser: the server sends the series and the
+    daily graphs of a region when it is chosen, the regression line figure is computed by assets/levitt.js
+    :param app: dash app
+    """
+    for prefix, region_kind, region_input in (('in', 'india', Input('in-region', 'data')),
+                                              ('state', 'states', Input('state-dropdown', 'value')),
+                                              ('district', 'districts', Input('district-dropdown', 'value'))):
+        app.callback(
+            [Output(prefix + '-series', 'data'), Output(prefix + '-daily-new-graph', 'figure'),
+             Output(prefix + '-daily-active-graph', 'figure')],
+            [region_input]
+        )(instrumented('callback_' + prefix, functools.partial(update_series, region_kind)))
+        app.clientside_callback(
+            ClientsideFunction(namespace='levitt', function_name='regressionFigure'),
+            Output(prefix + '-levitt-graph', 'figure'),
+            [Input(prefix + '-series', 'data'), Input(prefix + '-start-date', 'value')]
+        )
+
+
+def create_app():
+    """
+    creates the dashboard app. The data helpers (and pandas with them) are imported and the data sets are loaded when
+    a callback first needs them, the dropdown options of the layout are taken from the manifests of the data sets
+    :return: dash app, its flask server is app.server
+    """
+    app = dash.Dash(external_stylesheets=[dbc.themes.BOOTSTRAP], assets_folder=ASSETS_DIR)
+    app.title = "Levitt's Measure"
+    # set app layout to dashboard layout, built on each page load
+    app.layout = functools.partial(get_dashboard_layout, clientside=CLIENTSIDE)
+    if CLIENTSIDE:
+        register_clientside_callbacks(app)
+    else:
+        register_callbacks(app)
+    if METRICS_ENABLED:
+        register_metrics_route(app.server)
+    if EXPORT_ENABLED:
+        from export import register_export_routes
+        register_export_routes(app.server)
+    if REFRESH_INTERVAL > 0:
+        start_background_refresher(REFRESH_INTERVAL)
+    return app
+
+
+app = create_app()
+server = app.server
 
 
 if __name__ == "__main__":
@@ -0,0 +1,83 @@
+"""
+Manifest of a data set: a small json file next to its snapshots with the snapshot version and the options of the
+dropdown menu of the data set. It is written whenever a new snapshot is stored, so the dashboard layout can be built
+without loading the data sets.
+"""
+import os
+import json
+
+from config import SNAPSHOT_DIR
+
+# file in a snapshot directory holding the manifest of the data set
+MANIFEST_FILE = 'manifest.json'
+
+
+def get_manifest_path(name, snapshot_dir=None):
+    """
+    path of the manifest of a data set
+    :param name: name of the data set
+    :param snapshot_dir: snapshot directory, defaults to SNAPSHOT_DIR
+    :return: path
+    """
+    return os.path.join(snapshot_dir or SNAPSHOT_DIR, name, MANIFEST_FILE)
+
+
+def read_manifest(name, snapshot_dir=None):
+    """
+    manifest of a data set
+    :param name: name of the data set
+    :param snapshot_dir: snapshot directory, defaults to SNAPSHOT_DIR
+    :return: dictionary with version and options, None if there is no (readable) manifest
+    """
+    try:
+        with open(get_manifest_path(name, snapshot_dir)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(name, version, options, snapshot_dir=None):
+    """
+    writes the manifest of a data set, unless it is up to date already
+    :param name: name of the data set
+    :param version: snapshot version the options were taken from
+    :param options: options of the dropdown menu of the data set
+    :param snapshot_dir: snapshot directory, defaults to SNAPSHOT_DIR
+    """
+    manifest = {'version': version, 'options': options}
+    if read_manifest(name, snapshot_dir) == manifest:
+        return
+    path = get_manifest_path(name, snapshot_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    path_tmp = '%s.%d.tmp' % (path, os.getpid())
+    with open(path_tmp, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(path_tmp, path)
+
+
+def get_snapshot_options(name, df):
+    """
+    options of the dropdown menu of a data set, taken from the raw table of a snapshot, the same options the data set
+    helper gives once the snapshot is loaded
+    :param name: name of the data set, states or districts
+    :param df: raw dataframe of the data set
+    :return: list of label and value dictionaries
+    """
+    if name == 'states':
+        from states.helper import get_state_options
+        return get_state_options()
+    from districts.helper import excluded_districts
+    return [{'label': district, 'value': district} for district in df['District'].dropna().unique()
+            if district not in excluded_districts]
+
+
+def write_snapshot_manifest(name, version, df, snapshot_dir=None):
+    """
+    writes the manifest of a new snapshot of a data set with a dropdown menu
+    :param name: name of the data set
+    :param version: version of the snapshot
+    :param df: raw dataframe of the snapshot
+    :param snapshot_dir: snapshot directory, defaults to SNAPSHOT_DIR
+    """
+    if name in ('states', 'districts'):
+        write_manifest(name, version, get_snapshot_options(name, df), snapshot_dir)
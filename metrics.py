@@ -0,0 +1,209 @@
+"""
+Optional instrumentation of the dashboard, enabled with LEVITT_METRICS=1: stages of the callbacks (extraction of the
+region, fit, figures, serialization) and the data set loaders are timed into histograms, refreshes are counted, and
+all of it is served in the Prometheus text format on /metrics of the flask server, together with the counters of the
+results cache. Metrics are kept per process, each worker reports its own (with its pid as label).
+
+LEVITT_PROFILE_RATE (0 to 1) profiles that fraction of the callbacks with cProfile, the profiles are written to
+LEVITT_PROFILE_DIR as .prof files (pstats format, e.g. `python -m pstats`, snakeviz or flameprof for flame graphs).
+"""
+import os
+import sys
+import time
+import random
+import cProfile
+import threading
+import functools
+import contextlib
+
+from config import SNAPSHOT_DIR
+from cache import CACHE_SIZE, get_cache_stats
+
+# whether stages are timed and /metrics is served
+METRICS_ENABLED = os.environ.get('LEVITT_METRICS', '0') not in ('', '0', 'false', 'False')
+
+# fraction of the callbacks which are profiled, 0 disables profiling
+PROFILE_RATE = float(os.environ.get('LEVITT_PROFILE_RATE', 0))
+
+# directory the profiles are written to
+PROFILE_DIR = os.environ.get('LEVITT_PROFILE_DIR', os.path.join(SNAPSHOT_DIR, 'profiles'))
+
+# upper bounds of the histogram buckets in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+# prefix of the names of all metrics
+PREFIX = 'levitt_'
+
+# histograms of the stage durations: dictionary to map a stage to its bucket counts, sum and count
+histograms = {}
+
+# counters: dictionary to map name and labels to the count
+counters = {}
+
+# guards histograms and counters
+lock = threading.Lock()
+
+
+def observe(stage, seconds):
+    """
+    records the duration of a stage
+    :param stage: name of the stage
+    :param seconds: duration
+    """
+    with lock:
+        histogram = histograms.get(stage)
+        if histogram is None:
+            histogram = histograms[stage] = [[0] * len(BUCKETS), 0.0, 0]
+        histogram[0][next(i for i, bound in enumerate(BUCKETS) if seconds <= bound)] += 1
+        histogram[1] += seconds
+        histogram[2] += 1
+
+
+def increment(name, amount=1, **labels):
+    """
+    increments a counter
+    :param name: name of the counter
+    :param amount: amount to add
+    :param labels: labels of the counter
+    """
+    if not METRICS_ENABLED:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with lock:
+        counters[key] = counters.get(key, 0) + amount
+
+
+@contextlib.contextmanager
+def timed(stage):
+    """
+    context manager timing a stage, does nothing if metrics are disabled
+    :param stage: name of the stage
+    """
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+@contextlib.contextmanager
+def profiled(name):
+    """
+    context manager profiling a sampled fraction (PROFILE_RATE) of the calls
+    :param name: name used in the file name of the profile
+    """
+    if PROFILE_RATE <= 0 or random.random() >= PROFILE_RATE:
+        yield
+        return
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profile.dump_stats(os.path.join(PROFILE_DIR, '%s-%d-%d.prof' % (name, os.getpid(), time.time() * 1e6)))
+
+
+def instrumented(stage, function):
+    """
+    wraps a function (e.g. a callback) so that its calls are timed and sampled for profiling
+    :param stage: name of the stage
+    :param function: function to wrap
+    :return: wrapped function, the function itself if neither metrics nor profiling are enabled
+    """
+    if not METRICS_ENABLED and PROFILE_RATE <= 0:
+        return function
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with timed(stage), profiled(stage):
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
+def format_labels(labels):
+    """
+    labels in the Prometheus text format
+    :param labels: list of label name and value
+    :return: string like {name="value",...}, empty if there are no labels
+    """
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                             for name, value in labels)
+
+
+def format_number(value):
+    """
+    number in the Prometheus text format
+    :param value: int or float
+    :return: string
+    """
+    return '+Inf' if value == float('inf') else repr(value)
+
+
+def get_metrics_text():
+    """
+    metrics of this process in the Prometheus text format: stage histograms, counters, results cache counters and
+    loaded snapshot versions
+    :return: text
+    """
+    pid = ('pid', os.getpid())
+    lines = []
+    with lock:
+        histogram_items = [(stage, list(buckets), total, count) for stage, (buckets, total, count) in
+                           sorted(histograms.items())]
+        counter_items = sorted(counters.items())
+    lines.append('# HELP %sstage_seconds Duration of the stages of the callbacks and loaders' % PREFIX)
+    lines.append('# TYPE %sstage_seconds histogram' % PREFIX)
+    for stage, buckets, total, count in histogram_items:
+        cumulative = 0
+        for bound, n in zip(BUCKETS, buckets):
+            cumulative += n
+            lines.append('%sstage_seconds_bucket%s %d' % (
+                PREFIX, format_labels([pid, ('stage', stage), ('le', format_number(bound))]), cumulative))
+        lines.append('%sstage_seconds_sum%s %s' % (PREFIX, format_labels([pid, ('stage', stage)]), repr(total)))
+        lines.append('%sstage_seconds_count%s %d' % (PREFIX, format_labels([pid, ('stage', stage)]), count))
+    for name in sorted(set(name for (name, _), _ in counter_items)):
+        lines.append('# TYPE %s%s_total counter' % (PREFIX, name))
+        for (counter_name, labels), value in counter_items:
+            if counter_name == name:
+                lines.append('%s%s_total%s %s' % (PREFIX, name, format_labels([pid] + list(labels)),
+                                                  format_number(value)))
+
+    if CACHE_SIZE > 0:
+        # the counters are kept per process, the entries are shared by all processes (no pid label)
+        stats = get_cache_stats()
+        for name in ('hits', 'misses', 'evictions'):
+            lines.append('# TYPE %scache_%s_total counter' % (PREFIX, name))
+            lines.append('%scache_%s_total%s %d' % (PREFIX, name, format_labels([pid]), stats[name]))
+        lines.append('# TYPE %scache_entries gauge' % PREFIX)
+        lines.append('%scache_entries %d' % (PREFIX, stats['entries']))
+
+    # the data source layer (and pandas) is not imported just for the metrics, nothing is loaded without it
+    data_source = sys.modules.get('data_source')
+    if data_source is not None:
+        lines.append('# TYPE %sloaded_snapshot gauge' % PREFIX)
+        for name, version in sorted(data_source.loaded_versions.items()):
+            lines.append('%sloaded_snapshot%s 1' % (PREFIX, format_labels([pid, ('dataset', name),
+                                                                            ('version', version)])))
+    return '\n'.join(lines) + '\n'
+
+
+def register_metrics_route(server, path='/metrics'):
+    """
+    serves the metrics of the process on a route of the flask server
+    :param server: flask server
+    :param path: path of the route
+    """
+    from flask import Response
+
+    def metrics():
+        return Response(get_metrics_text(), mimetype='text/plain; version=0.0.4')
+
+    server.add_url_rule(path, 'metrics', metrics)
@@ -0,0 +1,368 @@
+"""
+Precomputed default views of the dashboard. Enabled with LEVITT_PRECOMPUTE=1: whenever a data set is loaded or
+refreshed, a background thread fits every region of it (India, every state code, every district of the dropdown) at
+the default start date of the dashboard and stores the forecast (number of points, slope, intercept, r squared value,
+day and date H(t) reaches 1.0001) and the serialized figures of the three graphs of each region in an indexed SQLite
+table shared by all worker processes. Callbacks asking for the default start date answer with a lookup of that table
+and only compute the figures for other start dates, or for regions not precomputed yet. Each data set version is
+computed by one process, the others wait for it and find it done. A run that failed is not started again by the same
+process until the data version, the default start date or the settings change.
+
+The table can be computed before the workers are started (e.g. in a deploy step):
+    python precompute.py [--kinds india states districts]
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import sqlite3
+import logging
+import argparse
+import threading
+import contextlib
+import datetime as dt
+from collections import namedtuple
+
+try:
+    import fcntl
+except ImportError:
+    # no locking between processes, processes starting at the same time compute the same rows
+    fcntl = None
+
+from config import SNAPSHOT_DIR, COMPACT_FIGURES, FIGURE_MAX_POINTS, FIT_METHOD
+from cache import make_key
+from metrics import timed, increment
+
+# whether the default views are precomputed and looked up by the callbacks
+PRECOMPUTE = os.environ.get('LEVITT_PRECOMPUTE', '0') not in ('', '0', 'false', 'False')
+
+# path of the SQLite database holding the precomputed table
+PRECOMPUTE_PATH = os.environ.get('LEVITT_PRECOMPUTE_PATH', os.path.join(SNAPSHOT_DIR, 'precomputed.sqlite3'))
+
+# number of days before today of the default start date, as in dashboard_layout.get_date_input_for_row
+DEFAULT_PAST_DAYS = 40
+
+# number of computed runs (data set version and start date) kept for each data set
+KEEP_RUNS = 2
+
+# number of regions written to the table in one transaction
+WRITE_BATCH_SIZE = 100
+
+# forecast of a region stored with its figures, crossing day and date are None where the line is not extrapolated
+PrecomputedForecast = namedtuple('PrecomputedForecast', ['n_points', 'slope', 'intercept', 'r_squared', 'crossing_day',
+                                                         'crossing_date'])
+
+# kinds of regions, each is a data set
+region_kinds = ['india', 'states', 'districts']
+
+# runs this process has started, including the failed ones: region kind, version, start date and settings
+started_runs = set()
+
+# guards started_runs
+started_lock = threading.Lock()
+
+# connections are opened per process and thread
+_local = threading.local()
+
+logger = logging.getLogger(__name__)
+
+
+def get_default_start_date(n_past_days=DEFAULT_PAST_DAYS):
+    """
+    default start date of the dashboard, n_past_days before today
+    :param n_past_days: go back that many days from today
+    :return: start date as datetime
+    """
+    return dt.datetime.combine(dt.date.today() - dt.timedelta(days=n_past_days), dt.time())
+
+
+def get_settings():
+    """
+    settings the figures depend on, part of the key of the precomputed rows
+    :return: settings string
+    """
+    return make_key(FIT_METHOD, COMPACT_FIGURES, FIGURE_MAX_POINTS)
+
+
+def get_connection():
+    """
+    connection to the precomputed database of the current process and thread, the tables are created if needed
+    :return: sqlite3 connection
+    """
+    connection = getattr(_local, 'connection', None)
+    if connection is None or _local.pid != os.getpid():
+        os.makedirs(os.path.dirname(os.path.abspath(PRECOMPUTE_PATH)), exist_ok=True)
+        connection = sqlite3.connect(PRECOMPUTE_PATH, timeout=30)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute('CREATE TABLE IF NOT EXISTS figures (region_kind TEXT, region_id TEXT, start_date TEXT, '
+                           'version TEXT, settings TEXT, n_points INTEGER, slope REAL, intercept REAL, '
+                           'r_squared REAL, crossing_day INTEGER, crossing_date TEXT, figures BLOB, '
+                           'PRIMARY KEY (region_kind, region_id, start_date, version, settings)) WITHOUT ROWID')
+        connection.execute('CREATE TABLE IF NOT EXISTS runs (region_kind TEXT, start_date TEXT, version TEXT, '
+                           'settings TEXT, regions INTEGER, seconds REAL, finished REAL, '
+                           'PRIMARY KEY (region_kind, start_date, version, settings))')
+        connection.commit()
+        _local.connection, _local.pid = connection, os.getpid()
+    return connection
+
+
+def get_data(region_kind):
+    """
+    data of a kind of regions currently in use
+    :param region_kind: india, states or districts
+    :return: InData, StateData or DistrictData
+    """
+    if region_kind == 'india':
+        from india.helper import get_in_data
+        return get_in_data()
+    if region_kind == 'states':
+        from states.helper import get_state_data
+        return get_state_data()
+    from districts.helper import get_district_data
+    return get_district_data()
+
+
+def get_region_args(region_kind, region_id, data):
+    """
+    arguments of the figures of a region, the same the callbacks of main.py use
+    :param region_kind: india, states or districts
+    :param region_id: id of the region: in, a state code or a district name
+    :param data: data of the kind of regions
+    :return: name of the region, function returning its dataframe, columns of daily new and active cases
+    """
+    if region_kind == 'india':
+        return "India", lambda: data.df, 'dailyconfirmed', 'active'
+    if region_kind == 'states':
+        from states.helper import get_state_df, reverse_state_code_dict
+        return reverse_state_code_dict[region_id], lambda: get_state_df(region_id, data), 'confirmed', 'active'
+    from districts.helper import get_district_df
+    return region_id, lambda: get_district_df(region_id, data).rename(
+        {'Date': 'date', 'Confirmed': 'cum_confirmed'}, axis=1), 'New', 'Active'
+
+
+def get_region_ids(region_kind, data):
+    """
+    ids of all regions of a kind, the regions of the dropdown menus
+    :param region_kind: india, states or districts
+    :param data: data of the kind of regions
+    :return: list of region ids
+    """
+    if region_kind == 'india':
+        return ['in']
+    if region_kind == 'states':
+        from states.helper import state_code_dict
+        return list(state_code_dict.values())
+    from districts.helper import get_districts
+    return get_districts(data)
+
+
+def get_forecasts(region_kind, data, start_date):
+    """
+    forecast of all regions of a kind, fitted in one vectorized pass (see forecast.py)
+    :param region_kind: india, states or districts
+    :param data: data of the kind of regions
+    :param start_date: date from which data is to be considered
+    :return: forecast dataframe with one row per region of get_region_ids
+    """
+    from forecast import forecast_india, forecast_states, forecast_districts
+    if region_kind == 'india':
+        return forecast_india(start_date, data)
+    if region_kind == 'states':
+        from states.helper import state_code_dict
+        # the dropdown lists the states of state_code_dict
+        return forecast_states(start_date, list(state_code_dict), data)
+    return forecast_districts(start_date, data=data)
+
+
+def compute_figures(region_kind, region_id, data, start_date):
+    """
+    serialized figures of the three graphs of a region, the same main.get_figures computes
+    :param region_kind: india, states or districts
+    :param region_id: id of the region
+    :param data: data of the kind of regions
+    :param start_date: date from which data is to be considered
+    :return: json string of the list of three figure dicts
+    """
+    from plotly.utils import PlotlyJSONEncoder
+    from levitt import get_data_for_graph_with_regression_line
+    from figures import get_region_figures
+    region_name, get_df, new_column, active_column = get_region_args(region_kind, region_id, data)
+    df_daily = get_df()
+    fit_data = get_data_for_graph_with_regression_line(df_daily, start_date)
+    figures = get_region_figures(df_daily, fit_data, region_name, new_column, active_column, COMPACT_FIGURES)
+    return json.dumps(figures, cls=PlotlyJSONEncoder)
+
+
+def get_rows(region_kind, data, start_date, settings):
+    """
+    rows of the precomputed table of all regions of a kind, regions whose figures cannot be computed are left out
+    (their callbacks compute them and fail like before)
+    :param region_kind: india, states or districts
+    :param data: data of the kind of regions
+    :param start_date: date from which data is to be considered
+    :param settings: settings string (get_settings)
+    :return: iterator of row tuples
+    """
+    key = (start_date.date().isoformat(), data.version, settings)
+    forecasts = get_forecasts(region_kind, data, start_date)
+    for row in forecasts.itertuples(index=False):
+        try:
+            figures_json = compute_figures(region_kind, row.region_id, data, start_date)
+        except Exception:
+            logger.warning("precomputing %s %s failed", region_kind, row.region_id, exc_info=True)
+            continue
+        extrapolate = bool(row.extrapolate)
+        yield (region_kind, row.region_id) + key + (
+            int(row.n_points), float(row.slope), float(row.intercept), float(row.r_squared),
+            int(row.crossing_day) if extrapolate else None,
+            row.crossing_date.date().isoformat() if extrapolate else None,
+            sqlite3.Binary(zlib.compress(figures_json.encode('utf-8'))))
+
+
+@contextlib.contextmanager
+def run_lock(region_kind):
+    """
+    lock between processes held while the regions of a kind are computed, so that they are computed only once
+    :param region_kind: india, states or districts
+    """
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(PRECOMPUTE_PATH)), exist_ok=True)
+    with open('%s.%s.lock' % (PRECOMPUTE_PATH, region_kind), 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def precompute(region_kind, data=None, start_date=None):
+    """
+    computes and stores the rows of all regions of a kind, unless another process did already. Older runs beyond
+    KEEP_RUNS are deleted
+    :param region_kind: india, states or districts
+    :param data: data of the kind of regions, defaults to the data currently in use
+    :param start_date: start date, defaults to the default start date of the dashboard
+    :return: number of regions stored, None if the run existed already
+    """
+    data = data or get_data(region_kind)
+    start_date = start_date or get_default_start_date()
+    run = (region_kind, start_date.date().isoformat(), data.version, get_settings())
+    with run_lock(region_kind):
+        connection = get_connection()
+        if connection.execute('SELECT 1 FROM runs WHERE region_kind = ? AND start_date = ? AND version = ? AND '
+                              'settings = ?', run).fetchone():
+            return None
+        start = time.perf_counter()
+        regions = 0
+        with timed('precompute_' + region_kind):
+            rows = get_rows(region_kind, data, start_date, run[3])
+            while True:
+                batch = [row for _, row in zip(range(WRITE_BATCH_SIZE), rows)]
+                if not batch:
+                    break
+                with connection:
+                    connection.executemany('INSERT OR REPLACE INTO figures VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                           batch)
+                regions += len(batch)
+        with connection:
+            connection.execute('INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?)',
+                               run + (regions, time.perf_counter() - start, time.time()))
+            old_runs = connection.execute('SELECT start_date, version, settings FROM runs WHERE region_kind = ? '
+                                          'ORDER BY finished DESC LIMIT -1 OFFSET ?', (region_kind, KEEP_RUNS))
+            for old_run in old_runs.fetchall():
+                connection.execute('DELETE FROM figures WHERE region_kind = ? AND start_date = ? AND version = ? '
+                                   'AND settings = ?', (region_kind,) + old_run)
+                connection.execute('DELETE FROM runs WHERE region_kind = ? AND start_date = ? AND version = ? AND '
+                                   'settings = ?', (region_kind,) + old_run)
+    return regions
+
+
+def schedule_precompute(region_kind, data):
+    """
+    starts precomputing the regions of a kind in a background thread, unless this process did already for the data
+    version, the current default start date and settings. Called by the callbacks and after refreshes, so a new data
+    version or a new day starts a new run. A failed run is logged once and not retried for the same run
+    :param region_kind: india, states or districts
+    :param data: data of the kind of regions
+    """
+    if not PRECOMPUTE:
+        return
+    start_date = get_default_start_date()
+    run = (region_kind, data.version, start_date, get_settings())
+    with started_lock:
+        if run in started_runs:
+            return
+        started_runs.add(run)
+
+    def run_precompute():
+        try:
+            regions = precompute(region_kind, data, start_date)
+            if regions is not None:
+                logger.info("precomputed %d %s regions of version %s", regions, region_kind, data.version)
+        except Exception:
+            # the run stays in started_runs, the callbacks compute the figures of its regions themselves
+            logger.exception("precomputing %s of version %s failed", region_kind, data.version)
+
+    threading.Thread(target=run_precompute, name='levitt-precompute-' + region_kind, daemon=True).start()
+
+
+def get_precomputed_figures(region_kind, region_id, start_date, version):
+    """
+    precomputed figures of a region, only the default start date is precomputed
+    :param region_kind: india, states or districts
+    :param region_id: id of the region
+    :param start_date: start date asked for
+    :param version: snapshot version of the data of the region
+    :return: json string of the list of three figure dicts, None if they are not precomputed
+    """
+    if not PRECOMPUTE or start_date != get_default_start_date():
+        return None
+    row = get_connection().execute('SELECT figures FROM figures WHERE region_kind = ? AND region_id = ? AND '
+                                   'start_date = ? AND version = ? AND settings = ?',
+                                   (region_kind, region_id, start_date.date().isoformat(), version,
+                                    get_settings())).fetchone()
+    increment('precomputed_lookups', kind=region_kind, result='miss' if row is None else 'hit')
+    if row is None:
+        return None
+    return zlib.decompress(row[0]).decode('utf-8')
+
+
+def get_precomputed_forecast(region_kind, region_id, start_date=None, version=None):
+    """
+    precomputed forecast of a region, without fitting it again
+    :param region_kind: india, states or districts
+    :param region_id: id of the region
+    :param start_date: start date of the fit, defaults to the default start date
+    :param version: snapshot version of the data of the region, defaults to the version currently in use
+    :return: PrecomputedForecast, None if it is not precomputed
+    """
+    start_date = start_date or get_default_start_date()
+    version = version or get_data(region_kind).version
+    row = get_connection().execute('SELECT n_points, slope, intercept, r_squared, crossing_day, crossing_date FROM '
+                                   'figures WHERE region_kind = ? AND region_id = ? AND start_date = ? AND '
+                                   'version = ? AND settings = ?',
+                                   (region_kind, region_id, start_date.date().isoformat(), version,
+                                    get_settings())).fetchone()
+    return None if row is None else PrecomputedForecast(*row)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute the default views of the dashboard")
+    parser.add_argument('--kinds', nargs='+', choices=region_kinds, default=region_kinds, help='kinds of regions')
+    args = parser.parse_args(argv)
+    for region_kind in args.kinds:
+        start = time.perf_counter()
+        regions = precompute(region_kind)
+        if regions is None:
+            print("%s: precomputed already" % region_kind)
+        else:
+            print("%s: %d regions in %.1f s" % (region_kind, regions, time.perf_counter() - start))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
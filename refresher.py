@@ -0,0 +1,143 @@
+"""
+Background refresher keeping the data sets of a running dashboard up to date without restarting the workers.
+
+Every LEVITT_REFRESH_INTERVAL seconds each data set is brought up to date: if another process already stored a newer
+snapshot it is loaded, otherwise one process (guarded by a lock file) sends conditional requests to the data source
+and stores a new snapshot only if the data changed. New versions are handed to the registered listeners, which build
+the new data and swap it in with a single assignment, so callbacks running at the same time keep their version.
+"""
+import os
+import logging
+import threading
+import contextlib
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from config import REFRESH_INTERVAL
+from metrics import timed, increment
+from data_source import DATASET_PATHS, get_snapshot_path, get_snapshot_version, loaded_versions, update_snapshot
+
+# functions called with the version and the appended rows of a new snapshot, for each data set
+listeners = {name: [] for name in DATASET_PATHS}
+
+logger = logging.getLogger(__name__)
+
+
+def add_listener(name, listener):
+    """
+    registers a function to be called when a new snapshot version of a data set is available
+    :param name: name of the data set
+    :param listener: function taking the new snapshot version and the dataframe of rows appended to the previous
+    version (None if the data set has to be loaded completely)
+    """
+    listeners[name].append(listener)
+
+
+def notify(name, version, df_new=None):
+    """
+    hands a new snapshot version of a data set to the listeners and marks it as loaded
+    :param name: name of the data set
+    :param version: new snapshot version
+    :param df_new: rows appended to the previous version, None if the data set has to be loaded completely
+    """
+    for listener in listeners[name]:
+        listener(version, df_new)
+    loaded_versions[name] = version
+
+
+@contextlib.contextmanager
+def refresh_lock(name, snapshot_dir=None):
+    """
+    non blocking lock, held by at most one process refreshing a data set at a time
+    :param name: name of the data set
+    :param snapshot_dir: snapshot directory, defaults to SNAPSHOT_DIR
+    :return: context manager yielding whether the lock was acquired
+    """
+    if fcntl is None:
+        yield True
+        return
+    with open(os.path.join(get_snapshot_path(name, snapshot_dir), 'refresh.lock'), 'a') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def refresh_dataset(name, source=None, snapshot_dir=None):
+    """
+    brings a data set of this process up to date
+    :param name: name of the data set
+    :param source: base url or local directory, defaults to DATA_SOURCE
+    :param snapshot_dir: snapshot directory, defaults to SNAPSHOT_DIR
+    :return: new snapshot version in use, None if the data set did not change
+    """
+    with timed('refresh_' + name):
+        with refresh_lock(name, snapshot_dir) as acquired:
+            version = get_snapshot_version(name, snapshot_dir)
+            if version != loaded_versions.get(name):
+                # another process stored a newer snapshot
+                notify(name, version)
+                increment('refreshes', dataset=name, result='loaded')
+                return version
+            if not acquired:
+                increment('refreshes', dataset=name, result='locked')
+                return None
+            result = update_snapshot(name, source, snapshot_dir)
+        if result is None:
+            increment('refreshes', dataset=name, result='unchanged')
+            return None
+        version, df_new = result
+        notify(name, version, df_new)
+        increment('refreshes', dataset=name, result='updated' if df_new is None else 'appended')
+        return version
+
+
+def refresh_all(source=None, snapshot_dir=None):
+    """
+    brings all data sets with listeners up to date, failures are logged and retried at the next refresh. Data sets
+    this process has not loaded yet are left out, they are loaded from the current snapshot on first use
+    :param source: base url or local directory, defaults to DATA_SOURCE
+    :param snapshot_dir: snapshot directory, defaults to SNAPSHOT_DIR
+    :return: dictionary to map names of the refreshed data sets to their new versions
+    """
+    versions = {}
+    for name in DATASET_PATHS:
+        if not listeners[name] or name not in loaded_versions:
+            continue
+        try:
+            version = refresh_dataset(name, source, snapshot_dir)
+        except Exception:
+            logger.exception("refreshing %s failed", name)
+            increment('refreshes', dataset=name, result='failed')
+            continue
+        if version is not None:
+            logger.info("%s refreshed to version %s", name, version)
+            versions[name] = version
+    return versions
+
+
+def start_refresher(interval=None, source=None, snapshot_dir=None):
+    """
+    starts the background refresher thread of this process
+    :param interval: seconds between two refreshes, defaults to REFRESH_INTERVAL
+    :param source: base url or local directory, defaults to DATA_SOURCE
+    :param snapshot_dir: snapshot directory, defaults to SNAPSHOT_DIR
+    :return: event that stops the refresher when set
+    """
+    interval = interval or REFRESH_INTERVAL
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            refresh_all(source, snapshot_dir)
+
+    threading.Thread(target=run, name='levitt-refresher', daemon=True).start()
+    return stop
@@ -0,0 +1,249 @@
+"""
+Derived data of the data sets (the typed India dataframe, the state arrays and the normalized districts table) shared
+by all worker processes. Enabled with LEVITT_SHARED_TABLES=1: the first process needing a snapshot version builds its
+derived data once and writes the arrays as .npy files to a versioned table directory, every process (including the
+builder) then memory maps them read-only. The pages are shared through the page cache of the operating system, so the
+memory does not grow with the number of workers. A refresh writes a new table version which the other workers attach
+to instead of building it again, old versions are deleted and stay valid for processes still mapping them.
+
+The tables can be built before the workers are started (e.g. before gunicorn or in a deploy step):
+    python shared_tables.py build
+"""
+import os
+import sys
+import json
+import shutil
+import logging
+import argparse
+import contextlib
+
+import numpy as np
+import pandas as pd
+
+from config import SNAPSHOT_DIR
+from data_source import get_snapshot_version, loaded_versions
+
+try:
+    import fcntl
+except ImportError:
+    # no locking between processes, concurrent builders build the same table and only the first one is kept
+    fcntl = None
+
+# whether the derived data is shared between processes through memory mapped table files
+SHARED_TABLES = os.environ.get('LEVITT_SHARED_TABLES', '0') not in ('', '0', 'false', 'False')
+
+# directory in which the tables are stored
+TABLE_DIR = os.environ.get('LEVITT_TABLE_DIR', os.path.join(SNAPSHOT_DIR, 'tables'))
+
+# version of the layout of the table files, tables of another layout are built again
+TABLE_FORMAT = 1
+
+logger = logging.getLogger(__name__)
+
+
+def get_table_path(name, version=None, table_dir=None):
+    """
+    directory of the tables of a data set, or of one table version
+    :param name: name of the data set
+    :param version: snapshot version the table was built from
+    :param table_dir: table directory, defaults to TABLE_DIR
+    :return: path of the directory
+    """
+    path = os.path.join(table_dir or TABLE_DIR, name)
+    return os.path.join(path, version) if version else path
+
+
+def get_frame_blocks(df):
+    """
+    splits a dataframe into the arrays stored for it: the columns of each numpy dtype as one 2-D array (column x row)
+    and the codes and categories of each categorical column, so that it can be put together again without copying
+    :param df: dataframe with numeric, datetime and categorical columns
+    :return: list of block description (columns and whether it is categorical) and list of arrays of the blocks
+    """
+    blocks, arrays, block_index = [], [], {}
+    for column in df.columns:
+        values = df[column].values
+        if isinstance(values, pd.Categorical):
+            blocks.append({'columns': [column], 'categorical': True})
+            arrays.append([values.codes, np.asarray(values.categories.astype(str), dtype=str)])
+        elif isinstance(values, np.ndarray) and values.dtype.kind in 'biufmM':
+            if values.dtype.str not in block_index:
+                block_index[values.dtype.str] = len(blocks)
+                blocks.append({'columns': [], 'categorical': False})
+                arrays.append([])
+            i = block_index[values.dtype.str]
+            blocks[i]['columns'].append(column)
+            arrays[i].append(values)
+        else:
+            raise ValueError("column %s of type %s cannot be stored in a table" % (column, values.dtype))
+    arrays = [block_arrays if block['categorical'] else [np.stack(block_arrays)]
+              for block, block_arrays in zip(blocks, arrays)]
+    return blocks, arrays
+
+
+def get_block_frame(blocks, arrays):
+    """
+    dataframe of the arrays of get_frame_blocks, the columns are views of the arrays
+    :param blocks: list of block descriptions
+    :param arrays: list of arrays of the blocks
+    :return: dataframe
+    """
+    frames = []
+    for block, block_arrays in zip(blocks, arrays):
+        if block['categorical']:
+            values = pd.Categorical.from_codes(block_arrays[0], block_arrays[1])
+            frames.append(pd.DataFrame({block['columns'][0]: values}, copy=False))
+        else:
+            frames.append(pd.DataFrame(block_arrays[0].T, columns=block['columns'], copy=False))
+    return pd.concat(frames, axis=1, copy=False)
+
+
+def save_table(name, version, arrays=None, frames=None, table_dir=None):
+    """
+    writes a table version: arrays and dataframes as .npy files and their layout as meta.json. The files are written
+    to a temporary directory which is renamed to the version at the end, if the version exists already (written by
+    another process) it is kept
+    :param name: name of the data set
+    :param version: snapshot version the table is built from
+    :param arrays: dictionary of numpy arrays
+    :param frames: dictionary of dataframes
+    :param table_dir: table directory, defaults to TABLE_DIR
+    """
+    path = get_table_path(name, version, table_dir)
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    os.makedirs(tmp_path)
+    try:
+        meta = {'format': TABLE_FORMAT, 'version': version, 'arrays': sorted(arrays or {}), 'frames': {}}
+        for key, values in (arrays or {}).items():
+            np.save(os.path.join(tmp_path, '%s.npy' % key), values)
+        for key, df in (frames or {}).items():
+            blocks, block_arrays = get_frame_blocks(df)
+            meta['frames'][key] = blocks
+            for i, values_list in enumerate(block_arrays):
+                for j, values in enumerate(values_list):
+                    np.save(os.path.join(tmp_path, '%s.%d.%d.npy' % (key, i, j)), values)
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        os.rename(tmp_path, path)
+    except OSError:
+        if not os.path.isdir(path):
+            raise
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    remove_old_tables(name, table_dir)
+
+
+def load_table(name, version, table_dir=None):
+    """
+    memory maps a table version read-only
+    :param name: name of the data set
+    :param version: snapshot version the table was built from
+    :param table_dir: table directory, defaults to TABLE_DIR
+    :return: dictionary of arrays and dictionary of dataframes, None if the table does not exist or has another format
+    """
+    path = get_table_path(name, version, table_dir)
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('format') != TABLE_FORMAT:
+        return None
+    arrays = {key: np.load(os.path.join(path, '%s.npy' % key), mmap_mode='r') for key in meta['arrays']}
+    frames = {}
+    for key, blocks in meta['frames'].items():
+        block_arrays = [[np.load(os.path.join(path, '%s.%d.%d.npy' % (key, i, j)), mmap_mode='r')
+                         for j in range(2 if block['categorical'] else 1)] for i, block in enumerate(blocks)]
+        frames[key] = get_block_frame(blocks, block_arrays)
+    return arrays, frames
+
+
+def remove_old_tables(name, table_dir=None, keep=2):
+    """
+    deletes all but the most recent table versions of a data set, processes mapping a deleted version keep their
+    mapping
+    :param name: name of the data set
+    :param table_dir: table directory, defaults to TABLE_DIR
+    :param keep: number of versions to keep
+    """
+    path = get_table_path(name, table_dir=table_dir)
+    versions = sorted(entry for entry in os.listdir(path)
+                      if not entry.endswith('.tmp') and os.path.isdir(os.path.join(path, entry)))
+    for version in versions[:-keep]:
+        shutil.rmtree(os.path.join(path, version), ignore_errors=True)
+
+
+@contextlib.contextmanager
+def build_lock(name, table_dir=None):
+    """
+    lock between processes held while a table of a data set is built, so that it is built only once
+    :param name: name of the data set
+    :param table_dir: table directory, defaults to TABLE_DIR
+    """
+    path = get_table_path(name, table_dir=table_dir)
+    os.makedirs(path, exist_ok=True)
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(path, 'lock'), 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def load_shared(name, version, build, to_table, from_table, shared=None):
+    """
+    derived data of a snapshot version of a data set, taken from the shared table of the version if it exists,
+    otherwise built, written as table and mapped. If not shared the data is built in the process
+    :param name: name of the data set
+    :param version: snapshot version, None for the current snapshot
+    :param build: function building the data of a snapshot version (None for the current snapshot), the data has a
+    version attribute
+    :param to_table: function returning the dictionary of arrays and the dictionary of dataframes of the data
+    :param from_table: function building the data from the version, the arrays and the dataframes of a table
+    :param shared: whether the data is shared through a table, defaults to SHARED_TABLES
+    :return: data of the snapshot version
+    """
+    if not (SHARED_TABLES if shared is None else shared):
+        return build(version)
+    current = version is None
+    version = version or get_snapshot_version(name)
+    table = load_table(name, version) if version else None
+    if table is None:
+        with build_lock(name):
+            table = load_table(name, version) if version else None
+            if table is None:
+                data = build(version)
+                version = data.version
+                try:
+                    save_table(name, version, *to_table(data))
+                    table = load_table(name, version)
+                except (OSError, ValueError):
+                    logger.exception("sharing the %s table failed, the data is kept in the process", name)
+                if table is None:
+                    return data
+    if current:
+        loaded_versions[name] = version
+    return from_table(version, *table)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the shared tables of the current snapshots")
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('build', help='build the tables of all data sets, fetching snapshots if there are none')
+    args = parser.parse_args(argv)
+    if args.command != 'build':
+        parser.print_help()
+        return 1
+    from india.helper import load_in_data
+    from states.helper import load_state_data
+    from districts.helper import load_district_data
+    for name, load in (('india', load_in_data), ('states', load_state_data), ('districts', load_district_data)):
+        print("%s: table of version %s" % (name, load(shared=True).version))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,27 @@
-import requests
+import threading
+from collections import namedtuple
+
+import numpy as np
 import pandas as pd
 
+from data_source import get_dataset_frame, load_snapshot, loaded_versions
+from metrics import timed
+from shared_tables import load_shared
+
 # state codes, since Covid 19 state time series data has states codes
 state_codes = ["an", "ap", "ar", "as", "br", "ch", "ct", "dd", "dl", "dn", "ga", "gj", "hp", "hr", "jh", "jk", "ka",
                "kl", "la", "ld", "mh", "ml",
                "mn", "mp", "mz", "nl", "or", "pb", "py", "rj", "sk", "tg", "tn", "tr", "tt", "un", "up", "ut", "wb"]
 
+# dictionary to map state codes to their position in the last axis of the state arrays
+state_code_index = {state_code: i for i, state_code in enumerate(state_codes)}
+
+# format of the dates of the states time series, e.g. 14-Mar-20
+date_format = '%d-%b-%y'
+
+# statuses of the daily cases, in the order of the first axis of the state arrays
+statuses = ['Confirmed', 'Recovered', 'Deceased']
+
 # dictionary to map state names to state codes
 state_code_dict = {'Maharashtra': 'mh', 'Gujrat': 'gj', 'Goa': 'ga', 'Tamil Nadu': 'tn', 'Punjab': 'pb',
                    'Rajasthan': 'rj', 'Madhya Pradesh': 'mp', 'Uttar Pradesh': 'up',
@@ -20,46 +36,124 @@ state_code_dict = {'Maharashtra': 'mh', 'Gujrat': 'gj', 'Goa': 'ga', 'Tamil Nadu
 # dictionary to map state codes to state names
 reverse_state_code_dict = {state_code: state_name for state_name, state_code in state_code_dict.items()}
 
-# get data from api and store it in dataframe
-url = 'https://api.covid19india.org/states_daily.json'
-req = requests.get(url)
-dict_req = req.json()
-df_all_states = pd.DataFrame(dict_req['states_daily'])
-df_all_states['date'] = pd.to_datetime(df_all_states['date'])
+# precomputed data of all states: snapshot version, dates, daily cases (status x date x state code), cumulative
+# confirmed and active cases (date x state code)
+StateData = namedtuple('StateData', ['version', 'dates', 'daily', 'cum_confirmed', 'active'])
 
 
-def get_confirmed_recovered_deceased(df, state_code):
+def build_state_matrix(df):
     """
-    get the daily confirmed, recovered and deceased cases for a state
-    :param df: unstructured dataframe of a state containing date and daily confirmed, recovered, deceased cases
-    in three rows
-    :param state_code: two letter code associated with each state
-    :return: three dataframes containing daily confirmed, recovered, deceased cases of a state
+    reshapes the states data into a dense array of daily cases with axes status x date x state code (the dates of
+    each status and state are contiguous in memory) and computes cumulative confirmed and active cases of all states
+    at once
+    :param df: unstructured dataframe of all states containing date, status and daily cases of each state code, with
+    daily confirmed, recovered and deceased cases of a date in three rows
+    :return: dates, daily cases array (status x date x state code), cumulative confirmed cases array and active cases
+    array (date x state code)
+    """
+    rows = [df[df['status'] == status] for status in statuses]
+    dates = rows[0]['date'].values
+    daily = np.full((len(statuses), len(state_codes), len(dates)), np.nan).transpose(0, 2, 1)
+    for i, df_status in enumerate(rows):
+        values = df_status.reindex(columns=state_codes).astype(np.float64).values[:len(dates)]
+        daily[i, :len(values)] = values
+    # cumulative sums skip missing days like pandas cumsum does
+    cumulative = np.nancumsum(daily, axis=1)
+    cumulative[np.isnan(daily)] = np.nan
+    active = cumulative[0] - (cumulative[1] + cumulative[2])
+    return dates, daily, cumulative[0], active
+
+
+def build_state_data(version=None):
+    """
+    loads a snapshot of the states data and precomputes the arrays of all states
+    :param version: snapshot version to load, defaults to the current snapshot (fetched from the data source if there
+    is none)
+    :return: StateData of the snapshot
+    """
+    if version is None:
+        df_all_states = get_dataset_frame('states')
+        version = loaded_versions['states']
+    else:
+        df_all_states = load_snapshot('states', version=version)
+    df_all_states['date'] = pd.to_datetime(df_all_states['date'], format=date_format)
+    return StateData(version, *build_state_matrix(df_all_states))
+
+
+def get_state_table(data):
+    """
+    arrays of the states data stored in its shared table, the daily cases are stored with the dates of each status
+    and state contiguous like they are built
+    :param data: StateData
+    :return: dictionary of arrays and (empty) dictionary of dataframes
+    """
+    return {'dates': data.dates, 'daily': data.daily.transpose(0, 2, 1), 'cum_confirmed': data.cum_confirmed,
+            'active': data.active}, {}
+
+
+def load_state_data(version=None, shared=None):
+    """
+    states data of a snapshot, built in the process or attached from the shared table (see shared_tables.py)
+    :param version: snapshot version to load, defaults to the current snapshot
+    :param shared: whether the data is shared through a table, defaults to LEVITT_SHARED_TABLES
+    :return: StateData of the snapshot
+    """
+    with timed('load_states'):
+        return load_shared('states', version, build_state_data, get_state_table,
+                           lambda version, arrays, frames: StateData(version, arrays['dates'],
+                                                                     arrays['daily'].transpose(0, 2, 1),
+                                                                     arrays['cum_confirmed'], arrays['active']),
+                           shared)
+
+
+# precomputed data of all states of the loaded snapshot, loaded on first use
+state_data = None
+
+# guards the loading of the states data
+load_lock = threading.Lock()
+
+
+def get_state_data():
+    """
+    states data currently in use, callbacks take it once so that they work on one consistent version
+    :return: StateData of the current snapshot version
+    """
+    global state_data
+    if state_data is None:
+        with load_lock:
+            if state_data is None:
+                state_data = load_state_data()
+    return state_data
+
+
+def update_state_data(version, df_new=None):
+    """
+    swaps in a new snapshot version of the states data
+    :param version: snapshot version to load
+    :param df_new: rows appended to the previous version, unused as the states data is always loaded completely
+    """
+    global state_data
+    with load_lock:
+        state_data = load_state_data(version)
+
+
+def get_state_options():
+    """
+    options of the dropdown menu of states
+    :return: list of label (state name) and value (state code) dictionaries
     """
-    con = df[df['status'] == 'Confirmed'][['date', state_code]]
-    con.columns = ['date', 'confirmed']
-    rec = df[df['status'] == 'Recovered'][[state_code]]
-    rec.columns = ['recovered']
-    dec = df[df['status'] == 'Deceased'][[state_code]]
-    dec.columns = ['deceased']
-    return con, rec, dec
+    return [{'label': state, 'value': state_code} for state, state_code in state_code_dict.items()]
 
 
-def get_state_df(state_code):
+def get_state_df(state_code, data=None):
     """
-    creates dataframe for a state containing required parameters
+    creates dataframe for a state containing required parameters from the precomputed state arrays
     :param state_code: two letter code associated with each state
+    :param data: StateData to use, defaults to the data currently in use
     :return: structured dataframe for a state
     """
-    df_state = df_all_states[['date', state_code, 'status']].copy()
-    con, rec, dec = get_confirmed_recovered_deceased(df_state, state_code)
-    df_state_daily = pd.concat([con.reset_index(drop=True), rec.reset_index(drop=True), dec.reset_index(drop=True)],
-                               axis=1)
-    df_state_daily = df_state_daily.copy()
-    df_state_daily['confirmed'] = pd.to_numeric(df_state_daily['confirmed'])
-    df_state_daily['recovered'] = pd.to_numeric(df_state_daily['recovered'])
-    df_state_daily['deceased'] = pd.to_numeric(df_state_daily['deceased'])
-    df_state_daily['cum_confirmed'] = df_state_daily['confirmed'].cumsum()
-    df_state_daily['active'] = df_state_daily['cum_confirmed'] - (
-            df_state_daily['recovered'].cumsum() + df_state_daily['deceased'].cumsum())
-    return df_state_daily
+    data = data or get_state_data()
+    i = state_code_index[state_code]
+    return pd.DataFrame({'date': data.dates, 'confirmed': data.daily[0, :, i], 'recovered': data.daily[1, :, i],
+                         'deceased': data.daily[2, :, i], 'cum_confirmed': data.cum_confirmed[:, i],
+                         'active': data.active[:, i]})
@@ -0,0 +1,68 @@
+import os
+import sys
+import shutil
+import tempfile
+
+import pytest
+
+# the modules of the dashboard are imported from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# synthetic data sets in the layout of the api, the data source of the dashboard in the tests. The settings are read
+# when the modules are imported, so they are set before any module of the dashboard is imported
+DATA_DIR = tempfile.mkdtemp(prefix='levitt-tests-')
+os.environ['LEVITT_DATA_SOURCE'] = os.path.join(DATA_DIR, 'source')
+os.environ['LEVITT_SNAPSHOT_DIR'] = os.path.join(DATA_DIR, 'snapshots')
+os.environ['LEVITT_EXPORT'] = '1'
+
+# days and districts of the synthetic data sets
+N_DAYS = 120
+N_DISTRICTS = 30
+
+from benchmarks.synthetic_data import write_synthetic_data  # noqa: E402
+from tools.standin_server import start_standin_server  # noqa: E402
+
+write_synthetic_data(os.environ['LEVITT_DATA_SOURCE'], N_DAYS, N_DISTRICTS)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def source_dir(tmp_path):
+    """
+    copy of the synthetic data sets, for tests changing the data source
+    """
+    path = str(tmp_path / 'source')
+    shutil.copytree(os.environ['LEVITT_DATA_SOURCE'], path)
+    return path
+
+
+@pytest.fixture
+def standin(source_dir):
+    """
+    stand-in server of the api on a free port, serving the copy of the synthetic data sets
+    """
+    server = start_standin_server(source_dir)
+    server.url = 'http://localhost:%d' % server.server_port
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path, monkeypatch):
+    """
+    empty snapshot directory used by default while the test runs, the data sets loaded by the process are restored
+    afterwards
+    """
+    import data_source
+    import manifest
+    path = str(tmp_path / 'snapshots')
+    monkeypatch.setattr(data_source, 'SNAPSHOT_DIR', path)
+    monkeypatch.setattr(manifest, 'SNAPSHOT_DIR', path)
+    loaded_versions = dict(data_source.loaded_versions)
+    yield path
+    data_source.loaded_versions.clear()
+    data_source.loaded_versions.update(loaded_versions)
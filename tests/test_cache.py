@@ -0,0 +1,118 @@
+import sqlite3
+import datetime as dt
+
+import pytest
+
+import cache
+import main
+from cache import cache_get, cache_set, cached, get_cache_stats, get_connection
+from india.helper import get_in_data
+
+
+class Clock(object):
+    """
+    clock of the cache, set by the tests
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(tmp_path, monkeypatch):
+    """
+    empty cache in a temporary database, timed by a clock set by the test
+    """
+    clock = Clock()
+    monkeypatch.setattr(cache, 'CACHE_PATH', str(tmp_path / 'cache.sqlite3'))
+    monkeypatch.setattr(cache, 'CACHE_SIZE', 3)
+    monkeypatch.setattr(cache, 'time', clock)
+    monkeypatch.setattr(cache._local, 'connection', None, raising=False)
+    cache.clear_cache()
+    return clock
+
+
+def get_last_used(key):
+    return get_connection().execute('SELECT last_used FROM results WHERE key = ?', (key,)).fetchone()[0]
+
+
+def test_keys_change_with_version_and_fit_method(clock, monkeypatch):
+    data = get_in_data()
+    calls = []
+
+    def get_df():
+        calls.append(1)
+        return data.df
+
+    def get_figures(version):
+        return main.get_figures('india', 'in', 'India', dt.datetime(2020, 4, 1), version, get_df, 'dailyconfirmed',
+                                'active')
+
+    figures = get_figures(data.version)
+    assert get_figures(data.version) == figures
+    assert len(calls) == 1
+    get_figures('other version')
+    assert len(calls) == 2
+    monkeypatch.setattr(main, 'FIT_METHOD', 'theil_sen')
+    get_figures(data.version)
+    assert len(calls) == 3
+    get_figures(data.version)
+    assert len(calls) == 3
+
+
+def test_least_recently_used_results_are_evicted(clock, monkeypatch):
+    monkeypatch.setattr(cache, 'TOUCH_INTERVAL', 0)
+    for key in ('a', 'b', 'c'):
+        clock.now += 1
+        cache_set(key, key.upper())
+    clock.now += 1
+    assert cache_get('a') == 'A'
+    clock.now += 1
+    cache_set('d', 'D')
+    assert cache_get('b') is None
+    assert [cache_get(key) for key in ('a', 'c', 'd')] == ['A', 'C', 'D']
+    stats = get_cache_stats()
+    assert stats['entries'] == 3
+    assert stats['evictions'] == 1
+
+
+def test_last_use_is_written_after_touch_interval(clock):
+    cache_set('a', 1)
+    clock.now += cache.TOUCH_INTERVAL / 2
+    assert cache_get('a') == 1
+    assert get_last_used('a') == 1000.0
+    clock.now += cache.TOUCH_INTERVAL
+    assert cache_get('a') == 1
+    assert get_last_used('a') == clock.now
+
+
+def test_corrupt_database_computes_results(clock, tmp_path, monkeypatch, caplog):
+    path = tmp_path / 'corrupt.sqlite3'
+    path.write_bytes(b'not a database' * 100)
+    monkeypatch.setattr(cache, 'CACHE_PATH', str(path))
+    monkeypatch.setattr(cache._local, 'connection', None)
+    assert cached('a', lambda: 1) == 1
+    assert 'results cache lookup failed' in caplog.text
+
+
+def test_locked_database_computes_results(clock, monkeypatch, caplog):
+    monkeypatch.setattr(cache, 'BUSY_TIMEOUT', 0)
+    monkeypatch.setattr(cache._local, 'connection', None)
+    cache_set('a', 1)
+    clock.now += cache.TOUCH_INTERVAL + 1
+    # another process writes to the database
+    writer = sqlite3.connect(cache.CACHE_PATH, isolation_level=None)
+    writer.execute('BEGIN IMMEDIATE')
+    try:
+        # the last use is not written, the hit does not wait for the writer
+        assert cached('a', lambda: 2) == 1
+        assert cached('b', lambda: 2) == 2
+        assert 'results cache store failed' in caplog.text
+    finally:
+        writer.execute('ROLLBACK')
+        writer.close()
+    assert get_last_used('a') == 1000.0
+    assert cache_get('b') is None
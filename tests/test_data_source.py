@@ -0,0 +1,81 @@
+import os
+import time
+
+import pandas as pd
+import pytest
+import requests
+
+import data_source
+from data_source import DATASET_PATHS, fetch_payload, fetch_snapshots, load_snapshot, parse_payload
+
+
+@pytest.fixture
+def session(monkeypatch):
+    """
+    new session of the data source layer, retried requests are not delayed
+    """
+    monkeypatch.setattr(data_source, 'session', None)
+    monkeypatch.setattr(data_source, 'RETRY_BACKOFF', 0)
+    return data_source.get_session()
+
+
+def read_payload(source_dir, name):
+    with open(os.path.join(source_dir, DATASET_PATHS[name]), 'rb') as f:
+        return f.read()
+
+
+def test_failed_requests_are_retried(standin, session):
+    standin.failures = 2
+    content, _, partial = fetch_payload('india', standin.url)
+    assert content == read_payload(standin.directory, 'india')
+    assert not partial
+    assert standin.request_counts['/' + DATASET_PATHS['india']] == 3
+
+
+def test_failing_source_raises(standin, session):
+    standin.failures = data_source.REQUEST_RETRIES + 1
+    with pytest.raises(requests.HTTPError):
+        fetch_payload('india', standin.url)
+    assert standin.request_counts['/' + DATASET_PATHS['india']] == data_source.REQUEST_RETRIES + 1
+
+
+def test_conditional_fetch(standin):
+    content, validators, _ = fetch_payload('states', standin.url)
+    assert validators['etag'] and validators['last_modified']
+    assert fetch_payload('states', standin.url, validators) == (None, validators, False)
+    assert fetch_payload('states', standin.url, {'last_modified': validators['last_modified']})[0] is None
+    # a changed payload is fetched again
+    path = os.path.join(standin.directory, DATASET_PATHS['states'])
+    with open(path, 'ab') as f:
+        f.write(b' ')
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+    new_content, new_validators, _ = fetch_payload('states', standin.url, validators)
+    assert new_content == content + b' '
+    assert new_validators['etag'] != validators['etag']
+    assert fetch_payload('states', standin.url, {'last_modified': validators['last_modified']})[0] == new_content
+
+
+def test_range_fetch(standin):
+    content = read_payload(standin.directory, 'districts')
+    assert fetch_payload('districts', standin.url, offset=1000)[::2] == (content[1000:], True)
+    # an offset after the end of the payload gives the complete payload
+    assert fetch_payload('districts', standin.url, offset=len(content) + 1)[::2] == (content, False)
+
+
+def test_concurrent_fetch(standin, snapshot_dir):
+    standin.delay = 0.5
+    start = time.time()
+    futures = fetch_snapshots(None, standin.url, snapshot_dir)
+    # data sets being fetched are not fetched again
+    assert fetch_snapshots(['districts'], standin.url, snapshot_dir)['districts'] is futures['districts']
+    results = {name: future.result() for name, future in futures.items()}
+    assert time.time() - start < 0.5 * len(DATASET_PATHS)
+    assert sorted(results) == sorted(DATASET_PATHS)
+    for name, (df, version) in results.items():
+        assert sum(count for path, count in standin.request_counts.items() if path.endswith(DATASET_PATHS[name])) == 1
+        df_source = parse_payload(name, read_payload(standin.directory, name))
+        pd.testing.assert_frame_equal(df, df_source)
+        # the text columns of the csv data set are read as categoricals, those of the json data sets as strings
+        df_snapshot = load_snapshot(name, snapshot_dir, categorical=name == 'districts', version=version)
+        pd.testing.assert_frame_equal(df_snapshot, df_source, check_dtype=False)
@@ -0,0 +1,63 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_source import DATASET_PATHS, parse_payload
+from districts.helper import build_district_data, get_district_df
+
+# columns of the dataframe of a district
+district_columns = ['Date', 'State', 'District', 'Confirmed', 'Recovered', 'Deceased', 'Active', 'New']
+
+
+@pytest.fixture(scope='module')
+def districts_path():
+    return os.path.join(os.environ['LEVITT_DATA_SOURCE'], DATASET_PATHS['districts'])
+
+
+@pytest.fixture(scope='module')
+def df_all_districts(districts_path):
+    return pd.read_csv(districts_path)
+
+
+@pytest.fixture(scope='module')
+def district_data(districts_path):
+    with open(districts_path, 'rb') as f:
+        return build_district_data(parse_payload('districts', f.read()), 'test')
+
+
+def get_baseline_district_df(df_all_districts, district):
+    """
+    dataframe of a district selected with a boolean mask, like the dashboard did before the districts data was
+    normalized once
+    """
+    df_district = df_all_districts[df_all_districts['District'] == district].copy()
+    for column in ('Confirmed', 'Recovered', 'Deceased'):
+        df_district[column] = pd.to_numeric(df_district[column])
+    df_district['Active'] = df_district['Confirmed'] - (df_district['Recovered'] + df_district['Deceased'])
+    df_district = df_district.assign(New=df_district['Confirmed'].diff().fillna(df_district['Confirmed']).values)
+    df_district['New'] = pd.to_numeric(df_district['New'])
+    df_district['Date'] = pd.to_datetime(df_district['Date'])
+    df_district = df_district[1:-1]
+    return df_district.reset_index(drop=True)
+
+
+def test_district_df_matches_boolean_mask(df_all_districts, district_data):
+    names = sorted(df_all_districts['District'].unique())
+    for district in [names[0], names[1], 'Mumbai', names[len(names) // 2], names[-1]]:
+        df_district = get_district_df(district, district_data)
+        df_baseline = get_baseline_district_df(df_all_districts, district)
+        assert len(df_district) == len(df_baseline) > 0
+        assert (df_district['Date'].values == df_baseline['Date'].values).all()
+        for column in ('State', 'District'):
+            assert list(df_district[column]) == list(df_baseline[column])
+        for column in ('Confirmed', 'Recovered', 'Deceased', 'Active', 'New'):
+            np.testing.assert_array_equal(df_district[column].values.astype(np.float64),
+                                          df_baseline[column].values.astype(np.float64))
+
+
+def test_unknown_district_is_empty(district_data):
+    df_district = get_district_df('Nowhere', district_data)
+    assert len(df_district) == 0
+    assert set(district_columns) <= set(df_district.columns)
@@ -0,0 +1,64 @@
+import io
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+from levitt import get_data_for_graph_with_regression_line
+from states.helper import get_state_data, get_state_df
+
+SERIES_URL = '/export/series.csv?kind=states&regions=mh,dl&start=2020-03-15'
+
+
+@pytest.fixture(scope='module')
+def client():
+    return main.app.server.test_client()
+
+
+def test_export_has_etag(client):
+    response = client.get(SERIES_URL)
+    assert response.status_code == 200
+    assert response.headers['ETag']
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['Content-Type'].startswith('text/csv')
+    assert int(response.headers['Content-Length']) == len(response.data)
+
+
+def test_repeated_export_is_not_modified(client):
+    etag = client.get(SERIES_URL).headers['ETag']
+    response = client.get(SERIES_URL, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert client.get(SERIES_URL, headers={'If-None-Match': '"other"'}).status_code == 200
+
+
+def test_export_byte_range(client):
+    content = client.get(SERIES_URL).data
+    response = client.get(SERIES_URL, headers={'Range': 'bytes=100-'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == 'bytes 100-%d/%d' % (len(content) - 1, len(content))
+    assert response.data == content[100:]
+    response = client.get(SERIES_URL, headers={'Range': 'bytes=0-9'})
+    assert response.status_code == 206
+    assert response.data == content[:10]
+
+
+def test_export_series_matches_regression_line(client):
+    df = pd.read_csv(io.BytesIO(client.get(SERIES_URL).data), parse_dates=['date'])
+    assert list(df['region_id'].unique()) == ['mh', 'dl']
+    for state_code in ('mh', 'dl'):
+        df_export = df[df['region_id'] == state_code].reset_index(drop=True)
+        df_levitt, _, model, _, _ = get_data_for_graph_with_regression_line(
+            get_state_df(state_code, get_state_data()), dt.datetime(2020, 3, 15))
+        assert (df_export['date'].values == df_levitt['date'].values).all()
+        np.testing.assert_allclose(df_export['cum_confirmed'], df_levitt['cum_confirmed'])
+        np.testing.assert_allclose(df_export['levitt_measure'], df_levitt['LevittMeasure'], rtol=1e-12)
+        np.testing.assert_allclose(df_export['fitted'], model(df_levitt['day_count']), rtol=1e-9)
+
+
+def test_export_bad_arguments(client):
+    assert client.get('/export/series.csv?kind=states&regions=xx').status_code == 400
+    assert client.get('/export/series.csv?start=2020-13-01').status_code == 400
+    assert client.get('/export/other.csv').status_code == 404
@@ -0,0 +1,134 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from levitt import (H_THRESHOLD, get_levitt_measure, get_r_squared, get_sums, add_day, fit_sums, fit_theil_sen,
+                    get_crossing, fit_levitt, fit_levitt_windows, get_data_for_graph_with_regression_line, LevittSums)
+
+
+def get_cum_confirmed(n_days, seed=0):
+    """
+    cumulative confirmed cases growing slower every day, like the data the dashboard fits
+    :param n_days: number of days
+    :param seed: seed of the noise of the daily cases
+    :return: float array
+    """
+    rng = np.random.RandomState(seed)
+    daily = np.maximum(1000 * np.exp(-np.arange(n_days) / 60.0) * rng.uniform(0.8, 1.2, n_days), 0)
+    return 1000 + np.cumsum(np.round(daily))
+
+
+def test_fit_sums_matches_polyfit():
+    x = np.arange(1, 40, dtype=np.float64)
+    y = 1.05 - 0.001 * x + np.random.RandomState(1).normal(0, 0.002, len(x))
+    slope, intercept, r_squared = fit_sums(get_sums(x, y))
+    expected_slope, expected_intercept = np.polyfit(x, y, 1)
+    assert slope == pytest.approx(expected_slope, rel=1e-9)
+    assert intercept == pytest.approx(expected_intercept, rel=1e-12)
+    assert r_squared == pytest.approx(get_r_squared(y, expected_slope * x + expected_intercept), rel=1e-9)
+
+
+def test_add_day_matches_get_sums():
+    x = np.arange(1, 20, dtype=np.float64)
+    y = 1 + 0.01 / x
+    sums = LevittSums(0, 0, 0, 0, 0, 0)
+    for day, value in zip(x, y):
+        sums = add_day(sums, day, value)
+    sums = add_day(sums, 20, np.nan)
+    np.testing.assert_allclose(sums, get_sums(x, y), rtol=1e-12)
+
+
+@pytest.mark.parametrize('n_points', [0, 1])
+def test_fit_sums_less_than_two_points(n_points):
+    x = np.arange(1, n_points + 1, dtype=np.float64)
+    slope, intercept, r_squared = fit_sums(get_sums(x, np.full(n_points, 1.01)))
+    assert np.isnan(slope) and np.isnan(intercept) and np.isnan(r_squared)
+
+
+def test_fit_sums_constant_series():
+    x = np.arange(1, 10, dtype=np.float64)
+    slope, intercept, r_squared = fit_sums(get_sums(x, np.full(len(x), 1.01)))
+    assert slope == pytest.approx(0, abs=1e-15)
+    assert intercept == pytest.approx(1.01)
+    assert r_squared == 1
+
+
+def test_fit_theil_sen_ignores_outlier():
+    x = np.arange(1, 30, dtype=np.float64)
+    y = 1.05 - 0.001 * x
+    y[10] += 0.5
+    slope, intercept, r_squared = fit_theil_sen(x, y)
+    assert slope == pytest.approx(-0.001)
+    assert intercept == pytest.approx(1.05)
+    assert isinstance(r_squared, np.float64)
+
+
+@pytest.mark.parametrize('n_points', [0, 1])
+def test_fit_theil_sen_less_than_two_points(n_points):
+    x = np.arange(1, n_points + 1, dtype=np.float64)
+    fit = fit_theil_sen(x, np.full(n_points, 1.01))
+    assert all(isinstance(value, np.float64) and np.isnan(value) for value in fit)
+
+
+def test_get_crossing():
+    slope = np.array([-0.001, 0.001, -0.001, np.nan, 0.0])
+    intercept = np.array([1.0501, 1.05, 1.0501, np.nan, 1.05])
+    r_squared = np.array([0.9, 0.9, 0.05, np.nan, 1.0])
+    required_day, extrapolate, crossing_day = get_crossing(slope, intercept, r_squared)
+    assert required_day[0] == pytest.approx((H_THRESHOLD - 1.0501) / -0.001)
+    assert extrapolate.tolist() == [True, False, False, False, False]
+    assert crossing_day[0] == np.ceil(required_day[0])
+    assert np.isnan(crossing_day[1:]).all()
+
+
+@pytest.mark.parametrize('method', ['least_squares', 'theil_sen'])
+@pytest.mark.parametrize('n_days', [0, 1, 2])
+def test_fit_levitt_short_series(method, n_days):
+    fit = fit_levitt(get_cum_confirmed(n_days), method)
+    assert fit.n_points == max(n_days - 1, 0)
+    assert np.isnan(fit.slope) and np.isnan(fit.required_day)
+    assert not fit.extrapolate and fit.crossing_day is None
+
+
+@pytest.mark.parametrize('method', ['least_squares', 'theil_sen'])
+def test_fit_levitt(method):
+    cum_confirmed = get_cum_confirmed(60)
+    fit = fit_levitt(cum_confirmed, method)
+    levitt_measure = get_levitt_measure(cum_confirmed)
+    assert np.isnan(fit.levitt_measure[0])
+    np.testing.assert_allclose(fit.levitt_measure[1:], cum_confirmed[1:] / cum_confirmed[:-1])
+    assert fit.n_points == 59
+    assert fit.slope < 0 and fit.extrapolate
+    assert fit.crossing_day == int(np.ceil(fit.required_day))
+    if method == 'least_squares':
+        expected_slope, expected_intercept = np.polyfit(np.arange(1, 60), levitt_measure[1:], 1)
+        assert fit.slope == pytest.approx(expected_slope, rel=1e-9)
+        assert fit.intercept == pytest.approx(expected_intercept, rel=1e-12)
+
+
+@pytest.mark.parametrize('method', ['least_squares', 'theil_sen'])
+def test_fit_levitt_windows_matches_fit_levitt(method):
+    cum_confirmed = get_cum_confirmed(300)
+    # long windows, short windows late in the series, and windows of one and no row
+    start = np.array([0, 100, 280, 295, 298, 299, 120])
+    end = np.array([300, 300, 300, 300, 299, 300, 120])
+    windows = fit_levitt_windows(cum_confirmed, start, end, method)
+    for i, (first, last) in enumerate(zip(start, end)):
+        fit = fit_levitt(cum_confirmed[first:last], method)
+        assert windows.n_points[i] == fit.n_points
+        np.testing.assert_allclose([windows.slope[i], windows.intercept[i], windows.r_squared[i]],
+                                   [fit.slope, fit.intercept, fit.r_squared], rtol=1e-6, atol=1e-12)
+        assert bool(windows.extrapolate[i]) == fit.extrapolate
+
+
+@pytest.mark.parametrize('method', ['least_squares', 'theil_sen'])
+def test_graph_data_without_days_after_start_date(method):
+    dates = pd.date_range('2020-04-01', periods=30)
+    df = pd.DataFrame({'date': dates, 'cum_confirmed': get_cum_confirmed(30)})
+    for start_date in (dates[-1], dates[-2], dt.datetime(2021, 5, 1)):
+        df_levitt, extra_dates, model, line, r_squared = get_data_for_graph_with_regression_line(df, start_date,
+                                                                                                 method)
+        assert len(df_levitt) == max((dates > start_date).sum(), 0)
+        assert extra_dates == [] and len(line) == 0 and np.isnan(r_squared)
@@ -0,0 +1,121 @@
+import os
+
+import pandas as pd
+import pytest
+
+import refresher
+import districts.helper
+from conftest import N_DISTRICTS
+from data_source import (DATASET_PATHS, get_snapshot_version, load_snapshot, loaded_versions, refresh_snapshot,
+                         update_snapshot)
+from districts.helper import build_district_data, load_district_data, set_district_data, update_district_data
+
+# days of districts.csv served before days are appended
+FIRST_DAYS = 100
+
+
+def write_districts(source_dir, lines):
+    """
+    writes districts.csv of a data source
+    :param source_dir: directory of the data source
+    :param lines: lines of the csv table, the header first
+    """
+    with open(os.path.join(source_dir, DATASET_PATHS['districts']), 'w') as f:
+        f.writelines(lines)
+
+
+@pytest.fixture
+def districts_lines(source_dir):
+    """
+    lines of the complete districts.csv, the data source serves the first FIRST_DAYS days of it
+    """
+    with open(os.path.join(source_dir, DATASET_PATHS['districts'])) as f:
+        lines = f.readlines()
+    write_districts(source_dir, lines[:1 + FIRST_DAYS * N_DISTRICTS])
+    return lines
+
+
+def assert_full_load(standin, snapshot_dir, tmp_path):
+    """
+    checks that the current snapshot of the districts data equals a snapshot of the data source loaded completely
+    """
+    full_snapshot_dir = str(tmp_path / 'full')
+    _, full_version = refresh_snapshot('districts', standin.url, full_snapshot_dir)
+    pd.testing.assert_frame_equal(
+        load_snapshot('districts', snapshot_dir, categorical=True),
+        load_snapshot('districts', full_snapshot_dir, categorical=True, version=full_version))
+
+
+def test_unchanged_payload_is_skipped(standin, snapshot_dir, districts_lines):
+    version = update_snapshot('districts', standin.url, snapshot_dir)[0]
+    assert update_snapshot('districts', standin.url, snapshot_dir) is None
+    # a payload written again with the same rows is not stored again either
+    write_districts(standin.directory, districts_lines[:1 + FIRST_DAYS * N_DISTRICTS])
+    assert update_snapshot('districts', standin.url, snapshot_dir) is None
+    assert get_snapshot_version('districts', snapshot_dir) == version
+
+
+def test_appended_days_equal_full_load(standin, snapshot_dir, districts_lines, tmp_path):
+    version = update_snapshot('districts', standin.url, snapshot_dir)[0]
+    write_districts(standin.directory, districts_lines)
+    new_version, df_new = update_snapshot('districts', standin.url, snapshot_dir)
+    assert new_version != version
+    assert len(df_new) == (len(districts_lines) - 1 - FIRST_DAYS * N_DISTRICTS)
+    assert_full_load(standin, snapshot_dir, tmp_path)
+
+
+def test_rewritten_payload_falls_back_to_full_load(standin, snapshot_dir, districts_lines, tmp_path):
+    update_snapshot('districts', standin.url, snapshot_dir)
+    # the counts of the last served day are revised and days are appended
+    lines = list(districts_lines)
+    last = FIRST_DAYS * N_DISTRICTS
+    values = lines[last].split(',')
+    values[3] = str(int(values[3]) + 1)
+    lines[last] = ','.join(values)
+    write_districts(standin.directory, lines)
+    new_version, df_new = update_snapshot('districts', standin.url, snapshot_dir)
+    assert df_new is None
+    assert get_snapshot_version('districts', snapshot_dir) == new_version
+    assert_full_load(standin, snapshot_dir, tmp_path)
+
+
+def test_shorter_payload_falls_back_to_full_load(standin, snapshot_dir, districts_lines, tmp_path):
+    update_snapshot('districts', standin.url, snapshot_dir)
+    write_districts(standin.directory, districts_lines[:1 + (FIRST_DAYS - 10) * N_DISTRICTS])
+    assert update_snapshot('districts', standin.url, snapshot_dir)[1] is None
+    assert_full_load(standin, snapshot_dir, tmp_path)
+
+
+def test_refresh_swaps_in_appended_data(standin, snapshot_dir, districts_lines, monkeypatch, tmp_path):
+    monkeypatch.setattr(districts.helper, 'district_data', None)
+    monkeypatch.setitem(refresher.listeners, 'districts', [update_district_data])
+    version = update_snapshot('districts', standin.url, snapshot_dir)[0]
+    set_district_data(load_district_data(version))
+    loaded_versions['districts'] = version
+    # data a callback took before the refresh
+    old_data = districts.helper.get_district_data()
+    n_rows = len(old_data.df)
+    assert refresher.refresh_all(standin.url, snapshot_dir) == {}
+
+    write_districts(standin.directory, districts_lines)
+    new_version = refresher.refresh_all(standin.url, snapshot_dir)['districts']
+    assert loaded_versions['districts'] == new_version
+    new_data = districts.helper.get_district_data()
+    assert new_data.version == new_version
+    assert old_data.version == version and len(old_data.df) == n_rows
+    full_data = build_district_data(load_snapshot('districts', categorical=True, version=new_version), new_version)
+    assert new_data.names == full_data.names
+    assert (new_data.offsets == full_data.offsets).all()
+    pd.testing.assert_frame_equal(new_data.df, full_data.df, check_categorical=False)
+
+
+def test_refresh_loads_version_of_other_process(standin, snapshot_dir, monkeypatch):
+    calls = []
+    monkeypatch.setitem(refresher.listeners, 'states', [lambda version, df_new: calls.append((version, df_new))])
+    loaded_versions['states'] = update_snapshot('states', standin.url, snapshot_dir)[0]
+    # another process stored a new snapshot, it is loaded without asking the data source
+    new_version = refresh_snapshot('states', standin.url, snapshot_dir)[1]
+    requests = sum(standin.request_counts.values())
+    assert refresher.refresh_dataset('states', standin.url, snapshot_dir) == new_version
+    assert calls == [(new_version, None)]
+    assert sum(standin.request_counts.values()) == requests
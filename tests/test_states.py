@@ -0,0 +1,67 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import manifest
+from data_source import DATASET_PATHS, refresh_snapshot, load_snapshot
+from districts.helper import build_district_data, get_district_options
+from states.helper import date_format, build_state_data, get_state_df, get_state_options
+
+
+@pytest.fixture(scope='module')
+def df_all_states():
+    with open(os.path.join(os.environ['LEVITT_DATA_SOURCE'], DATASET_PATHS['states'])) as f:
+        df = pd.DataFrame(json.load(f)['states_daily'])
+    df['date'] = pd.to_datetime(df['date'], format=date_format)
+    return df
+
+
+def get_baseline_state_df(df_all_states, state_code):
+    """
+    dataframe of a state built from the rows of each status, like the dashboard did before the states data was
+    reshaped into the status x date x state array
+    """
+    df_state = df_all_states[['date', state_code, 'status']].copy()
+    con = df_state[df_state['status'] == 'Confirmed'][['date', state_code]]
+    con.columns = ['date', 'confirmed']
+    rec = df_state[df_state['status'] == 'Recovered'][[state_code]]
+    rec.columns = ['recovered']
+    dec = df_state[df_state['status'] == 'Deceased'][[state_code]]
+    dec.columns = ['deceased']
+    df_state_daily = pd.concat([con.reset_index(drop=True), rec.reset_index(drop=True), dec.reset_index(drop=True)],
+                               axis=1)
+    for column in ('confirmed', 'recovered', 'deceased'):
+        df_state_daily[column] = pd.to_numeric(df_state_daily[column])
+    df_state_daily['cum_confirmed'] = df_state_daily['confirmed'].cumsum()
+    df_state_daily['active'] = df_state_daily['cum_confirmed'] - (
+            df_state_daily['recovered'].cumsum() + df_state_daily['deceased'].cumsum())
+    return df_state_daily
+
+
+def test_state_df_matches_status_rows(df_all_states, snapshot_dir):
+    version = refresh_snapshot('states', os.environ['LEVITT_DATA_SOURCE'], snapshot_dir)[1]
+    data = build_state_data(version)
+    for state_code in ('an', 'mh', 'dl', 'tt', 'wb'):
+        df_state = get_state_df(state_code, data)
+        df_baseline = get_baseline_state_df(df_all_states, state_code)
+        assert (df_state['date'].values == df_baseline['date'].values).all()
+        for column in ('confirmed', 'recovered', 'deceased', 'cum_confirmed', 'active'):
+            np.testing.assert_array_equal(df_state[column].values, df_baseline[column].values.astype(np.float64))
+
+
+def test_manifests_are_written_with_snapshots(snapshot_dir):
+    source = os.environ['LEVITT_DATA_SOURCE']
+    for name in ('states', 'districts'):
+        version = refresh_snapshot(name, source, snapshot_dir)[1]
+        assert manifest.read_manifest(name, snapshot_dir)['version'] == version
+    assert manifest.read_manifest('states', snapshot_dir)['options'] == get_state_options()
+    data = build_district_data(load_snapshot('districts', snapshot_dir, categorical=True), version)
+    assert manifest.read_manifest('districts', snapshot_dir)['options'] == get_district_options(data)
+    assert manifest.read_manifest('india', snapshot_dir) is None
+    # loading a snapshot writes no manifest
+    os.remove(manifest.get_manifest_path('states', snapshot_dir))
+    build_state_data()
+    assert manifest.read_manifest('states', snapshot_dir) is None
@@ -0,0 +1,184 @@
+"""
+Local HTTP stand-in for the covid19india api, serving a directory with the api layout (data.json, states_daily.json,
+csv/latest/districts.csv). It sends ETag and Last-Modified headers, answers conditional requests with 304, serves
+byte ranges and gzip compressed responses, and handles requests concurrently, so the conditional, incremental and
+concurrent fetching of the data source layer can be exercised offline. A latency, a bandwidth limit and failing
+requests can be simulated to exercise the timeouts and retries.
+
+Run from the repository root:
+    python -m tools.standin_server DIRECTORY [--port 8000] [--delay 0.2] [--rate 2000000] [--failures 1]
+and start the dashboard with LEVITT_DATA_SOURCE=http://localhost:8000
+"""
+import io
+import os
+import re
+import sys
+import gzip
+import time
+import argparse
+import threading
+import email.utils
+from socketserver import ThreadingMixIn
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+
+# bytes sent at once by a server with a bandwidth limit
+RATE_CHUNK_SIZE = 64 * 1024
+
+
+class StandinServer(ThreadingMixIn, HTTPServer):
+    """
+    http server handling each request in its own thread
+    """
+    daemon_threads = True
+
+
+class StandinRequestHandler(SimpleHTTPRequestHandler):
+    """
+    static file handler with ETag, conditional request, single byte range and gzip support
+    """
+
+    def translate_path(self, path):
+        path = super().translate_path(path)
+        return os.path.join(self.server.directory, os.path.relpath(path, os.getcwd()))
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def should_fail(self):
+        """
+        whether the request is one of the first failures requests of its path, which are answered with 503
+        :return: True if the request fails
+        """
+        with self.server.lock:
+            count = self.server.request_counts.get(self.path, 0)
+            self.server.request_counts[self.path] = count + 1
+        return count < self.server.failures
+
+    def send_head(self):
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        path = self.translate_path(self.path)
+        if os.path.isdir(path) or not os.path.isfile(path):
+            return super().send_head()
+        if self.should_fail():
+            self.send_error(503, "Simulated failure")
+            return None
+        stat = os.stat(path)
+        etag = '"%x-%x"' % (stat.st_mtime_ns, stat.st_size)
+        # the compressed representation has its own entity tag
+        gzip_etag = etag[:-1] + '-gzip"'
+        last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+        if self.headers.get('If-None-Match') in (etag, gzip_etag) or (
+                'If-None-Match' not in self.headers and self.headers.get('If-Modified-Since') == last_modified):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return None
+        if 'Range' not in self.headers and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            with open(path, 'rb') as f:
+                content = gzip.compress(f.read(), 6)
+            self.send_response(200)
+            self.send_header('Content-Type', self.guess_type(path))
+            self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(content)))
+            self.send_header('ETag', gzip_etag)
+            self.send_header('Last-Modified', last_modified)
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('Vary', 'Accept-Encoding')
+            self.end_headers()
+            return io.BytesIO(content)
+        f = open(path, 'rb')
+        start, end = 0, stat.st_size - 1
+        match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2)), end) if match.group(2) else end
+            if start > end:
+                f.close()
+                self.send_response(416)
+                self.send_header('Content-Range', 'bytes */%d' % stat.st_size)
+                self.end_headers()
+                return None
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, end, stat.st_size))
+        else:
+            self.send_response(200)
+        f.seek(start)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', last_modified)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        if match:
+            # only the requested range is sent
+            content = f.read(end - start + 1)
+            f.close()
+            return io.BytesIO(content)
+        return f
+
+    def copyfile(self, source, outputfile):
+        if not self.server.rate:
+            return super().copyfile(source, outputfile)
+        # bandwidth limit: a chunk per RATE_CHUNK_SIZE / rate seconds
+        for chunk in iter(lambda: source.read(RATE_CHUNK_SIZE), b''):
+            outputfile.write(chunk)
+            time.sleep(len(chunk) / self.server.rate)
+
+
+def make_standin_server(directory, port=0, verbose=False, delay=0, rate=0, failures=0):
+    """
+    creates the stand-in server
+    :param directory: directory with the api layout
+    :param port: port to listen on, 0 picks a free port
+    :param verbose: log every request
+    :param delay: seconds to wait before answering a request, simulates the latency of the api
+    :param rate: bytes per second sent per response, 0 for no limit
+    :param failures: number of requests of each path answered with 503 before the path is served
+    :return: server, its base url is http://localhost:<server.server_port>
+    """
+    server = StandinServer(('localhost', port), StandinRequestHandler)
+    server.directory = os.path.abspath(directory)
+    server.verbose = verbose
+    server.delay = delay
+    server.rate = rate
+    server.failures = failures
+    # number of requests of each path so far
+    server.request_counts = {}
+    server.lock = threading.Lock()
+    return server
+
+
+def start_standin_server(directory, port=0, verbose=False, delay=0, rate=0, failures=0):
+    """
+    starts the stand-in server in a background thread
+    :param directory: directory with the api layout
+    :param port: port to listen on, 0 picks a free port
+    :param verbose: log every request
+    :param delay: seconds to wait before answering a request
+    :param rate: bytes per second sent per response, 0 for no limit
+    :param failures: number of requests of each path answered with 503 before the path is served
+    :return: server, its base url is http://localhost:<server.server_port>
+    """
+    server = make_standin_server(directory, port, verbose, delay, rate, failures)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for the covid19india api")
+    parser.add_argument('directory', help='directory with the api layout')
+    parser.add_argument('--port', type=int, default=8000, help='port to listen on')
+    parser.add_argument('--delay', type=float, default=0, help='seconds to wait before answering a request')
+    parser.add_argument('--rate', type=float, default=0, help='bytes per second sent per response, 0 for no limit')
+    parser.add_argument('--failures', type=int, default=0,
+                        help='number of requests of each path answered with 503 before it is served')
+    args = parser.parse_args(argv)
+    server = make_standin_server(args.directory, args.port, True, args.delay, args.rate, args.failures)
+    print("serving %s on http://localhost:%d" % (args.directory, server.server_port))
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    sys.exit(main())